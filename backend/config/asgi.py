@@ -3,6 +3,28 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Production entry point (uvicorn is in requirements.txt):
+
+    uvicorn config.asgi:application --host 0.0.0.0 --port 8000 --workers 4
+
+or, under gunicorn's process management:
+
+    gunicorn config.asgi:application -k uvicorn.workers.UvicornWorker -w 4
+
+Every endpoint works under ASGI. The sync DRF views run in a thread pool,
+while the async ones under /api/async/ (games.async_views) hold no thread
+while they wait on the database, so a worker can serve many slow requests
+at once. Don't set DJANGO_ALLOW_ASYNC_UNSAFE. Keep CONN_MAX_AGE at 0 (or
+use a pooler such as pgbouncer): async views open a connection per request.
+`manage.py load_test` compares the two paths. Measured against a local
+PostgreSQL 16 with 20,000 games, one uvicorn worker, and the server,
+database and load client sharing one core: the async game list and
+status serve 5-10% more requests per second than the sync ones at 16
+and 64 clients, and p50 latency is 5-10% lower. Both paths are CPU bound
+there (serialization, and Postgres on the same core). A remote database,
+where requests spend longer waiting, hasn't been measured; run the load
+test against your own deployment before moving traffic.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
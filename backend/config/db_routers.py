@@ -0,0 +1,129 @@
+"""
+Read-replica routing for catalog reads.
+
+Reads of the public catalog (games, genres, platforms and the tables derived
+from them) go to one of settings.DATABASE_REPLICAS, picked at random. Users,
+sessions, played games, tournament sessions and background tasks, and every
+write, stay on `default`.
+
+Replicas lag the primary, so reads stick to `default`:
+  - outside a request (background tasks, management commands), since there's
+    nobody to route for
+  - inside a transaction, so reads see the transaction's own writes
+  - for the rest of a request once it has written anything
+  - for REPLICA_STICKY_SECONDS after that, via a cookie, so the client's
+    next requests read their own writes
+"""
+
+import random
+from contextvars import ContextVar
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# (app label, model name); m2m through tables have their own model names
+CATALOG_MODELS = {
+    ("games", "game"), ("games", "genre"), ("games", "platform"),
+    ("games", "game_genres"), ("games", "game_platforms"),
+    ("games", "communityscore"), ("games", "gameneighbour"), ("games", "gametombstone"),
+}
+PIN_COOKIE = "primary_pin"
+
+
+class _RequestRouting:
+    # mutated in place, so writes made in sync_to_async threads still count
+    def __init__(self, pinned: bool):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_routing: ContextVar[_RequestRouting | None] = ContextVar("db_routing", default=None)
+
+
+@contextmanager
+def replica_reads(pinned: bool = False):
+    """Allow replica reads in this block (one request); yields its state."""
+    state = _RequestRouting(pinned)
+    token = _routing.set(state)
+    try:
+        yield state
+    finally:
+        _routing.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        replicas = settings.DATABASE_REPLICAS
+        if (
+            not replicas
+            or state is None
+            or state.pinned
+            or (model._meta.app_label, model._meta.model_name) not in CATALOG_MODELS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema through replication
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaStickinessMiddleware:
+    """Scopes replica routing to the request and keeps writers on the primary."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with replica_reads(pinned=PIN_COOKIE in request.COOKIES) as state:
+            response = self.get_response(request)
+        return self._finish(response, state)
+
+    async def __acall__(self, request):
+        with replica_reads(pinned=PIN_COOKIE in request.COOKIES) as state:
+            response = await self.get_response(request)
+        return self._finish(response, state)
+
+    def _finish(self, response, state):
+        if response.streaming and not response.is_async:
+            # exports read while streaming, after the view has returned
+            response.streaming_content = _scoped(response.streaming_content, state)
+        if state.wrote:
+            response.set_cookie(PIN_COOKIE, "1", max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite="Lax")
+        return response
+
+
+def _scoped(content, state: _RequestRouting):
+    chunks = iter(content)
+    while True:
+        token = _routing.set(state)
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        finally:
+            _routing.reset(token)
+        yield chunk
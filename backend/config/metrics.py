@@ -0,0 +1,330 @@
+"""
+Per-endpoint request metrics in Prometheus text format.
+
+MetricsMiddleware records, per URL name (`game_list`, `tournament_answer`,
+...; "unmatched" for 404s outside the urlconf):
+  - request count and a latency histogram (LATENCY_BUCKETS)
+  - SQL queries and seconds spent in them, on every database alias
+  - response bytes, as sent (after compression)
+
+Queries are timed by one execute wrapper installed on each connection as it
+opens; it adds to the request's counters through a context variable, so
+queries made in sync_to_async threads count too. Streaming responses
+(exports) are recorded when their last chunk has been sent: their bytes,
+their latency and the queries run while producing the chunks.
+
+Each process keeps its totals in memory. With settings.METRICS_DIR set,
+it also writes them to its own file there every METRICS_FLUSH_SECONDS
+(from a worker thread, never on the event loop), and `/metrics` sums the
+files of every process, past and present. Without it, `/metrics` reports
+the answering process only.
+
+`/metrics` wants `Authorization: Bearer <settings.METRICS_TOKEN>`. Without
+a token configured it only answers scrapes made on the machine itself.
+"""
+
+import asyncio
+import atexit
+import bisect
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# per view: [requests, seconds, queries, query seconds, bytes, *latency bucket counts, +Inf]
+_COUNT, _SECONDS, _QUERIES, _DB_SECONDS, _BYTES, _BUCKETS = range(6)
+
+logger = logging.getLogger(__name__)
+
+_views: dict[str, list[float]] = {}
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_last_flush = time.monotonic()
+# pid alone can be reused by a later worker, which would overwrite the file
+_process_file = f"{os.getpid()}-{time.time_ns()}.json"
+
+_queries: ContextVar[list | None] = ContextVar("request_queries", default=None)
+
+
+def _time_query(execute, sql, params, many, context):
+    counters = _queries.get()
+    if counters is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        counters[0] += 1
+        counters[1] += time.perf_counter() - started
+
+
+def _install_wrapper(sender, connection, **kwargs):
+    # fires on every reconnect of the same wrapper object
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+connection_created.connect(_install_wrapper, dispatch_uid="config.metrics")
+# and on any this thread opened before the middleware was loaded
+for _connection in connections.all(initialized_only=True):
+    _install_wrapper(None, _connection)
+
+
+def record(view: str, seconds: float, queries: int, db_seconds: float, size: int) -> None:
+    with _lock:
+        row = _views.get(view)
+        if row is None:
+            row = _views[view] = [0] * (_BUCKETS + len(LATENCY_BUCKETS) + 1)
+        row[_COUNT] += 1
+        row[_SECONDS] += seconds
+        row[_QUERIES] += queries
+        row[_DB_SECONDS] += db_seconds
+        row[_BYTES] += size
+        row[_BUCKETS + bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+
+def snapshot() -> dict:
+    """This process's totals: views plus the auth counters."""
+    from users.backends import AUTH_CACHE_STATS
+    from users.throttling import THROTTLE_REJECTIONS
+
+    with _lock:
+        views = {view: list(row) for view, row in _views.items()}
+    return {
+        "views": views,
+        "auth_cache": dict(AUTH_CACHE_STATS),
+        "throttle_rejections": dict(THROTTLE_REJECTIONS),
+    }
+
+
+def flush() -> None:
+    """Write this process's totals to settings.METRICS_DIR, if set."""
+    global _last_flush
+    _last_flush = time.monotonic()
+    if not settings.METRICS_DIR or not _flush_lock.acquire(blocking=False):
+        return  # another thread is already writing this process's file
+    try:
+        root = Path(settings.METRICS_DIR)
+        root.mkdir(parents=True, exist_ok=True)
+        tmp = root / f".{_process_file}.tmp"
+        tmp.write_text(json.dumps(snapshot()))
+        os.replace(tmp, root / _process_file)
+    except OSError:
+        logger.warning("could not write metrics to %s", settings.METRICS_DIR, exc_info=True)
+    finally:
+        _flush_lock.release()
+
+
+atexit.register(lambda: flush() if _views else None)
+
+
+def merge(snapshots) -> dict:
+    merged = {"views": {}, "auth_cache": {}, "throttle_rejections": {}}
+    for snap in snapshots:
+        for view, row in snap["views"].items():
+            total = merged["views"].get(view)
+            if total is None or len(total) != len(row):
+                # a file from before a bucket change: keep the newest layout
+                merged["views"][view] = list(row)
+            else:
+                merged["views"][view] = [a + b for a, b in zip(total, row)]
+        for key in ("auth_cache", "throttle_rejections"):
+            for name, value in snap[key].items():
+                merged[key][name] = merged[key].get(name, 0) + value
+    return merged
+
+
+def collect() -> dict:
+    """Totals across every process that wrote to METRICS_DIR."""
+    if not settings.METRICS_DIR:
+        return snapshot()
+    flush()
+    snapshots = []
+    for path in Path(settings.METRICS_DIR).glob("*.json"):
+        try:
+            snapshots.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue  # mid-rotation or removed by a cleanup
+    return merge(snapshots)
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render(data: dict) -> str:
+    """Prometheus text exposition of collect()'s output."""
+    views = sorted(data["views"].items())
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+
+    family("http_requests_total", "counter", "Requests handled, by URL name.", [
+        f'http_requests_total{{view="{_label(v)}"}} {int(row[_COUNT])}' for v, row in views
+    ])
+    samples = []
+    for v, row in views:
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), row[_BUCKETS:]):
+            cumulative += count
+            samples.append(f'http_request_duration_seconds_bucket{{view="{_label(v)}",le="{bound}"}} {int(cumulative)}')
+        samples.append(f'http_request_duration_seconds_sum{{view="{_label(v)}"}} {row[_SECONDS]!r}')
+        samples.append(f'http_request_duration_seconds_count{{view="{_label(v)}"}} {int(row[_COUNT])}')
+    family("http_request_duration_seconds", "histogram", "Time from request to response, by URL name.", samples)
+    family("http_db_queries_total", "counter", "SQL queries run while handling requests, by URL name.", [
+        f'http_db_queries_total{{view="{_label(v)}"}} {int(row[_QUERIES])}' for v, row in views
+    ])
+    family("http_db_seconds_total", "counter", "Time spent in SQL queries, by URL name.", [
+        f'http_db_seconds_total{{view="{_label(v)}"}} {row[_DB_SECONDS]!r}' for v, row in views
+    ])
+    family("http_response_bytes_total", "counter", "Response body bytes sent, by URL name.", [
+        f'http_response_bytes_total{{view="{_label(v)}"}} {int(row[_BYTES])}' for v, row in views
+    ])
+
+    lookups = []
+    for name, value in sorted(data["auth_cache"].items()):
+        kind, _, result = name.partition("_")
+        result = {"hits": "hit", "misses": "miss"}.get(result, result)
+        lookups.append(f'auth_cache_lookups_total{{kind="{kind}",result="{result}"}} {int(value)}')
+    family("auth_cache_lookups_total", "counter", "Session and user lookups served from (hit) or past (miss) the cache.", lookups)
+    family("auth_throttle_rejections_total", "counter", "Auth attempts rejected by a token bucket, by bucket.", [
+        f'auth_throttle_rejections_total{{scope="{_label(scope)}"}} {int(value)}'
+        for scope, value in sorted(data["throttle_rejections"].items())
+    ])
+    return "\n".join(lines) + "\n"
+
+
+def _may_scrape(request) -> bool:
+    token = settings.METRICS_TOKEN
+    if token:
+        sent = request.headers.get("Authorization", "")
+        return hmac.compare_digest(sent.encode(), f"Bearer {token}".encode())
+    # no token: local scrapes only. a proxy on the same machine connects from
+    # loopback too, but it adds X-Forwarded-For
+    return request.META.get("REMOTE_ADDR") in ("127.0.0.1", "::1") and "X-Forwarded-For" not in request.headers
+
+
+def metrics_view(request):
+    if not _may_scrape(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
+
+
+def _flush_due() -> bool:
+    return time.monotonic() - _last_flush >= settings.METRICS_FLUSH_SECONDS
+
+
+def _flush_in_background() -> None:
+    """flush() from the event loop: the file I/O runs in the default executor."""
+    global _last_flush
+    # claimed now, so the requests finishing meanwhile don't queue more
+    _last_flush = time.monotonic()
+    asyncio.get_running_loop().run_in_executor(None, flush)
+
+
+def _counted(chunks, view: str, started: float, counters: list):
+    """A streaming response's chunks; recorded once the last has been sent."""
+    size = 0
+    chunks = iter(chunks)
+    try:
+        while True:
+            token = _queries.set(counters)
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                _queries.reset(token)
+            size += len(chunk)
+            yield chunk
+    finally:
+        record(view, time.perf_counter() - started, counters[0], counters[1], size)
+        if _flush_due():
+            flush()  # a sync iterator: ASGI runs it in a worker thread
+
+
+async def _acounted(chunks, view: str, started: float, counters: list):
+    size = 0
+    chunks = aiter(chunks)
+    try:
+        while True:
+            token = _queries.set(counters)
+            try:
+                chunk = await anext(chunks)
+            except StopAsyncIteration:
+                return
+            finally:
+                _queries.reset(token)
+            size += len(chunk)
+            yield chunk
+    finally:
+        record(view, time.perf_counter() - started, counters[0], counters[1], size)
+        if _flush_due():
+            _flush_in_background()
+
+
+class MetricsMiddleware:
+    """Records latency, SQL and response size per URL name."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        counters = [0, 0.0]
+        token = _queries.set(counters)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _queries.reset(token)
+        if self._finish(request, response, started, counters) and _flush_due():
+            flush()
+        return response
+
+    async def __acall__(self, request):
+        counters = [0, 0.0]
+        token = _queries.set(counters)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _queries.reset(token)
+        if self._finish(request, response, started, counters) and _flush_due():
+            _flush_in_background()
+        return response
+
+    def _finish(self, request, response, started, counters) -> bool:
+        """Record the response, or arrange for it once streamed; True if recorded."""
+        match = request.resolver_match
+        view = (match.view_name if match else None) or "unmatched"
+        if response.streaming:
+            wrap = _acounted if response.is_async else _counted
+            response.streaming_content = wrap(response.streaming_content, view, started, counters)
+            return False
+        record(view, time.perf_counter() - started, counters[0], counters[1], len(response.content))
+        return True
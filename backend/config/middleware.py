@@ -0,0 +1,62 @@
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+
+re_accepts_brotli = _lazy_re_compile(r"\bbr\b")
+
+# below this, compressing costs more than the bytes it saves
+COMPRESS_MIN_BYTES = 1024
+
+# catalog reads: public data plus the caller's own played flags, never a
+# token or CSRF value. GZipMiddleware pads its output with random bytes
+# against BREACH and brotli has no such option, so only these get it
+BROTLI_VIEWS = frozenset({
+    "game_list", "game_bootstrap", "game_discover", "game_similar", "game_recommendations",
+    "game_changes", "genre_list", "platform_list", "async_game_list", "async_genre_list",
+    "async_platform_list",
+})
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """GZipMiddleware that prefers brotli for catalog reads.
+
+    Small responses are left alone; streaming responses (exports) are
+    always gzipped, since brotli here only works on whole bodies.
+    Everything outside BROTLI_VIEWS, and any response setting a cookie,
+    keeps GZipMiddleware's BREACH mitigation.
+    """
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < COMPRESS_MIN_BYTES:
+            return response
+        match = request.resolver_match
+        if (
+            brotli is None
+            or response.streaming
+            or request.method != "GET"
+            or match is None
+            or match.view_name not in BROTLI_VIEWS
+            or response.cookies
+            or response.has_header("Content-Encoding")
+            or not re_accepts_brotli.search(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed = brotli.compress(response.content, quality=5)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(compressed))
+        # same as GZipMiddleware: the encoded body is only weakly equal
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 import os
 
@@ -59,8 +60,29 @@ INSTALLED_APPS = [
 # use our custom user model so we can extend it later if necessary
 AUTH_USER_MODEL = 'users.User'
 
+# users are cached with AUTH_CACHE_ENABLED (users/backends.py). only one
+# backend: each listed one would hash the password of a failed login again.
+# sessions issued by plain ModelBackend name it, so they log in once more
+AUTHENTICATION_BACKENDS = [
+    'users.backends.CachedModelBackend',
+]
+
+# token buckets for the auth endpoints (users/throttling.py):
+# scope -> (attempts, seconds to refill them all)
+AUTH_THROTTLES = {
+    'login_ip': (20, 60),
+    'login_username': (5, 300),
+    'register_ip': (10, 3600),
+}
+
 MIDDLEWARE = [
+    # outermost, so latency and response size cover the whole stack
+    'config.metrics.MetricsMiddleware',
     "corsheaders.middleware.CorsMiddleware",
+    # gzip/brotli for larger responses; runs last on the way out
+    'config.middleware.CompressionMiddleware',
+    # scopes replica reads to the request; pins writers to the primary
+    'config.db_routers.ReplicaStickinessMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -72,6 +94,14 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'config.urls'
 
+# per-process metrics files, summed by /metrics; unset = this process only.
+# must be a directory shared by all workers and emptied on deploy
+METRICS_DIR = os.getenv('METRICS_DIR') or None
+METRICS_FLUSH_SECONDS = 5
+# bearer token Prometheus sends to /metrics; unset, only local scrapes
+# (loopback, not via a proxy) are answered
+METRICS_TOKEN = os.getenv('METRICS_TOKEN') or None
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -105,6 +135,52 @@ DATABASES = {
     }
 }
 
+# read replicas for catalog reads, e.g. DATABASE_REPLICA_HOSTS=replica1,replica2
+# (same name and credentials as default). pointing it at `db` itself gives a
+# local two-alias setup. see config/db_routers.py for what is routed where
+DATABASE_REPLICAS = []
+for i, host in enumerate(h.strip() for h in os.getenv('DATABASE_REPLICA_HOSTS', '').split(',') if h.strip()):
+    alias = f'replica{i + 1}'
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['config.db_routers.ReplicaRouter']
+# how long a client keeps reading from the primary after it wrote something
+REPLICA_STICKY_SECONDS = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# redis when REDIS_URL is set, so every worker sees the same entries and
+# deletes; otherwise a per-process memory cache, fine for one runserver
+
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'games',
+        }
+    }
+
+# sessions and users are only cached in a shared cache: a logout, password
+# change or deactivation has to reach every worker at once, and a
+# per-process cache would keep serving the old entry on the others
+AUTH_CACHE_ENABLED = bool(REDIS_URL)
+SESSION_ENGINE = 'users.sessions' if AUTH_CACHE_ENABLED else 'django.contrib.sessions.backends.db'
+
+# the same goes for game data invalidated on writes (games/caching.py):
+# played sets, recommendations and similar games. entries that only expire
+# are cached either way
+GAME_CACHE_ENABLED = bool(REDIS_URL)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -149,6 +225,15 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 RAWG_API_KEY = os.getenv('RAWG_API_KEY')
 
+# catalog snapshots (manage.py build_snapshot). file names are versioned, so
+# they can be cached forever; only manifest.json needs a short max-age. in
+# production the web server serves this directory, DEBUG serves it itself
+SNAPSHOT_ROOT = os.getenv('SNAPSHOT_ROOT', BASE_DIR / 'snapshots')
+SNAPSHOT_URL = 'snapshots/'
+
+# how long a stateless tournament token stays valid (seconds)
+TOURNAMENT_TOKEN_MAX_AGE = 60 * 60 * 24 * 7
+
 REST_FRAMEWORK = {
     # switch from JWT to session authentication; frontend will use
     # cookies/CSRF instead of bearer tokens
@@ -160,6 +245,21 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS':
         'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 21,
+    # orjson for JSON; MessagePack is negotiated (Accept: application/msgpack)
+    # only where the optional msgpack package is installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'config.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ] + (['config.renderers.MessagePackRenderer'] if find_spec('msgpack') else []),
+    'DEFAULT_PARSER_CLASSES': [
+        'config.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ] + (['config.renderers.MessagePackParser'] if find_spec('msgpack') else []),
+    # reverse proxies in front of the app, each appending to X-Forwarded-For.
+    # 0 means clients connect directly and only REMOTE_ADDR is trusted; the
+    # throttles key on this, so a client mustn't get to pick it
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0')),
 }
 
 # cookies must be allowed across origins (react on :3000 talking to django on
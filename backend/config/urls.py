@@ -14,8 +14,12 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
+
+from .metrics import metrics_view
 # switched to Django session auth; JWT token views are no longer needed
 # from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
@@ -24,4 +28,9 @@ urlpatterns = [
     # user registration sits alongside the games endpoints
     path('api/', include('users.urls')),
     path('api/', include('games.urls')),
+    # Prometheus scrape target; keep it off the public proxy
+    path('metrics', metrics_view, name='metrics'),
 ]
+
+# catalog snapshots; a no-op unless DEBUG
+urlpatterns += static(settings.SNAPSHOT_URL, document_root=settings.SNAPSHOT_ROOT)
@@ -0,0 +1,236 @@
+"""
+Async versions of the catalog and tournament endpoints, for ASGI serving.
+
+DRF's APIView is sync only, so these are plain Django async views that
+mirror their DRF counterparts' responses. They read through the async ORM
+(aget, acount, aupdate, async iteration), so an ASGI worker can keep many
+requests waiting on the database at once. Query building and the pure
+tournament logic are shared with games.views. The few cached lookups that
+can fall through to the ORM (played ids, session bumps, tournament cards)
+run through sync_to_async, as does storing a finished or restarted
+session, which needs a transaction the async ORM doesn't offer.
+
+The DRF views stay in place and are still what runserver and the test
+suite use; see config/asgi.py for serving these.
+"""
+
+import orjson
+from asgiref.sync import sync_to_async
+from django.core import signing
+from django.db.models import F, Min
+from django.db.models.functions import ExtractYear
+from django.http import HttpResponse
+from django.utils import timezone
+from django.views import View
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from config.renderers import ORJSONRenderer
+from . import caching
+from . import tournament as t
+from .models import Game, Genre, Platform, TournamentSession
+from .serializers import GameSerializer, game_fields, only_game_fields
+from .views import (
+    TOURNAMENT_GROUP_KEYS, GamePagination, assemble_response, filter_games, parse_version,
+    response_game_ids, stateless_response, _game_cards, _load_state, _store_session,
+)
+
+
+def _json(data, status: int = 200) -> HttpResponse:
+    return HttpResponse(ORJSONRenderer().render(data), status=status, content_type="application/json")
+
+
+def _detail(message: str, status: int) -> HttpResponse:
+    return _json({"detail": message}, status)
+
+
+class AsyncAPIView(View):
+    """Session-authenticated async view returning DRF-shaped JSON errors."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return _detail("Authentication credentials were not provided.", 403)
+        # resolved once, so sync code (serializers) can read it without a query
+        request.user = user
+        return await super().dispatch(request, *args, **kwargs)
+
+
+async def _serialize_games(qs, request, fields=None, played=None) -> dict[int, dict]:
+    if played is None:
+        played = await sync_to_async(caching.played_ids)(request.user.pk)
+    context = {"request": request, "played_ids": played}
+    games = [game async for game in qs]
+    # one serializer for the lot: building the fields per game costs more than the query
+    data = GameSerializer(games, many=True, context=context, fields=fields).data
+    return {game.pk: row for game, row in zip(games, data)}
+
+
+class AsyncGameList(AsyncAPIView):
+    async def get(self, request):
+        try:
+            fields = game_fields(request.GET)
+        except ValidationError as exc:
+            return _json(exc.detail, 400)
+        qs = await sync_to_async(filter_games)(request.GET, request.user)
+
+        paginator = GamePagination()
+        try:
+            page_size = min(int(request.GET.get("page_size", paginator.page_size)), paginator.max_page_size)
+            page = max(int(request.GET.get("page", 1)), 1)
+        except ValueError:
+            return _detail("Invalid page.", 404)
+        if page_size < 1:
+            page_size = paginator.page_size
+
+        count = await qs.acount()
+        if page > 1 and (page - 1) * page_size >= count:
+            return _detail("Invalid page.", 404)
+        start = (page - 1) * page_size
+        played = (await sync_to_async(caching.played_ids)(request.user.pk)) if "is_played" in fields else ()
+        games = await _serialize_games(only_game_fields(qs, fields)[start:start + page_size], request, fields, played)
+
+        url = request.build_absolute_uri()
+        previous = None
+        if page > 1:
+            previous = remove_query_param(url, "page") if page == 2 else replace_query_param(url, "page", page - 1)
+        return _json({
+            "count": count,
+            "next": replace_query_param(url, "page", page + 1) if start + page_size < count else None,
+            "previous": previous,
+            "results": list(games.values()),
+        })
+
+
+class AsyncGenreList(AsyncAPIView):
+    async def get(self, request):
+        return _json([g async for g in Genre.objects.values("id", "name")])
+
+
+class AsyncPlatformList(AsyncAPIView):
+    async def get(self, request):
+        return _json([p async for p in Platform.objects.values("id", "name")])
+
+
+async def _build_response(state: dict, request, version: int | None = None) -> dict:
+    games = Game.objects.filter(pk__in=response_game_ids(state)).prefetch_related("genres", "platforms")
+    return assemble_response(state, await _serialize_games(games, request), version)
+
+
+async def _played_games_with_key(user, group_by: str) -> list[tuple[int, str]]:
+    """views._played_games_with_key over the async ORM."""
+    played = Game.objects.filter(players=user)
+    key = TOURNAMENT_GROUP_KEYS[group_by]
+    if key is None:
+        rows = played.values_list("pk", ExtractYear("release_date"))
+        return [(pk, str(year) if year else "") async for pk, year in rows]
+
+    relation, model = key
+    rows = [row async for row in played.annotate(key_id=Min(f"{relation}__pk")).values_list("pk", "key_id")]
+    names = {pk: name async for pk, name in
+             model.objects.filter(pk__in={k for _, k in rows if k}).values_list("pk", "name")}
+    return [(pk, names.get(key_id, "")) for pk, key_id in rows]
+
+
+class AsyncTournamentStartView(AsyncAPIView):
+    async def post(self, request):
+        try:
+            data = orjson.loads(request.body or b"{}")
+        except orjson.JSONDecodeError as exc:
+            return _detail(f"JSON parse error - {exc}", 400)
+        mode = data.get("mode", "merge")
+        if mode not in ("merge", "adaptive"):
+            return _detail("mode must be merge or adaptive.", 400)
+        group_by = data.get("group_by", "genre")
+        if group_by not in TOURNAMENT_GROUP_KEYS:
+            return _detail(f"group_by must be one of: {', '.join(TOURNAMENT_GROUP_KEYS)}.", 400)
+        games_with_genre = await _played_games_with_key(request.user, group_by)
+        if len(games_with_genre) < 2:
+            return _detail("You need at least 2 played games to start a tier list.", 400)
+
+        if mode == "adaptive":
+            state = t.build_adaptive_state([gid for gid, _ in games_with_genre],
+                                           budget=t.grouped_total(games_with_genre))
+        else:
+            state = t.build_initial_state(games_with_genre)
+        if data.get("stateless"):
+            # as in the sync view: warm every card, store nothing
+            await sync_to_async(_game_cards)([gid for gid, _ in games_with_genre])
+            return _json(await sync_to_async(stateless_response)(state, request.user))
+        # the restart's row lock and version read-back need a transaction
+        version = await sync_to_async(_store_session)(request.user, state)
+        return _json(await _build_response(state, request, version))
+
+
+class AsyncTournamentStatusView(AsyncAPIView):
+    async def get(self, request):
+        try:
+            session = await TournamentSession.objects.aget(user=request.user)
+        except TournamentSession.DoesNotExist:
+            return _detail("No active session.", 404)
+        return _json(await _build_response(session.state, request, session.version))
+
+
+class AsyncTournamentAnswerView(AsyncAPIView):
+    async def post(self, request):
+        try:
+            data = orjson.loads(request.body or b"{}")
+        except orjson.JSONDecodeError as exc:
+            return _detail(f"JSON parse error - {exc}", 400)
+        winner_id, loser_id = data.get("winner"), data.get("loser")
+
+        token = data.get("token")
+        if token:
+            return await self._answer_stateless(request, token, winner_id, loser_id)
+
+        try:
+            session = await TournamentSession.objects.aget(user=request.user)
+        except TournamentSession.DoesNotExist:
+            return _detail("No active session.", 404)
+        if not winner_id or not loser_id:
+            return _detail("winner and loser are required.", 400)
+
+        try:
+            client_version = parse_version(data.get("version"))
+        except ValueError:
+            return _detail("version must be an integer.", 400)
+        if client_version is not None and client_version != session.version:
+            return await self._conflict(session, request)
+        try:
+            state = t.answer(session.state, int(winner_id), int(loser_id))
+        except ValueError as exc:
+            return _detail(str(exc), 400)
+
+        # compare-and-swap, as in the sync view
+        updated = await TournamentSession.objects.filter(pk=session.pk, version=session.version).aupdate(
+            state=state, version=F("version") + 1, updated_at=timezone.now(),
+        )
+        if not updated:
+            await session.arefresh_from_db(fields=["state", "version"])
+            return await self._conflict(session, request)
+        if state["phase"] == "finished":
+            await sync_to_async(caching.bump_user_version)(request.user.pk)
+        return _json(await _build_response(state, request, session.version + 1))
+
+    async def _answer_stateless(self, request, token, winner_id, loser_id):
+        try:
+            state = _load_state(token, request.user)
+        except signing.BadSignature:
+            return _detail("Invalid or expired tournament token.", 400)
+        if not winner_id or not loser_id:
+            return _detail("winner and loser are required.", 400)
+        try:
+            state = t.answer(state, int(winner_id), int(loser_id))
+        except ValueError as exc:
+            return _detail(str(exc), 400)
+
+        if state["phase"] == "finished":
+            version = await sync_to_async(_store_session)(request.user, state)
+            return _json(await _build_response(state, request, version))
+        # the pair's cards come from the cache; the DB only once they expire
+        return _json(await sync_to_async(stateless_response)(state, request.user))
+
+    async def _conflict(self, session, request):
+        body = await _build_response(session.state, request, session.version)
+        body["detail"] = "Tournament state changed since this pair was shown."
+        return _json(body, 409)
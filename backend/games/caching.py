@@ -0,0 +1,141 @@
+"""
+Cache keys and invalidation for derived, read-heavy game data.
+
+Invalidation is done by bumping a version number that is part of every
+key, so stale entries are never read again and simply expire. Played
+sets are the exception: they are deleted on every library change, by the
+played endpoints and by an m2m_changed hook for everything else.
+
+Entries invalidated this way are only cached with settings.GAME_CACHE_ENABLED,
+i.e. in a cache every worker shares: a bump or delete made by one worker
+(or by the task process) would otherwise leave the other workers serving
+the old entry until it expires. Without it those reads go to the database.
+"""
+
+import hashlib
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Game
+
+
+SIMILAR_TTL = 60 * 60
+RECOMMENDATIONS_TTL = 60 * 15
+PLAYED_TTL = 60 * 10
+DISCOVER_POOL_TTL = 60 * 60
+CATALOG_FACETS_TTL = 60 * 5
+TOURNAMENT_CARD_TTL = 60 * 30
+
+# genres, platforms and their game counts for the bootstrap endpoint; the
+# same for every user, so it just expires
+CATALOG_FACETS_KEY = "catalog:facets"
+# (finished sessions, last update) as of the last community score fit;
+# versioned with the way outcomes are read from a session, so a change
+# there refits once
+COMMUNITY_FIT_KEY = "community:fit:v2"
+
+
+def enabled() -> bool:
+    """Whether entries invalidated on writes may be cached."""
+    return settings.GAME_CACHE_ENABLED
+
+
+def _version(name: str) -> int:
+    version = cache.get(name)
+    if version is None:
+        version = time.time_ns()
+        cache.set(name, version, None)
+    return version
+
+
+def _bump(name: str) -> None:
+    cache.set(name, time.time_ns(), None)
+
+
+def similar_key(game_id: int) -> str:
+    return f"similar:{_version('similar:version')}:{game_id}"
+
+
+def bump_similarity_version() -> None:
+    """Called after the similarity index is rebuilt."""
+    _bump('similar:version')
+
+
+def recommendations_key(user_id: int) -> str:
+    # depends on both the user's library/ranking and the similarity index
+    return f"recs:{_version('similar:version')}:{_version(f'user:{user_id}:version')}:{user_id}"
+
+
+def bump_user_version(user_id: int) -> None:
+    """Called whenever a user's library or tier list changes."""
+    _bump(f'user:{user_id}:version')
+
+
+def card_key(game_id: int) -> str:
+    # the card a stateless tournament shows for a game; cards just expire,
+    # so a rename reaches an open tournament within TOURNAMENT_CARD_TTL
+    return f"card:{game_id}"
+
+
+def discover_pool_key(genre: str, platform: str) -> str:
+    # pools aren't invalidated: new games join once the pool expires;
+    # hashed: the filters come straight from the query string
+    digest = hashlib.sha256(f"{genre.lower()}\0{platform.lower()}".encode()).hexdigest()[:32]
+    return f"discover:{digest}"
+
+
+class PlayedSet:
+    """A user's played game ids as a sorted int64 array.
+
+    Stored in the cache as raw bytes (8 bytes per game) and checked with
+    binary search, so membership never touches the players through table.
+    """
+
+    def __init__(self, ids: array):
+        self.ids = ids
+
+    def __contains__(self, game_id) -> bool:
+        i = bisect_left(self.ids, game_id)
+        return i < len(self.ids) and self.ids[i] == game_id
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def _played_key(user_id: int) -> str:
+    return f"played:{user_id}"
+
+
+def played_ids(user_id: int) -> PlayedSet:
+    if not enabled():
+        return PlayedSet(_read_played(user_id))
+    raw = cache.get(_played_key(user_id))
+    if raw is not None:
+        ids = array('q')
+        ids.frombytes(raw)
+        return PlayedSet(ids)
+    ids = _read_played(user_id)
+    cache.set(_played_key(user_id), ids.tobytes(), PLAYED_TTL)
+    return PlayedSet(ids)
+
+
+def _read_played(user_id: int) -> array:
+    return array('q', sorted(
+        Game.players.through.objects.filter(user_id=user_id).values_list('game_id', flat=True)
+    ))
+
+
+def forget_played(user_id: int) -> None:
+    """Called after every library change; the next read rebuilds the set.
+
+    Deleting rather than editing the cached array means two overlapping
+    writes can't lose each other's change.
+    """
+    cache.delete(_played_key(user_id))
@@ -0,0 +1,43 @@
+"""
+Cursors for the games/changes/ delta feed.
+
+A cursor is a signed {"games": [change_seq, id], "deleted": [change_seq,
+game_id]}: the last row each half of the feed has served. Change numbers
+come from models.next_change and become visible in order, so a position
+never has anything commit behind it.
+"""
+
+from django.core import signing
+from django.db.models import Q
+
+
+# v2: positions are (change_seq, id); v1 timestamp cursors are rejected
+CHANGES_CURSOR_SALT = "games.changes.cursor.v2"
+
+
+def dumps(cursor: dict) -> str:
+    return signing.dumps(cursor, salt=CHANGES_CURSOR_SALT, compress=True)
+
+
+def loads(value: str) -> dict:
+    """Raises signing.BadSignature for anything dumps() didn't produce."""
+    return signing.loads(value, salt=CHANGES_CURSOR_SALT)
+
+
+def changes_cursor(seq: int) -> str:
+    """A cursor that replays every change numbered after `seq`.
+
+    Used by catalog snapshots, with the counter value their copy was read at.
+    """
+    # ids start at 1, so (seq + 1, 0) is just before the first later change
+    position = [seq + 1, 0]
+    return dumps({"games": position, "deleted": position})
+
+
+def after(qs, seq: str, key: str, position: list | None):
+    """Keyset filter: rows strictly after (seq, key) = `position`, in order."""
+    qs = qs.order_by(seq, key)
+    if position is None:
+        return qs
+    at, last = position
+    return qs.filter(Q(**{f"{seq}__gt": at}) | Q(**{seq: at, f"{key}__gt": last}))
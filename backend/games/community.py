@@ -0,0 +1,102 @@
+"""
+Community ranking — one Bradley–Terry model fitted over everyone's tier lists.
+
+Each finished tournament is turned into pairwise outcomes: in every order
+the user actually produced (see tournament_orders), each game beats the
+next COMMUNITY_WINDOW games below it. The outcomes of all
+users are aggregated into a sparse win matrix (COO arrays: winner index,
+loser index, count) and strengths are fitted with the vectorized MM
+algorithm (Hunter 2004). Every game also wins and loses PRIOR_GAMES
+virtual games against a reference of strength 1, so games that never win
+or never lose keep a finite score.
+
+Scores are log-strengths: higher is better, 0 is the reference.
+"""
+
+import numpy as np
+
+
+COMMUNITY_WINDOW = 3
+PRIOR_GAMES = 1.0
+MAX_ITERATIONS = 200
+TOLERANCE = 1e-6
+
+
+def tournament_orders(state: dict) -> list[list[int]]:
+    """The orders, best first, that a finished tournament established.
+
+    A group-mode ranking is not one order: tier D interleaves the games
+    each group eliminated by their position in it, and games of different
+    groups were never compared. What the answers did sort is each group
+    and the final, so those are the orders. Adaptive rankings (and states
+    stored without their groups) are fitted over every game at once and
+    count as a single order.
+    """
+    if state.get("final"):
+        return [grp["sorted"] for grp in state["groups"]] + [state["final"]["ms"]["pending"][0]]
+    return [[r["id"] for r in sorted(state["ranking"], key=lambda r: r["rank"])]]
+
+
+def order_outcomes(ids: list[int], window: int = COMMUNITY_WINDOW) -> list[tuple[int, int]]:
+    """(winner id, loser id) pairs implied by one order, best first."""
+    return [
+        (ids[i], ids[j])
+        for i in range(len(ids))
+        for j in range(i + 1, min(i + 1 + window, len(ids)))
+    ]
+
+
+def tournament_outcomes(state: dict, window: int = COMMUNITY_WINDOW) -> list[tuple[int, int]]:
+    return [pair for order in tournament_orders(state) for pair in order_outcomes(order, window)]
+
+
+def win_matrix(outcomes: list[tuple[int, int]], index: dict[int, int]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Aggregate outcomes into COO arrays (winner idx, loser idx, count)."""
+    pairs = np.array(
+        [(index[w], index[l]) for w, l in outcomes if w in index and l in index],
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    if not len(pairs):
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0)
+    codes, counts = np.unique(pairs[:, 0] * len(index) + pairs[:, 1], return_counts=True)
+    return codes // len(index), codes % len(index), counts.astype(float)
+
+
+def fit_bradley_terry(
+    winners: np.ndarray,
+    losers: np.ndarray,
+    counts: np.ndarray,
+    n_items: int,
+    init: np.ndarray | None = None,
+    iterations: int = MAX_ITERATIONS,
+    tol: float = TOLERANCE,
+) -> np.ndarray:
+    """Fit log-strengths for `n_items` from a sparse win matrix.
+
+    `init` (log-strengths, e.g. the previous fit) warm-starts the
+    iterations, so a refit after a few new rankings converges quickly.
+    """
+    wins = np.bincount(winners, weights=counts, minlength=n_items) + PRIOR_GAMES
+    p = np.exp(init) if init is not None else np.ones(n_items)
+    for _ in range(iterations):
+        # every match contributes n / (p_i + p_j) to both players' denominators
+        per_match = counts / (p[winners] + p[losers])
+        denom = (
+            np.bincount(winners, weights=per_match, minlength=n_items)
+            + np.bincount(losers, weights=per_match, minlength=n_items)
+            + 2 * PRIOR_GAMES / (p + 1)
+        )
+        updated = wins / denom
+        converged = np.max(np.abs(np.log(updated) - np.log(p))) < tol
+        p = updated
+        if converged:
+            break
+    return np.log(p)
+
+
+def comparisons_per_item(winners: np.ndarray, losers: np.ndarray, counts: np.ndarray, n_items: int) -> np.ndarray:
+    return (
+        np.bincount(winners, weights=counts, minlength=n_items)
+        + np.bincount(losers, weights=counts, minlength=n_items)
+    ).astype(int)
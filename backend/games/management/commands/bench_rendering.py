@@ -0,0 +1,102 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from config import renderers
+from config.middleware import brotli
+from games import tournament as t
+from games.models import Game, Genre, Platform
+from games.views import GameList, _build_response
+
+
+def _time_render(renderer, data, repeat: int) -> tuple[float, bytes]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = renderer.render(data, renderer.media_type, {})
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), body
+
+
+class Command(BaseCommand):
+    help = "Compare render time and bytes on the wire for GameList pages and tournament responses."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--games", type=int, default=1000,
+                            help="games in the throwaway library (and final ranking)")
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument("--output", default="bench_rendering.json",
+                            help="where to write the JSON results")
+
+    def handle(self, *args, **options):
+        # everything is created inside a transaction that is rolled back
+        with transaction.atomic():
+            payloads = self._payloads(options["games"], options["page_size"])
+            transaction.set_rollback(True)
+
+        candidates = {"json": JSONRenderer(), "orjson": renderers.ORJSONRenderer()}
+        if renderers.msgpack is not None:
+            candidates["msgpack"] = renderers.MessagePackRenderer()
+
+        results = []
+        for name, data in payloads.items():
+            for label, renderer in candidates.items():
+                seconds, body = _time_render(renderer, data, options["repeat"])
+                row = {
+                    "payload": name,
+                    "renderer": label,
+                    "render_us": round(seconds * 1e6, 1),
+                    "bytes": len(body),
+                    "gzip_bytes": len(compress_string(body)),
+                    "br_bytes": len(brotli.compress(body, quality=5)) if brotli else None,
+                }
+                results.append(row)
+                self.stdout.write(
+                    f"{name:<18} {label:<8} render={row['render_us']}us bytes={row['bytes']} "
+                    f"gzip={row['gzip_bytes']} br={row['br_bytes']}"
+                )
+
+        with open(options["output"], "w") as fh:
+            json.dump({"created": time.time(), "games": options["games"], "results": results}, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"wrote {len(results)} results to {options['output']}"))
+
+    def _payloads(self, n: int, page_size: int) -> dict:
+        user = get_user_model().objects.create_user(username="bench-rendering")
+        genres = Genre.objects.bulk_create([Genre(name=f"Bench genre {i}") for i in range(12)])
+        platforms = Platform.objects.bulk_create([Platform(name=f"Bench platform {i}") for i in range(6)])
+        games = Game.objects.bulk_create([
+            Game(name=f"Bench game {i:05d}", rating=(i % 50) / 10, image=f"https://img.example/{i}.jpg")
+            for i in range(n)
+        ])
+        Game.genres.through.objects.bulk_create(
+            [Game.genres.through(game_id=g.pk, genre_id=genres[i % len(genres)].pk) for i, g in enumerate(games)]
+        )
+        Game.platforms.through.objects.bulk_create(
+            [Game.platforms.through(game_id=g.pk, platform_id=platforms[i % len(platforms)].pk)
+             for i, g in enumerate(games)]
+        )
+        Game.players.through.objects.bulk_create(
+            [Game.players.through(game_id=g.pk, user_id=user.pk) for g in games]
+        )
+
+        factory = APIRequestFactory(SERVER_NAME="localhost")
+        request = factory.get("/api/games/", {"page_size": page_size})
+        force_authenticate(request, user)
+        page = GameList.as_view()(request).data
+
+        # a finished tier list over the whole library
+        state = t.build_initial_state([(g.pk, genres[i % len(genres)].name) for i, g in enumerate(games)])
+        while state["phase"] != "finished":
+            a, b = t.current_pair(state)
+            state = t.answer(state, min(a, b), max(a, b))
+        request = factory.get("/api/games/tournament/status/")
+        request.user = user
+        return {"game_list_page": page, "tournament_ranking": _build_response(state, request, version=1)}
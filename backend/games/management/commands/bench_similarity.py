@@ -0,0 +1,62 @@
+import resource
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from games import similarity
+
+
+def synthetic_plays(users: int, games: int, plays: int, skew: float, rng) -> tuple[np.ndarray, np.ndarray]:
+    """(user, game) pairs with Zipf-like game popularity and library sizes."""
+    game_weights = 1 / np.arange(1, games + 1) ** skew
+    user_weights = 1 / np.arange(1, users + 1) ** (skew / 2)
+    game_cols = rng.choice(games, size=plays, p=game_weights / game_weights.sum())
+    user_rows = rng.choice(users, size=plays, p=user_weights / user_weights.sum())
+    codes = np.unique(user_rows.astype(np.int64) * games + game_cols)
+    return codes // games, codes % games
+
+
+class Command(BaseCommand):
+    help = "Time the similarity index build on synthetic play data, without touching the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--games", type=int, default=100_000)
+        parser.add_argument("--plays", type=int, default=3_000_000)
+        parser.add_argument("--skew", type=float, default=1.0,
+                            help="Zipf exponent of game popularity (users get half of it)")
+        parser.add_argument("--features", type=int, default=60, help="distinct genres + platforms")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["seed"])
+        n_users, n_games = options["users"], options["games"]
+        user_rows, game_cols = synthetic_plays(n_users, n_games, options["plays"], options["skew"], rng)
+        popularity = np.bincount(game_cols, minlength=n_games)
+        libraries = np.bincount(user_rows, minlength=n_users)
+        self.stdout.write(
+            f"{len(user_rows)} plays; most played game {popularity.max()}, biggest library {libraries.max()}"
+        )
+
+        started = time.perf_counter()
+        keep = (similarity.sample_per_key(game_cols, similarity.MAX_PLAYERS_PER_GAME)
+                & similarity.sample_per_key(user_rows, similarity.MAX_GAMES_PER_USER))
+        coplay = similarity.build_matrix(user_rows[keep], game_cols[keep], (n_users, n_games))
+        # two or three genres/platforms per game
+        feature_games = np.repeat(np.arange(n_games), 3)
+        content = similarity.build_matrix(
+            rng.integers(0, options["features"], len(feature_games)), feature_games, (options["features"], n_games),
+        )
+        sampled = time.perf_counter() - started
+
+        blocks = neighbours = 0
+        for _, _, games, _, _, _ in similarity.top_k_neighbours(coplay, content, popularity=popularity):
+            blocks += 1
+            neighbours += len(games)
+        total = time.perf_counter() - started
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f"kept {keep.sum()} of {len(keep)} plays in {sampled:.1f}s; {neighbours} neighbours in "
+            f"{blocks} blocks, {total:.1f}s total, peak RSS {peak_mb:.0f}MB"
+        ))
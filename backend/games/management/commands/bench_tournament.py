@@ -0,0 +1,143 @@
+import json
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from games import tournament as t
+
+
+def kendall_tau(order: list[int], true_rank: dict[int, int]) -> float:
+    """Kendall tau between `order` (best first) and the hidden ranking."""
+    seq = [true_rank[gid] for gid in order]
+    n = len(seq)
+    if n < 2:
+        return 1.0
+    discordant = _count_inversions(seq)
+    pairs = n * (n - 1) // 2
+    return 1 - 2 * discordant / pairs
+
+
+def _count_inversions(seq: list[int]) -> int:
+    # bottom-up merge sort, O(n log n) so 10k-game rankings stay cheap
+    inversions, width, n = 0, 1, len(seq)
+    seq = list(seq)
+    while width < n:
+        merged = []
+        for start in range(0, n, width * 2):
+            left = seq[start:start + width]
+            right = seq[start + width:start + width * 2]
+            i = j = 0
+            while i < len(left) and j < len(right):
+                if left[i] <= right[j]:
+                    merged.append(left[i])
+                    i += 1
+                else:
+                    merged.append(right[j])
+                    inversions += len(left) - i
+                    j += 1
+            merged.extend(left[i:])
+            merged.extend(right[j:])
+        seq = merged
+        width *= 2
+    return inversions
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def tier_agreement(ranking: list[dict], true_order: list[int]) -> float:
+    """Share of games whose tier matches the tier their true position gets."""
+    labels = [r["tier"] for r in sorted(ranking, key=lambda r: r["rank"])]
+    expected = dict(zip(true_order, labels))
+    return sum(1 for r in ranking if expected[r["id"]] == r["tier"]) / len(ranking)
+
+
+def simulate(n: int, noise: float, rng: random.Random, sample_every: int, mode: str = "merge") -> dict:
+    """Play one full tournament over `n` games against a simulated user."""
+    scores = {gid: rng.random() for gid in range(n)}
+    true_order = sorted(scores, key=scores.get, reverse=True)
+    true_rank = {gid: i for i, gid in enumerate(true_order)}
+    genres = [f"Genre {i}" for i in range(max(1, n // 25))]
+    games = [(gid, rng.choice(genres)) for gid in range(n)]
+
+    started = time.process_time()
+    if mode == "adaptive":
+        state = t.build_adaptive_state([gid for gid, _ in games], budget=t.grouped_total(games))
+    else:
+        state = t.build_initial_state(games)
+    build_seconds = time.process_time() - started
+    state_bytes = [len(json.dumps(state, separators=(",", ":")))]
+
+    answer_times = []
+    while state["phase"] != "finished":
+        a, b = t.current_pair(state)
+        # noisy oracle: each side's hidden score is perturbed per question
+        a_wins = scores[a] + rng.gauss(0, noise) > scores[b] + rng.gauss(0, noise) if noise else scores[a] > scores[b]
+        winner, loser = (a, b) if a_wins else (b, a)
+        started = time.process_time()
+        state = t.answer(state, winner, loser)
+        answer_times.append(time.process_time() - started)
+        if len(answer_times) % sample_every == 0:
+            state_bytes.append(len(json.dumps(state, separators=(",", ":"))))
+
+    ranked = [r["id"] for r in sorted(state["ranking"], key=lambda r: r["rank"])]
+    return {
+        "mode": mode,
+        "games": n,
+        "noise": noise,
+        "comparisons": len(answer_times),
+        "estimated_total": state["total"],
+        "build_ms": round(build_seconds * 1000, 3),
+        "answer_us_mean": round(statistics.fmean(answer_times) * 1e6, 2) if answer_times else 0,
+        "answer_us_p95": round(_percentile(answer_times, 0.95) * 1e6, 2) if answer_times else 0,
+        "answer_us_max": round(max(answer_times) * 1e6, 2) if answer_times else 0,
+        "state_bytes_initial": state_bytes[0],
+        "state_bytes_max": max(state_bytes),
+        "state_bytes_final": len(json.dumps(state, separators=(",", ":"))),
+        "kendall_tau": round(kendall_tau(ranked, true_rank), 4),
+        "tier_agreement": round(tier_agreement(state["ranking"], true_order), 4),
+        "top10_hits": len(set(ranked[:10]) & set(true_order[:10])),
+    }
+
+
+class Command(BaseCommand):
+    help = "Run simulated tournaments through games.tournament and record cost and accuracy."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10,100,1000,10000",
+                            help="comma separated library sizes")
+        parser.add_argument("--noise", type=float, action="append",
+                            help="oracle noise (std dev on scores in [0, 1]); repeatable, default 0")
+        parser.add_argument("--mode", choices=["merge", "adaptive"], action="append",
+                            help="engine mode; repeatable, default merge")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--sample-every", type=int, default=100,
+                            help="measure serialized state size every N answers")
+        parser.add_argument("--output", default="bench_tournament.json",
+                            help="where to write the JSON results")
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options["sizes"].split(",") if s.strip()]
+        noises = options["noise"] or [0.0]
+        modes = options["mode"] or ["merge"]
+        results = []
+        for mode in modes:
+            for noise in noises:
+                for n in sizes:
+                    # same seed per size/noise so modes see identical libraries
+                    rng = random.Random(f"{options['seed']}:{n}:{noise}")
+                    row = simulate(n, noise, rng, options["sample_every"], mode)
+                    results.append(row)
+                    self.stdout.write(
+                        f"{mode:<8} n={n:<6} noise={noise:<5} asked={row['comparisons']:<7} "
+                        f"answer={row['answer_us_mean']}us state_max={row['state_bytes_max']}B "
+                        f"tau={row['kendall_tau']} tiers={row['tier_agreement']}"
+                    )
+
+        with open(options["output"], "w") as fh:
+            json.dump({"created": time.time(), "seed": options["seed"], "results": results}, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"wrote {len(results)} results to {options['output']}"))
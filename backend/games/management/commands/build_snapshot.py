@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from games.snapshot import SNAPSHOT_KEEP, build_snapshot
+
+
+class Command(BaseCommand):
+    help = "Write a compressed SQLite snapshot of the catalog plus manifest.json for offline clients."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default=settings.SNAPSHOT_ROOT,
+                            help="directory served at SNAPSHOT_URL")
+        parser.add_argument("--keep", type=int, default=SNAPSHOT_KEEP,
+                            help="how many snapshot files to keep")
+
+    def handle(self, *args, **options):
+        manifest = build_snapshot(options["output"], keep=options["keep"])
+        self.stdout.write(self.style.SUCCESS(
+            f"wrote {manifest['file']}: {manifest['games']} games, {manifest['bytes']} bytes"
+        ))
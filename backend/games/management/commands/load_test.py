@@ -0,0 +1,99 @@
+import json
+import statistics
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# (label, path) pairs hit in every run: each sync endpoint and its async twin
+DEFAULT_PATHS = [
+    ("sync games", "/api/games/?page_size=100"),
+    ("async games", "/api/async/games/?page_size=100"),
+    ("sync status", "/api/games/tournament/status/"),
+    ("async status", "/api/async/games/tournament/status/"),
+]
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def _login(base: str, username: str, password: str) -> urllib.request.OpenerDirector:
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+    request = urllib.request.Request(
+        f"{base}/api/login/",
+        data=json.dumps({"username": username, "password": password}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    opener.open(request).read()
+    return opener
+
+
+class Command(BaseCommand):
+    help = "Hit sync and async endpoints of a running server concurrently and compare throughput."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://localhost:8000")
+        parser.add_argument("--username", required=True)
+        parser.add_argument("--password", required=True)
+        parser.add_argument("--concurrency", type=int, action="append",
+                            help="concurrent clients; repeatable, default 1, 16 and 64")
+        parser.add_argument("--requests", type=int, default=500, help="requests per endpoint and level")
+        parser.add_argument("--output", default="load_test.json",
+                            help="where to write the JSON results")
+
+    def handle(self, *args, **options):
+        base = options["base_url"].rstrip("/")
+        try:
+            opener = _login(base, options["username"], options["password"])
+        except OSError as exc:
+            raise CommandError(f"login against {base} failed: {exc}")
+
+        results = []
+        for concurrency in options["concurrency"] or [1, 16, 64]:
+            for label, path in DEFAULT_PATHS:
+                row = self._run(opener, base + path, concurrency, options["requests"])
+                row.update(endpoint=label, path=path, concurrency=concurrency)
+                results.append(row)
+                self.stdout.write(
+                    f"{label:<13} c={concurrency:<4} rps={row['rps']:<8} p50={row['p50_ms']}ms "
+                    f"p95={row['p95_ms']}ms errors={row['errors']}"
+                )
+
+        with open(options["output"], "w") as fh:
+            json.dump({"created": time.time(), "base_url": base, "results": results}, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"wrote {len(results)} results to {options['output']}"))
+
+    def _run(self, opener, url: str, concurrency: int, total: int) -> dict:
+        latencies, errors = [], 0
+        lock = threading.Lock()
+
+        def hit(_):
+            nonlocal errors
+            started = time.perf_counter()
+            try:
+                opener.open(url).read()
+                failed = False
+            except OSError:
+                failed = True
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                errors += failed
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(hit, range(total)))
+        wall = time.perf_counter() - started
+        return {
+            "requests": total,
+            "errors": errors,
+            "rps": round(total / wall, 1),
+            "p50_ms": round(statistics.median(latencies) * 1000, 1),
+            "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+        }
@@ -1,15 +1,25 @@
 from django.core.management.base import BaseCommand
 from background_task.models import Task
-from games.tasks import fetch_games
+from games.tasks import fetch_games, refresh_community_scores, build_similarity_index, reconcile_players_count, build_catalog_snapshot
+
+# (task, repeat interval in seconds)
+RECURRING_TASKS = [
+    (fetch_games, 300),
+    (refresh_community_scores, 600),
+    (build_similarity_index, Task.DAILY),
+    (reconcile_players_count, Task.HOURLY),
+    (build_catalog_snapshot, Task.DAILY),
+]
 
 
 class Command(BaseCommand):
-    help = "Ensure a recurring fetch_games task is scheduled."
+    help = "Ensure the recurring background tasks are scheduled."
 
     def handle(self, *args, **options):
-        # if a job already exists with the desired repeat interval don't add
-        existing = Task.objects.filter(task_name="games.tasks.fetch_games", repeat=300)
-        if existing.exists():
-            self.stdout.write("fetch_games already scheduled")
-            return
-        fetch_games(repeat=300)
+        for task, repeat in RECURRING_TASKS:
+            # if a job already exists with the desired repeat interval don't add
+            existing = Task.objects.filter(task_name=task.name, repeat=repeat)
+            if existing.exists():
+                self.stdout.write(f"{task.name} already scheduled")
+                continue
+            task(repeat=repeat)
@@ -0,0 +1,186 @@
+"""
+Batch title matching for library imports.
+
+Raw titles (exports from other launchers, hand-typed lists) are normalised
+— lower case, accents and punctuation stripped, roman numerals turned into
+digits, a leading "the" and trailing edition suffixes dropped — and looked
+up in an in-memory index built once from Game.name:
+
+  exact:    normalised name -> game ids
+  postings: sparse trigram x game matrix, for fuzzy candidates
+
+Fuzzy titles are matched in batches of BATCH_SIZE with one sparse product
+against the postings. Only trigrams in at most MAX_POSTINGS games take part
+(a title made only of common trigrams falls back to its rarest one), so a
+batch costs the summed postings of its titles' rare trigrams. Every game
+the product reaches is scored by trigram Jaccard, counting just those
+shared rare trigrams; the RERANK_CANDIDATES best are scored by edit
+similarity (difflib ratio) of the normalised names, skipping any whose
+cheap upper bounds (real_quick_ratio, quick_ratio) can't reach the
+candidates kept so far.
+
+Results:
+  matched:   one exact hit, or a fuzzy hit >= MATCH_THRESHOLD that beats
+             the runner-up by MATCH_MARGIN
+  ambiguous: several exact hits, or fuzzy candidates >= CANDIDATE_THRESHOLD
+  unmatched: nothing close enough
+"""
+
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+import numpy as np
+from scipy import sparse
+
+
+MATCH_THRESHOLD = 0.75
+MATCH_MARGIN = 0.10
+CANDIDATE_THRESHOLD = 0.40
+MAX_CANDIDATES = 5
+RERANK_CANDIDATES = 10
+MAX_POSTINGS = 2000           # trigrams more common than this aren't probed
+BATCH_SIZE = 256              # fuzzy titles per sparse product
+
+ROMAN = {"ii": "2", "iii": "3", "iv": "4", "v": "5", "vi": "6", "vii": "7", "viii": "8", "ix": "9", "x": "10"}
+EDITION_SUFFIX = re.compile(
+    r"\s+(game of the year|goty|definitive|complete|deluxe|remastered|enhanced|ultimate|gold)"
+    r"( edition)?$"
+)
+
+
+def normalise(title: str) -> str:
+    title = unicodedata.normalize("NFKD", title).encode("ascii", "ignore").decode()
+    title = re.sub(r"[^a-z0-9]+", " ", title.lower()).strip()
+    words = [ROMAN.get(w, w) for w in title.split()]
+    if words[:1] == ["the"]:
+        words = words[1:]
+    return EDITION_SUFFIX.sub("", " ".join(words))
+
+
+def trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+
+
+def _by_score(candidate: tuple[int, float]):
+    return -candidate[1], candidate[0]
+
+
+class TitleIndex:
+    def __init__(self, games):
+        """`games` is an iterable of (id, name)."""
+        self.names: dict[int, str] = {}
+        self.exact: dict[str, list[int]] = {}
+        # per matrix column: game id, normalised name and trigram count
+        self.ids: list[int] = []
+        self.keys: list[str] = []
+        self.vocab: dict[str, int] = {}
+        rows, sizes = [], []
+        for gid, name in games:
+            key = normalise(name)
+            self.names[gid] = name
+            self.exact.setdefault(key, []).append(gid)
+            self.ids.append(gid)
+            self.keys.append(key)
+            grams = trigrams(key)
+            rows.extend(self.vocab.setdefault(gram, len(self.vocab)) for gram in grams)
+            sizes.append(len(grams))
+        rows = np.asarray(rows, dtype=np.int32)
+        self.sizes = np.asarray(sizes, dtype=np.float32)
+        self.counts = np.bincount(rows, minlength=len(self.vocab))
+        self.postings = sparse.csc_matrix(
+            (np.ones(len(rows), dtype=np.float32), rows, np.r_[0, np.cumsum(sizes)]),
+            shape=(len(self.vocab), len(self.ids)),
+        ).tocsr()
+
+    def _probes(self, key: str) -> tuple[list[int], int]:
+        """Postings rows to probe for `key`, and its trigram count."""
+        grams = trigrams(key)
+        known = [self.vocab[g] for g in grams if g in self.vocab]
+        # rare trigrams find the candidates; very common ones only add noise
+        probes = [row for row in known if self.counts[row] <= MAX_POSTINGS]
+        if not probes and known:
+            probes = [min(known, key=self.counts.__getitem__)]
+        return probes, len(grams)
+
+    def _pools(self, keys: list[str]) -> list[list[int]]:
+        """The RERANK_CANDIDATES best columns for each key, best first."""
+        probes = [self._probes(key) for key in keys]
+        lengths = [len(rows) for rows, _ in probes]
+        query = sparse.csr_matrix(
+            (np.ones(sum(lengths), dtype=np.float32),
+             np.asarray([row for rows, _ in probes for row in rows], dtype=np.int32),
+             np.r_[0, np.cumsum(lengths)]),
+            shape=(len(keys), len(self.vocab)),
+        )
+        shared = (query @ self.postings).tocsr()
+        key_sizes = np.asarray([size for _, size in probes], dtype=np.float32)
+        owner = np.repeat(np.arange(len(keys)), np.diff(shared.indptr))
+        jaccard = shared.data / (key_sizes[owner] + self.sizes[shared.indices] - shared.data)
+
+        pools = []
+        for i in range(len(keys)):
+            start, stop = shared.indptr[i], shared.indptr[i + 1]
+            scores = jaccard[start:stop]
+            top = np.arange(stop - start)
+            if len(top) > RERANK_CANDIDATES:
+                top = np.argpartition(-scores, RERANK_CANDIDATES)[:RERANK_CANDIDATES]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            pools.append(shared.indices[start:stop][top].tolist())
+        return pools
+
+    def _rerank(self, key: str, pool: list[int]) -> list[tuple[int, float]]:
+        """Edit similarity of the pool's names; the MAX_CANDIDATES best that
+        reach CANDIDATE_THRESHOLD."""
+        matcher = SequenceMatcher(b=key, autojunk=False)
+        scored = []
+        floor = CANDIDATE_THRESHOLD
+        for column in pool:
+            matcher.set_seq1(self.keys[column])
+            # both bounds are >= ratio(), and far cheaper
+            if matcher.real_quick_ratio() < floor or matcher.quick_ratio() < floor:
+                continue
+            scored.append((self.ids[column], matcher.ratio()))
+            if len(scored) > MAX_CANDIDATES:
+                scored.sort(key=_by_score)
+                scored.pop()
+            if len(scored) == MAX_CANDIDATES:
+                floor = max(CANDIDATE_THRESHOLD, min(score for _, score in scored))
+        scored.sort(key=_by_score)
+        return [c for c in scored if c[1] >= CANDIDATE_THRESHOLD]
+
+    def match_many(self, titles: list[str]) -> list[tuple[str, list[tuple[int, float]]]]:
+        """Classify each title; returns [(status, [(game id, score), ...]), ...]."""
+        keys = [normalise(title) for title in titles]
+        results = [None] * len(keys)
+        fuzzy = []
+        for i, key in enumerate(keys):
+            exact = self.exact.get(key)
+            if not key:
+                results[i] = "unmatched", []
+            elif exact:
+                results[i] = ("matched" if len(exact) == 1 else "ambiguous"), [(gid, 1.0) for gid in exact]
+            else:
+                fuzzy.append(i)
+        for start in range(0, len(fuzzy), BATCH_SIZE):
+            batch = fuzzy[start:start + BATCH_SIZE]
+            for i, pool in zip(batch, self._pools([keys[i] for i in batch])):
+                results[i] = _classify(self._rerank(keys[i], pool))
+        return results
+
+    def match(self, title: str) -> tuple[str, list[tuple[int, float]]]:
+        """Classify one title; see match_many."""
+        return self.match_many([title])[0]
+
+
+def _classify(candidates: list[tuple[int, float]]) -> tuple[str, list[tuple[int, float]]]:
+    if not candidates:
+        return "unmatched", []
+    best = candidates[0][1]
+    runner_up = candidates[1][1] if len(candidates) > 1 else 0.0
+    if best >= MATCH_THRESHOLD and best - runner_up >= MATCH_MARGIN:
+        return "matched", candidates[:1]
+    return "ambiguous", candidates
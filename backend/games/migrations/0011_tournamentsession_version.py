@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0010_tournamentsession_delete_mergesortsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tournamentsession',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
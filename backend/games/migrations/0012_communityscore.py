@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-19 08:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0011_tournamentsession_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommunityScore',
+            fields=[
+                ('game', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='community_score', serialize=False, to='games.game')),
+                ('score', models.FloatField(db_index=True)),
+                ('comparisons', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-19 08:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0012_communityscore'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameNeighbour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='games.game')),
+                ('neighbour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='games.game')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('game', 'rank'), name='game_neighbour_rank')],
+            },
+        ),
+    ]
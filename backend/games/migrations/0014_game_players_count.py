@@ -0,0 +1,48 @@
+# Generated by Django 5.1.7 on 2026-10-19 08:39
+
+import datetime
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_players_count(apps, schema_editor):
+    Game = apps.get_model('games', 'Game')
+    counts = (Game.players.through.objects.filter(game_id=OuterRef('pk')).order_by()
+              .values('game_id').annotate(c=Count('pk')).values('c'))
+    Game.objects.update(players_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0013_gameneighbour'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='players_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_players_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(models.OrderBy(models.F('players_count'), descending=True), models.F('name'), name='game_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(models.OrderBy(django.db.models.functions.comparison.Coalesce(models.F('rating'), models.Value(-1.0)), descending=True), models.F('name'), name='game_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(models.OrderBy(django.db.models.functions.comparison.Coalesce(models.F('release_date'), models.Value(datetime.date(1, 1, 1))), descending=True), models.F('name'), name='game_release_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['name'], name='game_name_idx'),
+        ),
+    ]
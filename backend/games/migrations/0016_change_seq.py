@@ -0,0 +1,46 @@
+# Generated by Django 5.1.7 on 2026-10-19 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0015_game_timestamps_gametombstone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='game',
+            name='game_changes_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='gametombstone',
+            name='tombstone_changes_idx',
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='change_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='gametombstone',
+            name='change_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['change_seq', 'id'], name='game_changes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gametombstone',
+            index=models.Index(fields=['change_seq', 'game_id'], name='tombstone_changes_idx'),
+        ),
+    ]
@@ -1,4 +1,8 @@
-from django.db import models
+import datetime
+
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
 
 class Genre(models.Model):
@@ -15,6 +19,32 @@ class Platform(models.Model):
         return self.name
 
 
+class ChangeCounter(models.Model):
+    """One row numbering catalog changes for the delta sync feed."""
+    value = models.BigIntegerField(default=0)
+
+
+def next_change() -> int:
+    """The next catalog change number. Call it inside the writing transaction.
+
+    The increment keeps the counter row locked until that transaction
+    ends, so the next number is only handed out after this one has
+    committed (or rolled back): numbers become visible in order, and a
+    feed reader that has seen N has seen every change before it.
+    """
+    if not ChangeCounter.objects.filter(pk=1).update(value=F("value") + 1):
+        ChangeCounter.objects.get_or_create(pk=1)
+        ChangeCounter.objects.filter(pk=1).update(value=F("value") + 1)
+    return ChangeCounter.objects.values_list("value", flat=True).get(pk=1)
+
+
+# sort keys for unrated / undated games, so they order last. coalescing
+# rather than NULLS LAST keeps the index expressions portable (SQLite
+# can't index NULLS LAST); GameList orders by these exact expressions
+RATING_SORT = Coalesce(F("rating"), Value(-1.0))
+RELEASE_SORT = Coalesce(F("release_date"), Value(datetime.date.min))
+
+
 class Game(models.Model):
     name = models.CharField(max_length=200)
     genres = models.ManyToManyField(Genre, related_name="games", blank=True)
@@ -24,10 +54,38 @@ class Game(models.Model):
     image = models.URLField(blank=True, null=True)
     rawg_id = models.IntegerField(unique=True, null=True, blank=True)
     players = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name="played_games", blank=True)
+    # denormalized len(players), kept in step by the played endpoints and
+    # periodically reconciled by tasks.reconcile_players_count
+    players_count = models.PositiveIntegerField(default=0)
+    # catalog changes (fields, genres, platforms) bump updated_at and
+    # change_seq for the delta sync API; players_count updates
+    # deliberately don't
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    change_seq = models.BigIntegerField(default=0)
+
+    class Meta:
+        # one index per GameList ordering, matching its ORDER BY exactly
+        indexes = [
+            models.Index(F("players_count").desc(), F("name"), name="game_popular_idx"),
+            models.Index(RATING_SORT.desc(), F("name"), name="game_rating_idx"),
+            models.Index(RELEASE_SORT.desc(), F("name"), name="game_release_idx"),
+            models.Index(fields=["name"], name="game_name_idx"),
+            # keyset order of games/changes/
+            models.Index(fields=["change_seq", "id"], name="game_changes_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # numbered in the transaction that writes the row; see next_change
+        with transaction.atomic(using=kwargs.get("using"), savepoint=False):
+            self.change_seq = next_change()
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "change_seq"}
+            super().save(*args, **kwargs)
+
     @property
     def genre(self):
         # exposable property kept for backward compatibility
@@ -45,9 +103,53 @@ class TournamentSession(models.Model):
         related_name="tournament_session",
     )
     state = models.JSONField(default=dict)
+    # bumped on every write; answers compare-and-swap against it so that
+    # concurrent submissions can't silently overwrite each other
+    version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"TournamentSession({self.user.username})"
 
+
+
+class CommunityScore(models.Model):
+    """Bradley–Terry log-strength of a game fitted over all users' rankings."""
+    game = models.OneToOneField(Game, on_delete=models.CASCADE, primary_key=True, related_name="community_score")
+    score = models.FloatField(db_index=True)
+    comparisons = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"CommunityScore({self.game_id}, {self.score:.3f})"
+
+
+class GameNeighbour(models.Model):
+    """Precomputed "games like this": the top-K most similar games per game."""
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name="neighbours")
+    neighbour = models.ForeignKey(Game, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            # also the index serving reads: WHERE game_id = ? ORDER BY rank
+            models.UniqueConstraint(fields=["game", "rank"], name="game_neighbour_rank"),
+        ]
+
+    def __str__(self):
+        return f"GameNeighbour({self.game_id} -> {self.neighbour_id})"
+
+
+class GameTombstone(models.Model):
+    """Left behind by a deleted Game so catalog mirrors can drop it too."""
+    game_id = models.BigIntegerField(primary_key=True)
+    deleted_at = models.DateTimeField()
+    change_seq = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=["change_seq", "game_id"], name="tombstone_changes_idx")]
+
+    def __str__(self):
+        return f"GameTombstone({self.game_id})"
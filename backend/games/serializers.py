@@ -1,7 +1,28 @@
+from functools import cache
+
 from rest_framework import serializers
 from .models import Game, Genre, Platform
 
 
+# left out unless asked for with ?fields=: one user id per player, unbounded
+GAME_DEFAULT_EXCLUDE = {'players'}
+# the relation each field reads; prefetched only when the field is output
+GAME_FIELD_RELATIONS = {
+    'genre': 'genres', 'genres': 'genres',
+    'platform': 'platforms', 'platforms': 'platforms',
+    'players': 'players',
+}
+
+
+def _is_prefetched(obj, relation):
+    return relation in getattr(obj, '_prefetched_objects_cache', {})
+
+
+def _joined_names(obj, relation):
+    # same output as Game.genre/Game.platform, read from the prefetch cache
+    return ", ".join(o.name for o in getattr(obj, relation).all())
+
+
 class GameSerializer(serializers.ModelSerializer):
     genre = serializers.SerializerMethodField()
     platform = serializers.SerializerMethodField()
@@ -10,19 +31,31 @@ class GameSerializer(serializers.ModelSerializer):
     class Meta:
         model = Game
         fields = '__all__'
+        read_only_fields = ['players_count']
+
+    def __init__(self, *args, fields=None, **kwargs):
+        # `fields` limits the output, see game_fields()
+        super().__init__(*args, **kwargs)
+        keep = set(fields) if fields is not None else set(self.fields) - GAME_DEFAULT_EXCLUDE
+        for name in set(self.fields) - keep:
+            self.fields.pop(name)
 
     def get_is_played(self, obj):
         # `request` is passed via context in the views; guard against unauthenticated
         request = self.context.get('request')
         if request and hasattr(request, "user") and request.user.is_authenticated:
+            # views that already know the user's played ids pass them in
+            played_ids = self.context.get('played_ids')
+            if played_ids is not None:
+                return obj.pk in played_ids
             return obj.players.filter(pk=request.user.pk).exists()
         return False
 
     def get_genre(self, obj):
-        return obj.genre
+        return _joined_names(obj, 'genres') if _is_prefetched(obj, 'genres') else obj.genre
 
     def get_platform(self, obj):
-        return obj.platform
+        return _joined_names(obj, 'platforms') if _is_prefetched(obj, 'platforms') else obj.platform
 
     def create(self, validated_data):
         # handle comma-separated genre/platform if provided
@@ -58,6 +91,33 @@ class GameSerializer(serializers.ModelSerializer):
         return game
 
 
+@cache
+def _game_field_names() -> frozenset[str]:
+    return frozenset(GameSerializer(fields=None).fields) | GAME_DEFAULT_EXCLUDE
+
+
+def _names(value: str) -> set[str]:
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def game_fields(query_params) -> set[str]:
+    """Output fields picked by ?fields=a,b (replacing the defaults) and/or ?exclude=a,b."""
+    available = _game_field_names()
+    picked = _names(query_params.get('fields', ''))
+    excluded = _names(query_params.get('exclude', ''))
+    unknown = (picked | excluded) - available
+    if unknown:
+        raise serializers.ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}."})
+    return (picked or available - GAME_DEFAULT_EXCLUDE) - excluded
+
+
+def only_game_fields(qs, fields: set[str]):
+    """Load only the columns and relations that `fields` will read."""
+    columns = [f.name for f in Game._meta.concrete_fields if f.name in fields]
+    relations = sorted({GAME_FIELD_RELATIONS[f] for f in fields if f in GAME_FIELD_RELATIONS})
+    return qs.only('pk', *columns).prefetch_related(*relations)
+
+
 class GenreSerializer(serializers.ModelSerializer):
     class Meta:
         model = Genre
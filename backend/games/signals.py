@@ -0,0 +1,63 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching
+from .models import Game, GameTombstone, next_change
+
+
+@receiver(post_delete, sender=Game)
+def record_tombstone(sender, instance, **kwargs):
+    # inside the delete's transaction, which next_change needs
+    GameTombstone.objects.update_or_create(
+        game_id=instance.pk, defaults={"deleted_at": timezone.now(), "change_seq": next_change()},
+    )
+
+
+@receiver(m2m_changed, sender=Game.genres.through)
+@receiver(m2m_changed, sender=Game.platforms.through)
+def touch_catalog_games(sender, instance, action, reverse, pk_set, **kwargs):
+    # genres/platforms are part of a game's feed entry, but editing them
+    # doesn't save the game; m2m signals run inside the edit's transaction
+    if action == "pre_clear" and reverse:
+        # genre.games.clear(): note the games while they're still linked
+        field = "genre" if sender is Game.genres.through else "platform"
+        instance._cleared_game_ids = list(sender.objects.filter(**{field: instance}).values_list("game_id", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        # add() of links that already exist still signals, with no ids
+        game_ids = [instance.pk] if pk_set or action == "post_clear" else []
+    elif action == "post_clear":
+        game_ids = instance.__dict__.pop("_cleared_game_ids", [])
+    else:
+        game_ids = list(pk_set or ())
+    if game_ids:
+        Game.objects.filter(pk__in=game_ids).update(updated_at=timezone.now(), change_seq=next_change())
+
+
+@receiver(m2m_changed, sender=Game.players.through)
+def forget_played_sets(sender, instance, action, reverse, pk_set, **kwargs):
+    # library edits outside the played endpoints (admin, user.played_games.add())
+    if action == "pre_clear" and not reverse:
+        # clear() doesn't say which users it removed; note them while they're there
+        instance._cleared_player_ids = list(instance.players.values_list("pk", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        user_ids = [instance.pk]
+    elif action == "post_clear":
+        user_ids = instance.__dict__.pop("_cleared_player_ids", [])
+    else:
+        user_ids = list(pk_set or ())
+
+    def forget():
+        for user_id in user_ids:
+            caching.forget_played(user_id)
+            caching.bump_user_version(user_id)
+
+    # after commit, so a concurrent read can't re-cache the old set
+    transaction.on_commit(forget)
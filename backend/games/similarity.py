@@ -0,0 +1,147 @@
+"""
+Item-item similarity index for "games like this".
+
+Every game gets two sparse, L2-normalised vectors:
+  co-play: which users played it (the `players` through table)
+  content: which genres and platforms it has
+
+The similarity of two games is
+  COPLAY_WEIGHT * cos(co-play) + (1 - COPLAY_WEIGHT) * cos(content)
+
+Candidates come from two places: every game that shares at least one
+player (a sparse block product Xb.T @ X), plus the most played games with
+the exact same genre/platform signature, so new or niche games still get
+neighbours. Candidates are scored with row-wise sparse dot products and
+cut down to the top K per game with one lexsort per block.
+
+The block product costs, per game, the summed library size of its
+players, so it grows with the square of play counts. To bound it, the
+co-play matrix keeps a random sample of at most MAX_PLAYERS_PER_GAME
+players per game and MAX_GAMES_PER_USER games per user
+(sample_per_key), and blocks are cut so that each one's estimated
+product size stays under BLOCK_MAX_WORK entries, as well as at most
+BLOCK_SIZE games. `manage.py bench_similarity` times the whole build on
+synthetic, skewed play data.
+"""
+
+import numpy as np
+from scipy import sparse
+
+
+TOP_K = 20
+COPLAY_WEIGHT = 0.7
+BLOCK_SIZE = 2048
+BLOCK_MAX_WORK = 20_000_000    # candidate pairs per block product, ~250MB peak
+MAX_PLAYERS_PER_GAME = 2000
+MAX_GAMES_PER_USER = 1000
+
+
+def normalise_columns(matrix: sparse.csc_matrix) -> sparse.csc_matrix:
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    return (matrix @ sparse.diags(1 / norms)).tocsc()
+
+
+def build_matrix(rows: np.ndarray, cols: np.ndarray, shape: tuple[int, int]) -> sparse.csc_matrix:
+    """Binary sparse matrix from (row, col) index pairs; duplicates collapse."""
+    matrix = sparse.csc_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=shape)
+    matrix.data[:] = 1
+    return matrix
+
+
+def sample_per_key(keys: np.ndarray, limit: int, seed: int = 0) -> np.ndarray:
+    """Mask keeping a random `limit` of the entries for each distinct key."""
+    order = np.random.default_rng(seed).permutation(len(keys))
+    order = order[np.argsort(keys[order], kind="stable")]
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    ranks = np.arange(len(keys)) - np.repeat(starts, np.diff(np.r_[starts, len(keys)]))
+    keep = np.zeros(len(keys), dtype=bool)
+    keep[order[ranks < limit]] = True
+    return keep
+
+
+def _blocks(work: np.ndarray, block_size: int, max_work: float):
+    """[start, stop) column ranges of at most block_size games and max_work work."""
+    cumulative = np.r_[0, np.cumsum(work)]
+    start, n = 0, len(work)
+    while start < n:
+        fits = int(np.searchsorted(cumulative, cumulative[start] + max_work, side="right")) - 1
+        stop = max(start + 1, min(start + block_size, fits))
+        yield start, stop
+        start = stop
+
+
+def _signature_candidates(content: sparse.csc_matrix, popularity: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """(game, candidate) pairs: the k + 1 most played games sharing each game's signature."""
+    n = content.shape[1]
+    # a random projection gives every distinct feature set its own signature
+    signatures = content.T @ np.random.default_rng(0).random(content.shape[0])
+    order = np.lexsort((-popularity, signatures))
+    sig_sorted = signatures[order]
+    starts = np.flatnonzero(np.r_[True, sig_sorted[1:] != sig_sorted[:-1]])
+    sizes = np.diff(np.r_[starts, n])
+    group_of = np.repeat(np.arange(len(starts)), sizes)
+
+    per_game = np.minimum(sizes, k + 1)[group_of]
+    games = np.repeat(order, per_game)
+    offsets = np.arange(per_game.sum()) - np.repeat(np.cumsum(per_game) - per_game, per_game)
+    cands = order[np.repeat(starts[group_of], per_game) + offsets]
+    return games, cands
+
+
+def top_k_neighbours(
+    coplay: sparse.csc_matrix,
+    content: sparse.csc_matrix,
+    k: int = TOP_K,
+    coplay_weight: float = COPLAY_WEIGHT,
+    block_size: int = BLOCK_SIZE,
+    max_work: float = BLOCK_MAX_WORK,
+    popularity: np.ndarray | None = None,
+):
+    """Yield (start, stop, games, neighbours, scores, ranks) per block of
+    game columns [start, stop); arrays hold column indices, not game ids.
+
+    `coplay` is users x games and `content` is features x games, both with
+    games as columns in the same order. `popularity` (play counts, for
+    tie-breaks) defaults to the column sums of `coplay`; pass the real
+    counts when `coplay` is sampled.
+    """
+    n = coplay.shape[1]
+    if popularity is None:
+        popularity = np.asarray(coplay.sum(axis=0)).ravel()
+    # a game's share of the block product: its players' summed library sizes
+    work = coplay.T @ np.asarray(coplay.sum(axis=1), dtype=np.float64).ravel()
+    coplay_n = normalise_columns(coplay)
+    content_n = normalise_columns(content)
+    content_rows = content_n.T.tocsr()
+    sig_games, sig_cands = _signature_candidates(content, popularity, k)
+    sig_order = np.argsort(sig_games, kind="stable")
+    sig_games, sig_cands = sig_games[sig_order], sig_cands[sig_order]
+
+    for start, stop in _blocks(work, block_size, max_work):
+        block = (coplay_n[:, start:stop].T @ coplay_n).tocoo()
+        lo, hi = np.searchsorted(sig_games, [start, stop])
+
+        games = np.concatenate([block.row.astype(np.int64) + start, sig_games[lo:hi]])
+        cands = np.concatenate([block.col.astype(np.int64), sig_cands[lo:hi]])
+        coplay_score = np.concatenate([block.data, np.zeros(hi - lo)])
+
+        keep = games != cands
+        games, cands, coplay_score = games[keep], cands[keep], coplay_score[keep]
+        # a pair can come from both sources: keep the co-play score
+        codes = games * n + cands
+        order = np.lexsort((-coplay_score, codes))
+        first = np.r_[True, codes[order][1:] != codes[order][:-1]]
+        pick = order[first]
+        games, cands, coplay_score = games[pick], cands[pick], coplay_score[pick]
+
+        content_score = np.asarray(content_rows[games].multiply(content_rows[cands]).sum(axis=1)).ravel()
+        scores = coplay_weight * coplay_score + (1 - coplay_weight) * content_score
+
+        order = np.lexsort((-popularity[cands], -scores, games))
+        games, cands, scores = games[order], cands[order], scores[order]
+        starts = np.flatnonzero(np.r_[True, games[1:] != games[:-1]])
+        ranks = np.arange(len(games)) - np.repeat(starts, np.diff(np.r_[starts, len(games)]))
+        top = ranks < k
+        yield start, stop, games[top], cands[top], scores[top], ranks[top]
@@ -0,0 +1,161 @@
+"""
+Offline catalog snapshots.
+
+build_snapshot() copies the whole public catalog, read in one
+repeatable-read transaction, into a SQLite database
+
+  games(id, name, release_date, rating, image, rawg_id, players_count, updated_at)
+  genres(id, name)            platforms(id, name)
+  game_genres(game_id, genre_id)   game_platforms(game_id, platform_id)
+  meta(key, value)
+
+indexed for the usual lookups (name, games by genre/platform), gzips it
+as catalog-<version>.sqlite.gz and only then rewrites manifest.json, so
+the manifest never points at a half-written file. Clients download the
+file once and follow games/changes/ from the manifest's changes_cursor.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import secrets
+import shutil
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .changes import changes_cursor
+from .models import ChangeCounter, Game, Genre, Platform
+
+
+SNAPSHOT_SCHEMA = 1
+SNAPSHOT_KEEP = 3
+SNAPSHOT_CHUNK_SIZE = 5000
+
+SCHEMA = """
+CREATE TABLE games (
+    id INTEGER PRIMARY KEY, name TEXT NOT NULL, release_date TEXT, rating REAL,
+    image TEXT, rawg_id INTEGER, players_count INTEGER NOT NULL, updated_at TEXT NOT NULL
+);
+CREATE TABLE genres (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+CREATE TABLE platforms (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+CREATE TABLE game_genres (game_id INTEGER NOT NULL, genre_id INTEGER NOT NULL,
+                          PRIMARY KEY (game_id, genre_id)) WITHOUT ROWID;
+CREATE TABLE game_platforms (game_id INTEGER NOT NULL, platform_id INTEGER NOT NULL,
+                             PRIMARY KEY (game_id, platform_id)) WITHOUT ROWID;
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+# built after loading, which is much faster than maintaining them per insert
+INDEXES = """
+CREATE INDEX games_name ON games (name COLLATE NOCASE);
+CREATE INDEX game_genres_genre ON game_genres (genre_id, game_id);
+CREATE INDEX game_platforms_platform ON game_platforms (platform_id, game_id);
+"""
+
+
+def _copy(db: sqlite3.Connection, table: str, rows, width: int) -> int:
+    sql = f"INSERT INTO {table} VALUES ({', '.join('?' * width)})"
+    copied = 0
+    while chunk := list(islice(rows, SNAPSHOT_CHUNK_SIZE)):
+        db.executemany(sql, chunk)
+        copied += len(chunk)
+    return copied
+
+
+def _game_rows():
+    for gid, name, released, rating, image, rawg_id, players, updated in (
+        Game.objects.order_by("pk")
+        .values_list("pk", "name", "release_date", "rating", "image", "rawg_id", "players_count", "updated_at")
+        .iterator(chunk_size=SNAPSHOT_CHUNK_SIZE)
+    ):
+        yield gid, name, released and released.isoformat(), rating, image, rawg_id, players, updated.isoformat()
+
+
+@contextmanager
+def _consistent_read():
+    """A transaction in which every query sees the same committed state."""
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        # Postgres' default READ COMMITTED takes a new snapshot per query;
+        # SQLite's read transaction is consistent already. The isolation
+        # level can only be set before a transaction's first query
+        if connection.vendor == "postgresql" and outermost:
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        yield
+
+
+def _write_database(path: Path, version: str) -> tuple[int, dict]:
+    """Copy the catalog into `path`; returns the change number it was read at, and row counts."""
+    db = sqlite3.connect(path)
+    try:
+        db.executescript("PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;" + SCHEMA)
+        with _consistent_read():
+            seq = ChangeCounter.objects.filter(pk=1).values_list("value", flat=True).first() or 0
+            counts = {
+                "games": _copy(db, "games", _game_rows(), 8),
+                "genres": _copy(db, "genres", Genre.objects.values_list("pk", "name").iterator(), 2),
+                "platforms": _copy(db, "platforms", Platform.objects.values_list("pk", "name").iterator(), 2),
+            }
+            _copy(db, "game_genres", Game.genres.through.objects.values_list("game_id", "genre_id")
+                  .iterator(chunk_size=SNAPSHOT_CHUNK_SIZE), 2)
+            _copy(db, "game_platforms", Game.platforms.through.objects.values_list("game_id", "platform_id")
+                  .iterator(chunk_size=SNAPSHOT_CHUNK_SIZE), 2)
+        db.executemany("INSERT INTO meta VALUES (?, ?)", [("version", version), ("schema", str(SNAPSHOT_SCHEMA))])
+        db.executescript(INDEXES + "ANALYZE;")
+        db.commit()
+        db.execute("VACUUM")
+    finally:
+        db.close()
+    return seq, counts
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while block := fh.read(1 << 20):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_snapshot(root, keep: int = SNAPSHOT_KEEP) -> dict:
+    """Write a new snapshot and manifest.json into `root`; returns the manifest."""
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    started = timezone.now()
+    # sorts by time; the random part keeps builds in the same instant apart
+    version = f"{started:%Y%m%d%H%M%S%f}-{secrets.token_hex(4)}"
+    name = f"catalog-{version}.sqlite.gz"
+
+    with tempfile.TemporaryDirectory(dir=root) as tmp:
+        db_path, gz_path = Path(tmp) / "catalog.sqlite", Path(tmp) / name
+        seq, counts = _write_database(db_path, version)
+        with open(db_path, "rb") as src, gzip.open(gz_path, "wb", compresslevel=9) as dst:
+            shutil.copyfileobj(src, dst)
+        manifest = {
+            "version": version,
+            "schema": SNAPSHOT_SCHEMA,
+            "format": "sqlite+gzip",
+            "file": name,
+            "bytes": gz_path.stat().st_size,
+            "sha256": _sha256(gz_path),
+            "created_at": started.isoformat(),
+            "changes_cursor": changes_cursor(seq),
+            **counts,
+        }
+        os.replace(gz_path, root / name)
+        manifest_tmp = Path(tmp) / "manifest.json"
+        manifest_tmp.write_text(json.dumps(manifest, indent=2))
+        os.replace(manifest_tmp, root / "manifest.json")
+
+    # names sort by version; the newest `keep` files stay for slow downloads
+    for old in sorted(root.glob("catalog-*.sqlite.gz"))[:-keep]:
+        old.unlink()
+    return manifest
@@ -1,7 +1,16 @@
 import requests
 import random
-from games.models import Game, Genre, Platform
+from itertools import chain
+import numpy as np
+from games.models import Game, Genre, Platform, TournamentSession, CommunityScore, GameNeighbour
+from games import caching, community, similarity, snapshot
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from background_task import background
 
 
@@ -22,29 +31,149 @@ def fetch_games(batch_size=50):
             'name': item['name'],
             'rating': item.get('rating'),
             'image': item.get('background_image'),
-            'release_date': item.get('released'),
+            'release_date': parse_date(item['released']) if item.get('released') else None,
         }
-        game, created = Game.objects.update_or_create(
-            rawg_id=item['id'],
-            defaults=defaults,
-        )
+        game, created = Game.objects.get_or_create(rawg_id=item['id'], defaults=defaults)
+
+        # only touch rows whose data actually changed, so updated_at (and
+        # the delta sync feed) isn't bumped by every refetch
+        changed = [field for field, value in defaults.items() if getattr(game, field) != value]
+        for field in changed:
+            setattr(game, field, defaults[field])
 
-        # sync genres, always clear existing relations to match API result
-        genre_names = [g.get('name', '').strip() for g in item.get('genres', []) if g.get('name')]
-        game.genres.clear()
-        for name in set(genre_names):
-            genre_obj, _ = Genre.objects.get_or_create(name=name)
-            game.genres.add(genre_obj)
+        # sync genres, replacing existing relations to match API result
+        genre_names = {g.get('name', '').strip() for g in item.get('genres', []) if g.get('name')}
+        if created or genre_names != set(game.genres.values_list('name', flat=True)):
+            game.genres.set([Genre.objects.get_or_create(name=name)[0] for name in genre_names])
+            changed.append('genres')
 
         # sync platforms similarly
-        platform_names = [p['platform'].get('name', '').strip() for p in item.get('platforms', []) if p.get('platform')]
-        game.platforms.clear()
-        for name in set(platform_names):
-            plat_obj, _ = Platform.objects.get_or_create(name=name)
-            game.platforms.add(plat_obj)
+        platform_names = {p['platform'].get('name', '').strip() for p in item.get('platforms', []) if p.get('platform')}
+        if created or platform_names != set(game.platforms.values_list('name', flat=True)):
+            game.platforms.set([Platform.objects.get_or_create(name=name)[0] for name in platform_names])
+            changed.append('platforms')
 
         if created:
             print(f"Added: {game.name}")
-        else:
+        elif changed:
+            game.save()
             print(f"Updated: {game.name}")
 
+
+@background(schedule=0)
+def refresh_community_scores(force=False):
+    # a full refit over every finished ranking, skipped when the finished
+    # sessions are unchanged; the count catches restarted or deleted ones
+    sessions = TournamentSession.objects.filter(state__phase='finished')
+    fingerprint = tuple(sessions.aggregate(n=Count('pk'), last=Max('updated_at')).values())
+    if not force and cache.get(caching.COMMUNITY_FIT_KEY) == fingerprint:
+        return
+
+    outcomes = []
+    for state in sessions.values_list('state', flat=True).iterator(chunk_size=500):
+        outcomes.extend(community.tournament_outcomes(state))
+
+    game_ids = np.array(sorted({gid for pair in outcomes for gid in pair}
+                               & set(Game.objects.values_list('pk', flat=True))), dtype=np.int64)
+    if not len(game_ids):
+        CommunityScore.objects.all().delete()
+        cache.set(caching.COMMUNITY_FIT_KEY, fingerprint, None)
+        return
+    index = {int(gid): i for i, gid in enumerate(game_ids)}
+    winners, losers, counts = community.win_matrix(outcomes, index)
+
+    # warm start from the previous fit so the refit converges in a few steps
+    init = np.zeros(len(game_ids))
+    for gid, score in CommunityScore.objects.filter(game_id__in=index).values_list('game_id', 'score'):
+        init[index[gid]] = score
+    scores = community.fit_bradley_terry(winners, losers, counts, len(game_ids), init=init)
+    played = community.comparisons_per_item(winners, losers, counts, len(game_ids))
+
+    now = timezone.now()
+    with transaction.atomic():
+        CommunityScore.objects.bulk_create(
+            [
+                CommunityScore(game_id=int(gid), score=float(scores[i]), comparisons=int(played[i]), updated_at=now)
+                for i, gid in enumerate(game_ids)
+            ],
+            update_conflicts=True,
+            unique_fields=['game'],
+            update_fields=['score', 'comparisons', 'updated_at'],
+            batch_size=1000,
+        )
+        # games no longer in any finished ranking lose their score
+        dropped, _ = CommunityScore.objects.filter(updated_at__lt=now).delete()
+    cache.set(caching.COMMUNITY_FIT_KEY, fingerprint, None)
+    print(f"Community scores refitted for {len(game_ids)} games, {dropped} dropped")
+
+
+def _id_pairs(through, column, chunk_size=10000):
+    """(game_id, other id) rows of an m2m through table as an (n, 2) array."""
+    rows = through.objects.values_list('game_id', column).iterator(chunk_size=chunk_size)
+    return np.fromiter(chain.from_iterable(rows), dtype=np.int64).reshape(-1, 2)
+
+
+@background(schedule=0)
+def build_similarity_index(top_k=similarity.TOP_K):
+    game_ids = np.fromiter(Game.objects.order_by('pk').values_list('pk', flat=True), dtype=np.int64)
+    if len(game_ids) < 2:
+        return
+
+    # users x games co-play matrix straight from the players through table
+    plays = _id_pairs(Game.players.through, 'user_id')
+    _, user_rows = np.unique(plays[:, 1], return_inverse=True)
+    game_cols = np.searchsorted(game_ids, plays[:, 0])
+    popularity = np.bincount(game_cols, minlength=len(game_ids))
+    # sampling the biggest games and libraries bounds the block products
+    keep = (similarity.sample_per_key(game_cols, similarity.MAX_PLAYERS_PER_GAME)
+            & similarity.sample_per_key(user_rows, similarity.MAX_GAMES_PER_USER))
+    coplay = similarity.build_matrix(
+        user_rows[keep], game_cols[keep], (int(user_rows.max(initial=-1)) + 1, len(game_ids)),
+    )
+
+    # features x games content matrix: genre rows first, then platform rows
+    genres = _id_pairs(Game.genres.through, 'genre_id')
+    platforms = _id_pairs(Game.platforms.through, 'platform_id')
+    _, genre_rows = np.unique(genres[:, 1], return_inverse=True)
+    _, platform_rows = np.unique(platforms[:, 1], return_inverse=True)
+    n_genres = int(genre_rows.max(initial=-1)) + 1
+    content = similarity.build_matrix(
+        np.concatenate([genre_rows, platform_rows + n_genres]),
+        np.searchsorted(game_ids, np.concatenate([genres[:, 0], platforms[:, 0]])),
+        (n_genres + int(platform_rows.max(initial=-1)) + 1, len(game_ids)),
+    )
+
+    written = 0
+    for start, stop, games, neighbours, scores, ranks in similarity.top_k_neighbours(
+        coplay, content, k=top_k, popularity=popularity,
+    ):
+        # swap one block of games at a time so readers never see a gap
+        with transaction.atomic():
+            GameNeighbour.objects.filter(game_id__gte=game_ids[start], game_id__lte=game_ids[stop - 1]).delete()
+            GameNeighbour.objects.bulk_create(
+                [
+                    GameNeighbour(game_id=int(game_ids[g]), neighbour_id=int(game_ids[c]), score=float(s), rank=int(r))
+                    for g, c, s, r in zip(games, neighbours, scores, ranks)
+                ],
+                batch_size=5000,
+            )
+        written += len(games)
+    caching.bump_similarity_version()
+    print(f"Similarity index rebuilt: {written} neighbours for {len(game_ids)} games")
+
+
+@background(schedule=0)
+def reconcile_players_count():
+    # the played endpoints keep players_count in step with F() updates;
+    # this repairs any drift (races, direct m2m edits) in one UPDATE
+    counts = (Game.players.through.objects.filter(game_id=OuterRef('pk')).order_by()
+              .values('game_id').annotate(c=Count('pk')).values('c'))
+    actual = Coalesce(Subquery(counts), 0)
+    fixed = Game.objects.annotate(actual=actual).exclude(players_count=F('actual')).update(players_count=actual)
+    if fixed:
+        print(f"Reconciled players_count on {fixed} games")
+
+
+@background(schedule=0)
+def build_catalog_snapshot():
+    snapshot.build_snapshot(settings.SNAPSHOT_ROOT)
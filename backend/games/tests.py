@@ -1,13 +1,53 @@
-from django.test import TestCase
+import csv
+import datetime
+import decimal
+import gzip
+import json
+import random
+import sqlite3
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APIClient
 
-from .models import Game, Genre, Platform
+from .models import CommunityScore, Game, GameNeighbour, Genre, Platform, TournamentSession
 from .serializers import GameSerializer
 from .tasks import fetch_games
+from . import tournament as t
 
 import requests
 
+
+class GamesTestCase(TestCase):
+    """Starts each test with an empty cache.
+
+    Cached entries (played sets, versions) are keyed by row ids, and the
+    next test's rows reuse them.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+
+class ApiTestCase(GamesTestCase):
+    """Adds `self.user`, authenticated on `self.client` (an APIClient)."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(username='test', password='test')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
 class GenrePlatformModelTests(TestCase):
     def test_genre_platform_creation(self):
         g1 = Genre.objects.create(name="Action")
@@ -75,10 +115,10 @@ class FetchGamesTaskTests(TestCase):
         self.assertEqual(game.genres.count(), 2)
         self.assertEqual(game.platforms.count(), 1)
 
-class ApiEndpointTests(TestCase):
+class ApiEndpointTests(GamesTestCase):
     def setUp(self):
+        super().setUp()
         self.client = APIClient()
-        from django.contrib.auth import get_user_model
         User = get_user_model()
         self.user = User.objects.create_user(username='test', password='test')
         # authenticate using the test client session
@@ -258,3 +298,1096 @@ class ApiEndpointTests(TestCase):
         self.assertEqual(res3.data[1]['id'], g2.id)
 
 
+
+class TournamentConcurrencyTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        for name in ("A", "B", "C"):
+            Game.objects.create(name=name).players.add(self.user)
+
+    def _answer(self, data, **extra):
+        pair = data['pair']
+        payload = {'winner': pair[0]['id'], 'loser': pair[1]['id'], **extra}
+        return self.client.post(reverse('tournament_answer'), payload, format='json')
+
+    def test_answer_bumps_version(self):
+        res = self.client.post(reverse('tournament_start'))
+        self.assertEqual(res.status_code, 200)
+        version = res.data['version']
+        res2 = self._answer(res.data, version=version)
+        self.assertEqual(res2.status_code, 200)
+        self.assertEqual(res2.data['version'], version + 1)
+
+    def test_stale_version_returns_conflict_with_current_pair(self):
+        res = self.client.post(reverse('tournament_start'))
+        self.assertEqual(self._answer(res.data, version=res.data['version']).status_code, 200)
+        # replaying the first answer (double click) must not be applied again
+        stale = self._answer(res.data, version=res.data['version'])
+        self.assertEqual(stale.status_code, 409)
+        self.assertEqual(stale.data['version'], res.data['version'] + 1)
+        self.assertEqual(stale.data['done'], 1)
+
+    def test_malformed_version_is_a_400(self):
+        res = self.client.post(reverse('tournament_start'))
+        for version in ('abc', 1.5, [1]):
+            self.assertEqual(self._answer(res.data, version=version).status_code, 400)
+        self.assertEqual(self._answer(res.data, version=str(res.data['version'])).status_code, 200)
+
+    def test_restart_returns_the_stored_version(self):
+        self.client.post(reverse('tournament_start'))
+        original = TournamentSession.objects.get_or_create
+
+        def get_then_race(*args, **kwargs):
+            # another restart commits between our read and our write
+            session, created = original(*args, **kwargs)
+            TournamentSession.objects.filter(pk=session.pk).update(version=F('version') + 1)
+            return session, created
+
+        with mock.patch.object(TournamentSession.objects, 'get_or_create', get_then_race):
+            res = self.client.post(reverse('tournament_start'))
+        stored = TournamentSession.objects.get(user=self.user).version
+        self.assertEqual(res.data['version'], stored)
+        self.assertEqual(self._answer(res.data, version=res.data['version']).status_code, 200)
+
+    def test_interleaved_write_is_detected(self):
+        res = self.client.post(reverse('tournament_start'))
+        # simulate another request committing between our read and write
+        original_get = TournamentSession.objects.get
+
+        def get_then_race(*args, **kwargs):
+            session = original_get(*args, **kwargs)
+            TournamentSession.objects.filter(pk=session.pk).update(version=session.version + 1)
+            return session
+
+        TournamentSession.objects.get = get_then_race
+        try:
+            race = self._answer(res.data)
+        finally:
+            TournamentSession.objects.get = original_get
+        self.assertEqual(race.status_code, 409)
+        self.assertEqual(race.data['done'], 0)
+
+
+class StatelessTournamentTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        for name in ("A", "B", "C"):
+            Game.objects.create(name=name).players.add(self.user)
+
+    def _answer(self, data):
+        pair = data['pair']
+        payload = {'winner': pair[0]['id'], 'loser': pair[1]['id'], 'token': data['token']}
+        return self.client.post(reverse('tournament_answer'), payload, format='json')
+
+    def test_state_round_trips_through_token_and_persists_when_finished(self):
+        res = self.client.post(reverse('tournament_start'), {'stateless': True}, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('token', res.data)
+        self.assertFalse(TournamentSession.objects.exists())
+
+        while res.data['phase'] != 'finished':
+            with CaptureQueriesContext(connection) as ctx:
+                res = self._answer(res.data)
+            self.assertEqual(res.status_code, 200)
+            if res.data['phase'] != 'finished':
+                # answering mid-tournament never touches the session or game tables
+                self.assertFalse(any('tournamentsession' in q['sql'] for q in ctx.captured_queries))
+                self.assertFalse(any('games_game' in q['sql'] for q in ctx.captured_queries))
+                self.assertTrue({g['name'] for g in res.data['pair']} <= {"A", "B", "C"})
+        self.assertNotIn('token', res.data)
+        session = TournamentSession.objects.get(user=self.user)
+        self.assertEqual(session.state['phase'], 'finished')
+        self.assertEqual(len(session.state['ranking']), 3)
+
+    def test_token_carries_no_cards(self):
+        from django.core import signing
+        from .views import TOURNAMENT_TOKEN_SALT
+        res = self.client.post(reverse('tournament_start'), {'stateless': True}, format='json')
+        self.assertEqual(set(signing.loads(res.data['token'], salt=TOURNAMENT_TOKEN_SALT)), {'u', 's'})
+        # expired cards are read again
+        cache.clear()
+        res = self._answer(res.data)
+        self.assertTrue({g['name'] for g in res.data['pair']} <= {"A", "B", "C"})
+
+    def test_tampered_token_is_rejected(self):
+        res = self.client.post(reverse('tournament_start'), {'stateless': True}, format='json')
+        data = dict(res.data, token=res.data['token'][:-2] + 'xx')
+        self.assertEqual(self._answer(data).status_code, 400)
+
+
+class TournamentStartTests(ApiTestCase):
+    def _add_games(self, n, genre, platform, year):
+        for i in range(n):
+            game = Game.objects.create(name=f"{genre.name} {i}", release_date=datetime.date(year, 1, 1))
+            game.genres.add(genre)
+            game.platforms.add(platform)
+            game.players.add(self.user)
+
+    def _start_queries(self, **payload):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post(reverse('tournament_start'), payload, format='json')
+        self.assertEqual(res.status_code, 200)
+        return res, len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_library(self):
+        action = Genre.objects.create(name="Action")
+        pc = Platform.objects.create(name="PC")
+        self._add_games(3, action, pc, 2020)
+        self._start_queries()  # first start also creates the session row
+        _, small = self._start_queries()
+        self._add_games(40, action, pc, 2020)
+        _, large = self._start_queries()
+        self.assertEqual(small, large)
+
+    def test_grouping_keys(self):
+        action = Genre.objects.create(name="Action")
+        rpg = Genre.objects.create(name="RPG")
+        pc = Platform.objects.create(name="PC")
+        self._add_games(2, action, pc, 2020)
+        self._add_games(2, rpg, pc, 2021)
+
+        from .views import _played_games_with_key
+        by_genre = dict(_played_games_with_key(self.user, "genre"))
+        self.assertEqual(sorted(by_genre.values()), ["Action", "Action", "RPG", "RPG"])
+        by_platform = dict(_played_games_with_key(self.user, "platform"))
+        self.assertEqual(set(by_platform.values()), {"PC"})
+        by_year = dict(_played_games_with_key(self.user, "year"))
+        self.assertEqual(sorted(by_year.values()), ["2020", "2020", "2021", "2021"])
+
+        res = self.client.post(reverse('tournament_start'), {'group_by': 'colour'}, format='json')
+        self.assertEqual(res.status_code, 400)
+
+    def test_adaptive_mode_returns_provisional_tiers(self):
+        action = Genre.objects.create(name="Action")
+        pc = Platform.objects.create(name="PC")
+        self._add_games(5, action, pc, 2020)
+        res, _ = self._start_queries(mode='adaptive')
+        self.assertEqual(res.data['phase'], 'adaptive')
+        self.assertEqual(len(res.data['pair']), 2)
+        self.assertEqual(len(res.data['provisional']), 5)
+
+
+class TournamentPartitionTests(SimpleTestCase):
+    def _games(self, spec):
+        games, gid = [], 0
+        for genre, n in spec:
+            for _ in range(n):
+                games.append((gid, genre))
+                gid += 1
+        return games
+
+    def _play(self, state):
+        asked = 0
+        while state["phase"] != "finished":
+            a, b = t.current_pair(state)
+            state = t.answer(state, min(a, b), max(a, b))
+            asked += 1
+        return state, asked
+
+    def test_oversized_and_tiny_groups_are_balanced(self):
+        games = self._games([("Action", 40)] + [(f"Niche {i}", 1) for i in range(6)])
+        state = t.build_initial_state(games, min_group_size=4, max_group_size=16)
+        sizes = sorted(len(g["games"]) for g in state["groups"])
+        self.assertEqual(sizes, [6, 13, 13, 14])
+        self.assertIn("Mixed", [g["genre"] for g in state["groups"]])
+        self.assertTrue(all(4 <= s <= 16 for s in sizes))
+
+    def test_leftovers_never_overfill_full_groups(self):
+        games = self._games([("Action", 16), ("RPG", 16), ("Niche 1", 1), ("Niche 2", 1)])
+        state = t.build_initial_state(games, min_group_size=4, max_group_size=16)
+        sizes = sorted(len(g["games"]) for g in state["groups"])
+        self.assertEqual(sizes, [9, 9, 16])
+        self.assertEqual(sorted(gid for g in state["groups"] for gid in g["games"]), list(range(34)))
+
+    def test_total_includes_final_and_matches_questions_bound(self):
+        state = t.build_initial_state(self._games([("Action", 50), ("RPG", 9)]))
+        total = state["total"]
+        finished, asked = self._play(state)
+        self.assertLessEqual(asked, total)
+        self.assertEqual(finished["total"], total)
+        self.assertEqual(len(finished["ranking"]), 59)
+        self.assertEqual(finished["ranking"][0]["id"], 0)
+
+    def test_legacy_state_without_finalist_counts(self):
+        state = t.build_initial_state(self._games([("Action", 5)]))
+        for grp in state["groups"]:
+            del grp["finalists"]
+        state["total"] -= state.pop("planned_final")
+        finished, _ = self._play(state)
+        self.assertEqual(sum(1 for r in finished["ranking"] if r["tier"] != "D"), t.FINALISTS_PER_GROUP)
+
+
+class TournamentBenchmarkTests(SimpleTestCase):
+    def test_kendall_tau(self):
+        from .management.commands.bench_tournament import kendall_tau
+        true_rank = {10: 0, 11: 1, 12: 2, 13: 3}
+        self.assertEqual(kendall_tau([10, 11, 12, 13], true_rank), 1.0)
+        self.assertEqual(kendall_tau([13, 12, 11, 10], true_rank), -1.0)
+        self.assertAlmostEqual(kendall_tau([11, 10, 12, 13], true_rank), 1 - 2 / 6)
+
+    def test_simulate_reports_metrics(self):
+        from .management.commands.bench_tournament import simulate
+        row = simulate(30, 0.0, random.Random(1), sample_every=5)
+        self.assertEqual(row["games"], 30)
+        self.assertLessEqual(row["comparisons"], row["estimated_total"])
+        self.assertGreater(row["state_bytes_max"], 0)
+        self.assertGreaterEqual(row["top10_hits"], 3)
+
+
+class AdaptiveTournamentTests(SimpleTestCase):
+    def _play(self, state, score):
+        while state["phase"] != "finished":
+            a, b = t.current_pair(state)
+            # provisional tiers are available at every step
+            self.assertEqual(len(t.current_ranking(state)), len(state["games"]))
+            state = t.answer(state, *sorted((a, b), key=score, reverse=True))
+        return state
+
+    def test_stops_before_the_grouped_engine_with_near_correct_tiers(self):
+        ids = list(range(60))
+        state = self._play(t.build_adaptive_state(ids), score=lambda gid: -gid)
+        self.assertLess(state["done"], state["total"])
+        self.assertEqual(state["total"], t.grouped_total([(gid, "") for gid in ids]))
+        tiers = {r["id"]: r["tier"] for r in state["ranking"]}
+        # a consistent user ranks game 0 best: 1 S, 12 A (20%), 18 B (30%), the rest C
+        expected = {0: "S"}
+        expected.update({gid: "A" for gid in range(1, 13)})
+        expected.update({gid: "B" for gid in range(13, 31)})
+        expected.update({gid: "C" for gid in range(31, 60)})
+        self.assertEqual(tiers[0], "S")
+        # confident, not certain: at most a few games one tier off
+        off = {gid: (tiers[gid], want) for gid, want in expected.items() if tiers[gid] != want}
+        self.assertLessEqual(len(off), 3)
+        self.assertTrue(all(abs("SABC".index(a) - "SABC".index(b)) == 1 for a, b in off.values()))
+
+    def test_asks_fewer_questions_than_merge_mode(self):
+        from .management.commands.bench_tournament import simulate
+        for n in (10, 30, 100):
+            for noise in (0.0, 0.1):
+                asked = {
+                    mode: sum(simulate(n, noise, random.Random(f"{seed}:{n}:{noise}"), 10**6, mode)["comparisons"]
+                              for seed in range(3))
+                    for mode in ("merge", "adaptive")
+                }
+                self.assertLess(asked["adaptive"], asked["merge"], (n, noise))
+
+    def test_small_library_stops_early(self):
+        # the old rule needed total risk under 1 game at n=10: never met
+        state = self._play(t.build_adaptive_state(list(range(10))), score=lambda gid: -gid)
+        self.assertLess(state["done"], state["total"])
+
+    def test_never_asks_a_pair_twice(self):
+        state = t.build_adaptive_state(list(range(20)))
+        asked = []
+        while state["phase"] != "finished":
+            a, b = t.current_pair(state)
+            asked.append(frozenset((a, b)))
+            state = t.answer(state, max(a, b), min(a, b))
+        self.assertEqual(len(asked), len(set(asked)))
+
+    def test_rejects_unexpected_pair(self):
+        state = t.build_adaptive_state([1, 2, 3])
+        a, b = t.current_pair(state)
+        other = ({1, 2, 3} - {a, b}).pop()
+        with self.assertRaises(ValueError):
+            t.answer(state, a, other)
+
+
+class CommunityScoreTests(TestCase):
+    def test_bradley_terry_recovers_order(self):
+        import numpy as np
+        from . import community
+        # 0 > 1 > 2 > 3 in every user's ranking
+        rankings = [[{"id": gid, "rank": r + 1} for r, gid in enumerate([10, 11, 12, 13])]] * 5
+        outcomes = [o for ranking in rankings for o in community.tournament_outcomes({"ranking": ranking})]
+        index = {10: 0, 11: 1, 12: 2, 13: 3}
+        winners, losers, counts = community.win_matrix(outcomes, index)
+        self.assertEqual(counts.sum(), len(outcomes))
+        scores = community.fit_bradley_terry(winners, losers, counts, 4)
+        self.assertEqual(list(np.argsort(-scores)), [0, 1, 2, 3])
+        self.assertTrue(np.all(np.isfinite(scores)))
+
+    def test_outcomes_only_within_sorted_groups_and_final(self):
+        from . import community
+        games = [(gid, "A") for gid in range(1, 9)] + [(gid, "B") for gid in range(11, 19)]
+        state = t.build_initial_state(games, min_group_size=4, max_group_size=8)
+        while state["phase"] != "finished":
+            a, b = t.current_pair(state)
+            state = t.answer(state, min(a, b), max(a, b))
+        eliminated = {entry["id"] for entry in state["final"]["eliminated"]}
+        group = {gid: gid // 10 for gid, _ in games}
+        outcomes = community.tournament_outcomes(state)
+        # the tier D list interleaves the groups; none of that is an outcome
+        self.assertFalse([(w, l) for w, l in outcomes
+                          if w in eliminated and l in eliminated and group[w] != group[l]])
+        self.assertIn((4, 5), outcomes)
+        self.assertIn((1, 11), outcomes)  # the final
+
+    def test_refresh_task_materializes_scores_and_orders_game_list(self):
+        from .tasks import refresh_community_scores
+        User = get_user_model()
+        games = [Game.objects.create(name=name) for name in ("Alpha", "Beta", "Gamma")]
+        # every user ranks Gamma first, Alpha last
+        order = [games[2], games[1], games[0]]
+        for i in range(3):
+            user = User.objects.create_user(username=f"u{i}", password="pw")
+            ranking = [{"id": g.id, "tier": "S", "rank": r + 1, "wins": None} for r, g in enumerate(order)]
+            TournamentSession.objects.create(user=user, state={"phase": "finished", "ranking": ranking})
+
+        refresh_community_scores.task_function()
+        self.assertEqual(CommunityScore.objects.count(), 3)
+        best = CommunityScore.objects.order_by('-score').first()
+        self.assertEqual(best.game_id, games[2].id)
+
+        client = APIClient()
+        client.force_authenticate(User.objects.get(username="u0"))
+        res = client.get(reverse('game_list') + '?ordering=community')
+        self.assertEqual([g['name'] for g in res.data['results']], ["Gamma", "Beta", "Alpha"])
+
+    def test_refresh_drops_games_no_longer_ranked(self):
+        from .tasks import refresh_community_scores
+        User = get_user_model()
+        a, b, c = [Game.objects.create(name=name) for name in ("A", "B", "C")]
+        sessions = []
+        for i, ranked in enumerate([(a, b, c), (a, b)]):
+            user = User.objects.create_user(username=f"u{i}", password="pw")
+            ranking = [{"id": g.id, "tier": "S", "rank": r + 1, "wins": None} for r, g in enumerate(ranked)]
+            sessions.append(TournamentSession.objects.create(user=user, state={"phase": "finished", "ranking": ranking}))
+        refresh_community_scores.task_function()
+        self.assertEqual(CommunityScore.objects.count(), 3)
+
+        # the only ranking with C is restarted
+        sessions[0].state = {"phase": "groups"}
+        sessions[0].save()
+        refresh_community_scores.task_function()
+        self.assertEqual(set(CommunityScore.objects.values_list('game_id', flat=True)), {a.id, b.id})
+
+
+class SimilarityIndexTests(GamesTestCase):
+    def setUp(self):
+        super().setUp()
+        User = get_user_model()
+        self.users = [User.objects.create_user(username=f"u{i}", password="pw") for i in range(4)]
+        action = Genre.objects.create(name="Action")
+        puzzle = Genre.objects.create(name="Puzzle")
+        self.a1 = Game.objects.create(name="Action One")
+        self.a2 = Game.objects.create(name="Action Two")
+        self.p1 = Game.objects.create(name="Puzzle One")
+        for game in (self.a1, self.a2):
+            game.genres.add(action)
+        self.p1.genres.add(puzzle)
+        # the same three users play both action games, one plays the puzzle
+        for user in self.users[:3]:
+            self.a1.players.add(user)
+            self.a2.players.add(user)
+        self.p1.players.add(self.users[3])
+
+    @override_settings(GAME_CACHE_ENABLED=True)
+    def test_build_index_and_serve_neighbours(self):
+        from .tasks import build_similarity_index
+        build_similarity_index.task_function(top_k=2)
+        top = GameNeighbour.objects.get(game=self.a1, rank=0)
+        self.assertEqual(top.neighbour_id, self.a2.id)
+        self.assertAlmostEqual(top.score, 1.0, places=5)
+
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        url = reverse('game_similar', args=[self.a1.id])
+        res = client.get(url)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data[0]['id'], self.a2.id)
+        self.assertTrue(res.data[0]['is_played'])
+        # neighbours and the played set are both served from cache
+        with self.assertNumQueries(0):
+            client.get(url)
+
+    def test_sampling_and_blocks_bound_the_product(self):
+        import numpy as np
+        from .similarity import _blocks, sample_per_key
+        keys = np.array([1] * 10 + [2] * 3)
+        keep = sample_per_key(keys, 4)
+        self.assertEqual((keep[keys == 1].sum(), keep[keys == 2].sum()), (4, 3))
+        # a game heavier than the budget still gets a block of its own
+        self.assertEqual(list(_blocks(np.array([5, 5, 30, 1, 1]), 10, 10)), [(0, 2), (2, 3), (3, 5)])
+
+
+@override_settings(GAME_CACHE_ENABLED=True)
+class RecommendationTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.loved, self.liked, self.new, self.other, self.owned = [
+            Game.objects.create(name=n) for n in ("Loved", "Liked", "New", "Other", "Owned")
+        ]
+        for game in (self.loved, self.liked, self.owned):
+            game.players.add(self.user)
+        GameNeighbour.objects.create(game=self.loved, neighbour=self.new, score=0.5, rank=0)
+        GameNeighbour.objects.create(game=self.loved, neighbour=self.owned, score=0.9, rank=1)
+        GameNeighbour.objects.create(game=self.liked, neighbour=self.other, score=0.9, rank=0)
+        ranking = [
+            {"id": self.loved.id, "tier": "S", "rank": 1, "wins": None},
+            {"id": self.liked.id, "tier": "A", "rank": 2, "wins": None},
+        ]
+        TournamentSession.objects.create(user=self.user, state={"phase": "finished", "ranking": ranking})
+
+    def test_blends_seed_tiers_and_excludes_played(self):
+        res = self.client.get(reverse('game_recommendations'))
+        self.assertEqual(res.status_code, 200)
+        # S-tier weight 3 * 0.5 beats A-tier weight 1 * 0.9
+        self.assertEqual([g['id'] for g in res.data['results']], [self.new.id, self.other.id])
+        self.assertEqual(res.data['count'], 2)
+
+    def test_cached_until_library_changes(self):
+        url = reverse('game_recommendations')
+        self.client.get(url)
+        # page games + genres + platforms; no recomputation
+        with self.assertNumQueries(3):
+            self.client.get(url + '?page_size=1&page=2')
+        self.client.post(reverse('game_mark_played', args=[self.new.id]))
+        res = self.client.get(url)
+        self.assertEqual([g['id'] for g in res.data['results']], [self.other.id])
+
+
+@override_settings(GAME_CACHE_ENABLED=True)
+class PlayedSetCacheTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.games = [Game.objects.create(name=f"G{i}") for i in range(5)]
+        self.games[1].players.add(self.user)
+        self.games[3].players.add(self.user)
+
+    def test_played_set_membership(self):
+        from . import caching
+        played = caching.played_ids(self.user.pk)
+        self.assertEqual(list(played), sorted([self.games[1].id, self.games[3].id]))
+        self.assertIn(self.games[3].id, played)
+        self.assertNotIn(self.games[2].id, played)
+
+    def test_mark_played_drops_cache_and_next_read_rebuilds_it(self):
+        from . import caching
+        url = reverse('game_list')
+        self.client.get(url)  # warms the cache
+        self.client.post(reverse('game_mark_played', args=[self.games[0].id]))
+        self.client.delete(reverse('game_mark_played', args=[self.games[3].id]))
+        self.assertIsNone(cache.get(caching._played_key(self.user.pk)))
+
+        res = self.client.get(url + '?played=true')
+        self.assertEqual([g['id'] for g in res.data['results']], [self.games[0].id, self.games[1].id])
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url + '?played=true')
+        self.assertTrue(all(g['is_played'] for g in res.data['results']))
+        # only the serializer's `players` field still reads the through table
+        through = Game.players.through._meta.db_table
+        filtering = [q for q in ctx.captured_queries if through in q['sql'] and 'users_user' not in q['sql']]
+        self.assertEqual(filtering, [])
+
+    @override_settings(GAME_CACHE_ENABLED=False)
+    def test_not_cached_without_a_shared_cache(self):
+        from . import caching
+        self.client.get(reverse('game_list'))
+        self.client.get(reverse('game_recommendations'))
+        self.assertIsNone(cache.get(caching._played_key(self.user.pk)))
+        # another worker's write: nothing here to go stale
+        Game.players.through.objects.filter(user_id=self.user.pk).delete()
+        self.assertEqual(list(caching.played_ids(self.user.pk)), [])
+        self.assertEqual([key for key in cache._cache if ':recs:' in key], [])
+
+    def test_direct_m2m_edits_drop_cache(self):
+        from . import caching
+        self.assertIn(self.games[1].id, caching.played_ids(self.user.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.played_games.remove(self.games[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.games[2].players.add(self.user)
+        self.assertEqual(list(caching.played_ids(self.user.pk)), sorted([self.games[2].id, self.games[3].id]))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.games[3].players.clear()
+        self.assertEqual(list(caching.played_ids(self.user.pk)), [self.games[2].id])
+
+
+class BulkPlayedTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.games = [Game.objects.create(name=f"G{i}") for i in range(4)]
+        self.games[0].players.add(self.user)
+
+    def test_adds_and_removes_in_one_request(self):
+        url = reverse('game_bulk_played')
+        payload = {'add': [self.games[0].id, self.games[1].id, self.games[2].id, 9999], 'remove': [self.games[0].id]}
+        res = self.client.post(url, payload, format='json')
+        self.assertEqual(res.status_code, 400)  # same id in add and remove
+
+        payload = {'add': [self.games[1].id, self.games[2].id, 9999], 'remove': [self.games[0].id]}
+        # validate, savepoint, user lock, existing rows, insert, count +1, delete, count -1, release
+        with self.assertNumQueries(9):
+            res = self.client.post(url, payload, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['added'], [self.games[1].id, self.games[2].id])
+        self.assertEqual(res.data['removed'], [self.games[0].id])
+        self.assertEqual(res.data['missing'], [9999])
+        self.assertEqual(
+            set(self.user.played_games.values_list('id', flat=True)), {self.games[1].id, self.games[2].id},
+        )
+
+    def test_rejects_non_list_payload(self):
+        res = self.client.post(reverse('game_bulk_played'), {'add': '12'}, format='json')
+        self.assertEqual(res.status_code, 400)
+
+
+class LibraryImportTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.witcher = Game.objects.create(name="The Witcher 3: Wild Hunt")
+        self.portal = Game.objects.create(name="Portal 2")
+        self.doom = Game.objects.create(name="DOOM")
+        self.doom_2016 = Game.objects.create(name="Doom")
+        # the index is per process; don't serve one built from another test's rows
+        from . import views
+        self.views = views
+        views._title_index_cache.update(signature=None, index=None, building=False)
+
+    def test_normalise(self):
+        from .matching import normalise
+        self.assertEqual(normalise("The Witcher III: Wild Hunt – GOTY Edition"), "witcher 3 wild hunt")
+        self.assertEqual(normalise("Pokémon"), "pokemon")
+
+    def test_import_marks_confident_matches_and_returns_ambiguous(self):
+        titles = ["Witcher III - Wild Hunt (GOTY Edition)", "Portal 2", "Portl 2", "doom", "Nothing Like It"]
+        res = self.client.post(reverse('game_import'), {'titles': titles}, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([m['id'] for m in res.data['matched']], [self.witcher.id, self.portal.id, self.portal.id])
+        self.assertEqual(len(res.data['ambiguous']), 1)
+        self.assertEqual({c['id'] for c in res.data['ambiguous'][0]['candidates']}, {self.doom.id, self.doom_2016.id})
+        self.assertEqual(res.data['unmatched'], ["Nothing Like It"])
+        self.assertEqual(
+            set(self.user.played_games.values_list('id', flat=True)), {self.witcher.id, self.portal.id},
+        )
+
+    def test_fuzzy_titles_match_in_batches(self):
+        index = self.views._build_title_index(None)
+        titles = ["Portl 2", "Witcher 3 Wild Hnut", "Portal 2", "Dooom"] * 3
+        with mock.patch("games.matching.BATCH_SIZE", 2):
+            results = index.match_many(titles)
+        self.assertEqual(results, [index.match(title) for title in titles])
+        self.assertEqual([(status, candidates[0][0]) for status, candidates in results[:3]], [
+            ("matched", self.portal.id), ("matched", self.witcher.id), ("matched", self.portal.id),
+        ])
+        self.assertEqual({gid for gid, _ in results[3][1]}, {self.doom.id, self.doom_2016.id})
+
+    def test_renamed_game_matches_after_background_rebuild(self):
+        url = reverse('game_import')
+        self.client.post(url, {'titles': ["Portal 2"], 'mark_played': False}, format='json')
+        self.portal.name = "Portal Two"
+        self.portal.save()
+        with mock.patch("games.views.threading.Thread") as thread:
+            res = self.client.post(url, {'titles': ["Portal Two"], 'mark_played': False}, format='json')
+        # the stale index answers at once and a rebuild starts in the background
+        self.assertEqual(res.data['matched'][0]['name'], "Portal 2")
+        target, args = thread.call_args.kwargs['target'], thread.call_args.kwargs['args']
+        thread.return_value.start.assert_called_once()
+        with mock.patch("games.views.connection"):
+            target(*args)
+        res = self.client.post(url, {'titles': ["Portal Two"], 'mark_played': False}, format='json')
+        self.assertEqual([(m['id'], m['name'], m['score']) for m in res.data['matched']],
+                         [(self.portal.id, "Portal Two", 1.0)])
+
+
+class PlayersCountTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = get_user_model().objects.create_user(username='other', password='test')
+
+    def test_played_endpoints_maintain_count(self):
+        game = Game.objects.create(name="Counted")
+        url = reverse('game_mark_played', args=[game.id])
+        res = self.client.post(url)
+        self.assertEqual(res.data['players_count'], 1)
+        self.client.post(url)  # marking twice doesn't double count
+        game.refresh_from_db()
+        self.assertEqual(game.players_count, 1)
+
+        self.client.post(reverse('game_bulk_played'), {'remove': [game.id]}, format='json')
+        game.refresh_from_db()
+        self.assertEqual(game.players_count, 0)
+        self.client.delete(url)
+        game.refresh_from_db()
+        self.assertEqual(game.players_count, 0)
+
+    def test_popular_ordering_and_reconciliation(self):
+        from .tasks import reconcile_players_count
+        quiet = Game.objects.create(name="Quiet")
+        hit = Game.objects.create(name="Hit")
+        # direct m2m edits bypass the counter until reconciliation runs
+        hit.players.add(self.user, self.other)
+        quiet.players.add(self.user)
+        reconcile_players_count.task_function()
+        self.assertEqual(Game.objects.get(pk=hit.pk).players_count, 2)
+
+        res = self.client.get(reverse('game_list') + '?ordering=popular')
+        self.assertEqual([g['name'] for g in res.data['results']], ["Hit", "Quiet"])
+        Game.objects.create(name="Unrated")
+        Game.objects.filter(pk=quiet.pk).update(rating=4.5)
+        Game.objects.filter(pk=hit.pk).update(rating=3.0)
+        res = self.client.get(reverse('game_list') + '?ordering=rating')
+        self.assertEqual([g['name'] for g in res.data['results']], ["Quiet", "Hit", "Unrated"])
+
+    def test_distinct_only_after_name_joins(self):
+        from .views import filter_games
+        self.assertFalse(filter_games({'ordering': 'popular', 'played': 'true'}, self.user).query.distinct)
+        self.assertTrue(filter_games({'ordering': 'popular', 'genre': 'rpg'}, self.user).query.distinct)
+
+
+class DiscoverTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.rpg = Genre.objects.create(name="RPG")
+        self.games = [Game.objects.create(name=f"Game {i}") for i in range(12)]
+        for game in self.games[:4]:
+            game.genres.add(self.rpg)
+        self.games[0].players.add(self.user)
+
+    def test_returns_distinct_unplayed_games(self):
+        res = self.client.get(reverse('game_discover') + '?n=20')
+        self.assertEqual(res.status_code, 200)
+        ids = [g['id'] for g in res.data]
+        self.assertEqual(len(ids), 11)
+        self.assertEqual(len(set(ids)), 11)
+        self.assertNotIn(self.games[0].id, ids)
+
+        res = self.client.get(reverse('game_discover') + '?genre=rpg&n=2')
+        self.assertEqual(len(res.data), 2)
+        self.assertTrue({g['id'] for g in res.data} <= {g.id for g in self.games[1:4]})
+        self.assertEqual(self.client.get(reverse('game_discover') + '?n=0').status_code, 400)
+
+    @override_settings(GAME_CACHE_ENABLED=True)
+    def test_pool_is_cached(self):
+        url = reverse('game_discover') + '?n=1'
+        self.client.get(url)
+        # played ids are cached too: the picked game, genres, platforms
+        with self.assertNumQueries(3):
+            self.client.get(url)
+
+    def test_probing_samples_sparse_id_range(self):
+        from . import views
+        Game.objects.bulk_create([Game(name=f"Extra {i}") for i in range(60)])
+        # leave gaps in the id range
+        Game.objects.filter(name__startswith="Extra", pk__in=range(0, 100, 2)).delete()
+        ids = views._probe_ids(5)
+        self.assertEqual(len(ids), 5)
+        self.assertTrue(set(ids) <= set(Game.objects.values_list('pk', flat=True)))
+
+    def test_filtered_pool_reads_a_bounded_window(self):
+        from . import caching, views
+        rpg_ids = sorted(g.id for g in self.games[:4])
+        # start past the last rpg game: the window wraps to the lowest ids
+        with mock.patch('games.views.random.randint', return_value=self.games[-1].id):
+            ids = views._window_ids(Game.objects.filter(genres=self.rpg), 3)
+        self.assertEqual(ids, rpg_ids[:3])
+        with mock.patch('games.views.DISCOVER_POOL_SIZE', 2):
+            self.assertEqual(len(views._discover_pool('rpg', '')), 2)
+        key = caching.discover_pool_key('Role Playing\n' * 50, 'PC')
+        self.assertEqual(key, caching.discover_pool_key('role playing\n' * 50, 'pc'))
+        self.assertLess(len(key), 50)
+
+
+class GameChangesTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.games = [Game.objects.create(name=f"Game {i}") for i in range(3)]
+
+    def _page(self, cursor=None, limit=2):
+        params = f'?limit={limit}' + (f'&since={cursor}' if cursor else '')
+        res = self.client.get(reverse('game_changes') + params)
+        self.assertEqual(res.status_code, 200)
+        return res.data
+
+    def test_pages_through_changes_then_deletes(self):
+        page = self._page()
+        self.assertEqual([g['id'] for g in page['changed']], [g.id for g in self.games[:2]])
+        self.assertTrue(page['more'])
+        page = self._page(page['cursor'])
+        self.assertEqual([g['id'] for g in page['changed']], [self.games[2].id])
+        cursor = self._page(page['cursor'])['cursor']
+
+        # an edit through the serializer and a delete show up after the cursor
+        serializer = GameSerializer(self.games[0], data={'name': 'Renamed'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        deleted_id = self.games[1].id
+        self.games[1].delete()
+        page = self._page(cursor)
+        self.assertEqual([g['name'] for g in page['changed']], ['Renamed'])
+        self.assertEqual(page['deleted'], [deleted_id])
+        self.assertFalse(page['more'])
+
+        page = self._page(page['cursor'])
+        self.assertEqual((page['changed'], page['deleted']), ([], []))
+
+    def test_genre_and_platform_edits_are_changes(self):
+        cursor = self._page(limit=10)['cursor']
+        rpg, pc = Genre.objects.create(name="RPG"), Platform.objects.create(name="PC")
+        self.games[2].genres.add(rpg)
+        page = self._page(cursor, limit=10)
+        self.assertEqual([g['id'] for g in page['changed']], [self.games[2].id])
+        # from the other side, and clear() with its games gone by post_clear
+        pc.games.add(self.games[0], self.games[1])
+        page = self._page(page['cursor'], limit=10)
+        self.assertEqual([g['id'] for g in page['changed']], [self.games[0].id, self.games[1].id])
+        pc.games.clear()
+        page = self._page(page['cursor'], limit=10)
+        self.assertEqual([g['id'] for g in page['changed']], [self.games[0].id, self.games[1].id])
+        # re-adding an existing link changes nothing
+        self.games[2].genres.add(rpg)
+        self.assertEqual(self._page(page['cursor'], limit=10)['changed'], [])
+
+    def test_rejects_tampered_cursor(self):
+        res = self.client.get(reverse('game_changes') + '?since=garbage')
+        self.assertEqual(res.status_code, 400)
+
+    def test_refetching_unchanged_game_keeps_updated_at(self):
+        class DummyResponse:
+            status_code = 200
+            def json(self):
+                return {'results': [{
+                    'id': 7, 'name': 'Fetched', 'released': '2020-01-02',
+                    'genres': [{'name': 'Action'}], 'platforms': [{'platform': {'name': 'PC'}}],
+                }]}
+        with mock.patch('games.tasks.requests.get', lambda url: DummyResponse()):
+            fetch_games.task_function(batch_size=1)
+            first = Game.objects.get(rawg_id=7).updated_at
+            fetch_games.task_function(batch_size=1)
+        self.assertEqual(Game.objects.get(rawg_id=7).updated_at, first)
+
+
+class ExportTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        rpg, pc = Genre.objects.create(name="RPG"), Platform.objects.create(name="PC")
+        self.games = [Game.objects.create(name=f"Game, {i}") for i in range(5)]
+        self.games[0].genres.add(rpg)
+        self.games[0].platforms.add(pc)
+        self.games[3].players.add(self.user)
+
+    def _body(self, res):
+        self.assertTrue(res.streaming)
+        return b"".join(res.streaming_content).decode()
+
+    @mock.patch('games.views.EXPORT_CHUNK_SIZE', 2)
+    def test_catalog_ndjson_streams_in_chunks(self):
+        res = self.client.get(reverse('game_export', args=['catalog', 'ndjson']))
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        # rows + (genres + platforms) per chunk of 2
+        with self.assertNumQueries(1 + 2 * 3):
+            rows = [json.loads(line) for line in self._body(res).splitlines()]
+        self.assertEqual([r['id'] for r in rows], [g.id for g in self.games])
+        self.assertEqual((rows[0]['genres'], rows[0]['platforms']), (["RPG"], ["PC"]))
+
+    def test_library_csv(self):
+        res = self.client.get(reverse('game_export', args=['library', 'csv']))
+        rows = list(csv.DictReader(self._body(res).splitlines()))
+        self.assertEqual([r['name'] for r in rows], ["Game, 3"])
+        self.assertEqual(self.client.get('/api/games/export/library.xml').status_code, 404)
+
+
+class SnapshotTests(ApiTestCase):
+    def test_builds_queryable_snapshot_and_manifest(self):
+        from .snapshot import build_snapshot
+        rpg = Genre.objects.create(name="RPG")
+        game = Game.objects.create(name="Snapshotted")
+        game.genres.add(rpg)
+        Game.objects.create(name="Plain")
+
+        with tempfile.TemporaryDirectory() as root:
+            first = build_snapshot(root)
+            # builds in the same instant still get their own files
+            with mock.patch('games.snapshot.timezone.now', return_value=timezone.now()):
+                self.assertNotEqual(build_snapshot(root)["file"], build_snapshot(root)["file"])
+            self.assertEqual(len(list(Path(root).glob("catalog-*"))), 3)
+            manifest = build_snapshot(root, keep=1)
+            self.assertNotEqual(manifest["file"], first["file"])
+            self.assertEqual(json.loads((Path(root) / "manifest.json").read_text()), manifest)
+            self.assertEqual([p.name for p in Path(root).glob("catalog-*")], [manifest["file"]])
+            self.assertEqual(manifest["games"], 2)
+
+            db_path = Path(root) / "catalog.sqlite"
+            db_path.write_bytes(gzip.decompress((Path(root) / manifest["file"]).read_bytes()))
+            db = sqlite3.connect(db_path)
+            rows = db.execute(
+                "SELECT g.name FROM games g JOIN game_genres gg ON gg.game_id = g.id "
+                "JOIN genres ge ON ge.id = gg.genre_id WHERE ge.name = 'RPG'"
+            ).fetchall()
+            db.close()
+        self.assertEqual(rows, [("Snapshotted",)])
+
+        # the manifest's cursor picks up exactly the changes after the copy
+        game.genres.clear()
+        res = self.client.get(reverse('game_changes') + f'?since={manifest["changes_cursor"]}')
+        self.assertEqual([g['id'] for g in res.data['changed']], [game.id])
+
+
+class SparseFieldsetTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.game = Game.objects.create(name="Sparse", rating=4.0)
+        self.game.players.add(self.user)
+        self.game.genres.add(Genre.objects.create(name="RPG"))
+
+    def test_players_left_out_by_default(self):
+        res = self.client.get(reverse('game_list'))
+        game = res.data['results'][0]
+        self.assertNotIn('players', game)
+        self.assertEqual((game['genre'], game['is_played']), ("RPG", True))
+
+        res = self.client.get(reverse('game_list') + '?fields=id,players')
+        self.assertEqual(res.data['results'][0], {'id': self.game.id, 'players': [self.user.id]})
+
+    def test_fields_limit_query(self):
+        self.client.get(reverse('game_list'))  # warm the played ids cache
+        # count + one narrow page query: no genre/platform prefetches
+        with self.assertNumQueries(2):
+            res = self.client.get(reverse('game_list') + '?fields=id,name,rating')
+        self.assertEqual(res.data['results'][0], {'id': self.game.id, 'name': "Sparse", 'rating': 4.0})
+
+        res = self.client.get(reverse('game_list') + '?exclude=genre,genres,platform,platforms,image')
+        self.assertNotIn('genre', res.data['results'][0])
+        self.assertIn('is_played', res.data['results'][0])
+
+    def test_unknown_field_rejected(self):
+        res = self.client.get(reverse('game_list') + '?fields=id,secret')
+        self.assertEqual(res.status_code, 400)
+
+
+class RenderingTests(ApiTestCase):
+    def test_orjson_matches_stock_renderer(self):
+        from django.utils.timezone import now
+        from rest_framework.renderers import JSONRenderer
+        from config.renderers import ORJSONRenderer
+        data = {'when': now(), 'day': datetime.date(2020, 1, 2), 'price': decimal.Decimal('1.5'),
+                'names': ['Ünïcode', 'b'], 1: None}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_invalid_json_is_a_400(self):
+        res = self.client.post(reverse('game_bulk_played'), '{"add": [', content_type='application/json')
+        self.assertEqual(res.status_code, 400)
+
+    def test_large_responses_are_compressed(self):
+        Game.objects.bulk_create([Game(name=f"Game {i}") for i in range(50)])
+        res = self.client.get(reverse('game_list') + '?page_size=50', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(res.content))['results']), 50)
+        # small bodies aren't worth it
+        res = self.client.get(reverse('genre_list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(res.has_header('Content-Encoding'))
+
+    def test_brotli_only_for_catalog_reads(self):
+        Game.objects.bulk_create([Game(name=f"Game {i}") for i in range(50)])
+        fake = mock.Mock(compress=lambda body, quality: body[:100])
+        with mock.patch('config.middleware.brotli', fake):
+            res = self.client.get(reverse('game_list') + '?page_size=50', HTTP_ACCEPT_ENCODING='br, gzip')
+            self.assertEqual(res['Content-Encoding'], 'br')
+            # anything else keeps gzip and its BREACH padding
+            titles = [f"Unknown title {i}" for i in range(100)]
+            res = self.client.post(reverse('game_import'), {'titles': titles}, format='json',
+                                   HTTP_ACCEPT_ENCODING='br, gzip')
+            self.assertEqual(res['Content-Encoding'], 'gzip')
+
+
+class BootstrapTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        rpg = Genre.objects.create(name="RPG")
+        Platform.objects.create(name="PC")
+        for i in range(3):
+            Game.objects.create(name=f"Game {i}").genres.add(rpg)
+
+    def test_combines_facets_page_and_tournament(self):
+        TournamentSession.objects.create(user=self.user, version=4,
+                                         state={"phase": "group", "done": 2, "total": 9})
+        res = self.client.get(reverse('game_bootstrap') + '?page_size=2')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['genres'], [{'id': Genre.objects.get().id, 'name': "RPG", 'games_count': 3}])
+        self.assertEqual(res.data['platforms'][0]['games_count'], 0)
+        self.assertEqual(res.data['total_games'], 3)
+        self.assertEqual((res.data['games']['count'], len(res.data['games']['results'])), (3, 2))
+        self.assertEqual(res.data['tournament'], {'phase': "group", 'done': 2, 'total': 9, 'version': 4})
+
+    @override_settings(GAME_CACHE_ENABLED=True)
+    def test_facets_are_cached(self):
+        url = reverse('game_bootstrap')
+        self.client.get(url)
+        # games count + page + genres + platforms, and the session
+        with self.assertNumQueries(5):
+            res = self.client.get(url)
+        self.assertIsNone(res.data['tournament'])
+
+
+class AsyncViewTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        # the async views read the session, not DRF's forced user
+        self.client.force_login(self.user)
+        rpg = Genre.objects.create(name="RPG")
+        self.games = [Game.objects.create(name=f"Game {i}") for i in range(5)]
+        for game in self.games[:3]:
+            game.genres.add(rpg)
+            game.players.add(self.user)
+
+    def test_game_list_matches_sync_view(self):
+        for params in ('?page_size=2', '?page_size=2&page=2', '?genre=rpg&fields=id,name', '?played=true'):
+            sync = self.client.get(reverse('game_list') + params).json()
+            res = self.client.get(reverse('async_game_list') + params)
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.json()['results'], sync['results'])
+            self.assertEqual(res.json()['count'], sync['count'])
+        self.assertEqual(self.client.get(reverse('async_game_list') + '?fields=secret').status_code, 400)
+        self.assertEqual(self.client.get(reverse('async_genre_list')).json(), [{'id': Genre.objects.get().id, 'name': "RPG"}])
+
+    def test_tournament_answer_and_status(self):
+        self.client.post(reverse('tournament_start'), {}, format='json')
+        sync_status = self.client.get(reverse('tournament_status')).json()
+        status = self.client.get(reverse('async_tournament_status')).json()
+        self.assertEqual(status, sync_status)
+
+        a, b = [g['id'] for g in status['pair']]
+        url = reverse('async_tournament_answer')
+        res = self.client.post(url, {'winner': a, 'loser': b, 'version': status['version']}, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['version'], status['version'] + 1)
+        # the same answer again is stale
+        res = self.client.post(url, {'winner': a, 'loser': b, 'version': status['version']}, format='json')
+        self.assertEqual(res.status_code, 409)
+        res = self.client.post(url, {'winner': a, 'loser': b, 'version': 'abc'}, format='json')
+        self.assertEqual(res.status_code, 400)
+
+    def test_tournament_start_matches_sync_view(self):
+        url = reverse('async_tournament_start')
+        for body in ({}, {'mode': 'adaptive'}, {'group_by': 'year'}):
+            res = self.client.post(url, body, format='json')
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.json(), self.client.get(reverse('tournament_status')).json())
+        res = self.client.post(url, {'stateless': True}, format='json')
+        self.assertEqual(res.json()['pair'], self.client.post(
+            reverse('tournament_start'), {'stateless': True}, format='json').json()['pair'])
+        self.assertIn('token', res.json())
+        res = self.client.post(url, {'mode': 'elo'}, format='json')
+        self.assertEqual(res.json(), {'detail': "mode must be merge or adaptive."})
+        self.assertEqual(self.client.post(url, {'group_by': 'colour'}, format='json').status_code, 400)
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('async_game_list')).status_code, 403)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        from config.db_routers import ReplicaRouter
+        self.router = ReplicaRouter()
+
+    def test_catalog_reads_use_replica_until_a_write(self):
+        from config.db_routers import replica_reads
+        self.assertEqual(self.router.db_for_read(Game), 'default')  # no request
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Game), 'replica')
+            self.assertEqual(self.router.db_for_read(Game.genres.through), 'replica')
+            self.assertEqual(self.router.db_for_read(Game.players.through), 'default')
+            self.assertEqual(self.router.db_for_read(TournamentSession), 'default')
+            self.assertEqual(self.router.db_for_write(Game), 'default')
+            # read-your-writes for the rest of the request
+            self.assertEqual(self.router.db_for_read(Game), 'default')
+        with replica_reads(pinned=True):
+            self.assertEqual(self.router.db_for_read(Genre), 'default')
+
+    def test_middleware_pins_writers_with_a_cookie(self):
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from config.db_routers import PIN_COOKIE, ReplicaStickinessMiddleware
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Game))
+            if request.method == 'POST':
+                self.router.db_for_write(Game)
+            return HttpResponse()
+
+        middleware = ReplicaStickinessMiddleware(view)
+        factory = RequestFactory()
+        self.assertNotIn(PIN_COOKIE, middleware(factory.get('/')).cookies)
+        response = middleware(factory.post('/'))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        request = factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        middleware(request)
+        self.assertEqual(seen, ['replica', 'replica', 'default'])
+
+
+class MetricsTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        Game.objects.bulk_create([Game(name=f"Game {i}") for i in range(3)])
+
+    def views(self):
+        from config.metrics import collect
+        return collect()['views']
+
+    def test_records_requests_and_queries_per_url_name(self):
+        from config.metrics import _COUNT, _QUERIES, _BYTES
+        before = self.views().get('game_list', [0] * 5)
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(reverse('game_list'))
+        after = self.views()['game_list']
+        self.assertEqual(after[_COUNT] - before[_COUNT], 1)
+        self.assertEqual(after[_QUERIES] - before[_QUERIES], len(queries))
+        self.assertEqual(after[_BYTES] - before[_BYTES], len(res.content))
+
+    def test_metrics_endpoint_renders_prometheus_text(self):
+        self.client.get(reverse('genre_list'))
+        res = self.client.get(reverse('metrics'))
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = res.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_duration_seconds_bucket{view="genre_list",le="+Inf"}', body)
+        self.assertIn('http_db_queries_total{view="genre_list"}', body)
+        self.assertIn('# TYPE auth_throttle_rejections_total counter', body)
+
+    def test_records_streamed_bytes_and_queries(self):
+        from config.metrics import _BYTES, _COUNT, _QUERIES
+        before = self.views().get('game_export', [0] * 5)
+        res = self.client.get(reverse('game_export', args=['catalog', 'ndjson']))
+        # recorded once the body has been sent, not when the view returns
+        self.assertEqual(self.views().get('game_export', [0] * 5)[_COUNT], before[_COUNT])
+        with CaptureQueriesContext(connection) as queries:
+            body = b"".join(res.streaming_content)
+        after = self.views()['game_export']
+        self.assertEqual(after[_COUNT] - before[_COUNT], 1)
+        self.assertEqual(after[_BYTES] - before[_BYTES], len(body))
+        self.assertEqual(after[_QUERIES] - before[_QUERIES], len(queries))
+
+    def test_endpoint_is_local_only_without_a_token(self):
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5').status_code, 403)
+        # a proxy on the same machine
+        res = self.client.get(reverse('metrics'), HTTP_X_FORWARDED_FOR='10.0.0.5')
+        self.assertEqual(res.status_code, 403)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_endpoint_wants_the_token_when_set(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        res = self.client.get(url, REMOTE_ADDR='10.0.0.5', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(res.status_code, 200)
+
+    def test_sums_files_from_other_processes(self):
+        from config.metrics import LATENCY_BUCKETS, _COUNT, _QUERIES
+        with tempfile.TemporaryDirectory() as root, override_settings(METRICS_DIR=root):
+            other = [0] * (5 + len(LATENCY_BUCKETS) + 1)
+            other[_COUNT], other[_QUERIES] = 4, 9
+            Path(root, '1-1.json').write_text(json.dumps(
+                {'views': {'game_list': other}, 'auth_cache': {}, 'throttle_rejections': {'login_ip': 2}}
+            ))
+            self.client.get(reverse('game_list'))
+            own = self.views()['game_list'][_COUNT] - 4
+            res = self.client.get(reverse('metrics'))
+            self.assertIn(f'http_requests_total{{view="game_list"}} {own + 4}', res.content.decode())
+            self.assertIn('auth_throttle_rejections_total{scope="login_ip"} 2', res.content.decode())
+            self.assertEqual(len(list(Path(root).glob('*.json'))), 2)
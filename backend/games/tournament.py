@@ -1,13 +1,27 @@
 """
 Two-phase tournament engine — merge sort in both phases.
 
-Phase 1 (groups): games split by first genre, sorted via merge sort within
-                  each group. Top 3 by final position advance.
+Phase 1 (groups): games split by first genre, then rebalanced: groups over
+                  MAX_GROUP_SIZE are split evenly, groups under
+                  MIN_GROUP_SIZE are pooled into "Mixed" groups. Each group
+                  is sorted via merge sort; its top N advance, with N scaled
+                  to group size (FINALISTS_PER_GROUP for a full group).
 Phase 2 (final):  finalists sorted via merge sort.
 
 Tiers for finalists by position: S(top 1), A(next 20%), B(next 30%), C(rest).
 Eliminated games -> tier D, ordered by position within their group.
 
+Adaptive mode (phase "adaptive") replaces both phases: every game keeps a
+TrueSkill-style Gaussian skill estimate, and the answers are kept as
+(winner, loser) pairs. Each tier boundary lies between two games, one on
+either side. A game's doubt is the chance that it is really on the other
+side of the game across the boundary; it is 0 once the answers (followed
+transitively) put it on its own side. Each question settles the most
+doubtful game against the game across, no pair is asked twice, and the
+session finishes once no doubt exceeds ADAPTIVE_TOLERANCE (or after as
+many questions as the grouped engine would plan). `current_ranking` gives
+the provisional tier list at any point.
+
 Merge sort state (reused for both group and final):
 {
   "pending": [[id,...], ...],   # sublists yet to be merged
@@ -22,15 +36,30 @@ Merge sort state (reused for both group and final):
 import math
 
 
-FINALISTS_PER_GROUP = 3
+FINALISTS_PER_GROUP = 3       # finalists sent by a group of MAX_GROUP_SIZE
+MIN_GROUP_SIZE = 4
+MAX_GROUP_SIZE = 16
 TIER_LAYOUT = [("S", 1), ("A", 0.20), ("B", 0.30)]  # rest -> C
 
+# adaptive mode: prior skill, per-game performance noise and stopping rule
+ADAPTIVE_MU = 25.0
+ADAPTIVE_SIGMA = 25.0 / 3
+ADAPTIVE_BETA = 25.0 / 12     # users answer consistently; trust each answer
+ADAPTIVE_TOLERANCE = 0.10     # largest doubt left at any tier boundary
+
 
 # ---------------------------------------------------------------------------
 # public API
 # ---------------------------------------------------------------------------
 
-def build_initial_state(games_with_genre: list[tuple[int, str]]) -> dict:
+def build_initial_state(
+    games_with_genre: list[tuple[int, str]],
+    min_group_size: int = MIN_GROUP_SIZE,
+    max_group_size: int = MAX_GROUP_SIZE,
+) -> dict:
+    if not 1 <= min_group_size <= max_group_size // 2:
+        raise ValueError("Group sizes must satisfy 1 <= min <= max / 2.")
+
     genre_map: dict[str, list[int]] = {}
     for gid, genre in games_with_genre:
         key = genre.strip() or "Uncategorised"
@@ -38,22 +67,58 @@ def build_initial_state(games_with_genre: list[tuple[int, str]]) -> dict:
 
     groups = []
     total_comparisons = 0
-    for genre, ids in genre_map.items():
+    finalist_count = 0
+    for genre, ids in _partition(genre_map, min_group_size, max_group_size):
         ms = _ms_build(ids)
         total_comparisons += ms["ms_total"]
-        groups.append({"genre": genre, "games": ids, "ms": ms, "sorted": None})
+        finalists = _finalists_for(len(ids), max_group_size)
+        finalist_count += finalists
+        groups.append({"genre": genre, "games": ids, "ms": ms, "sorted": None, "finalists": finalists})
 
+    # the final's size is known up front, so `total` is the full estimate
+    planned_final = _ms_total_comparisons(finalist_count)
     return _advance({
         "phase":   "groups",
         "groups":  groups,
         "final":   None,
         "done":    0,
-        "total":   total_comparisons,
+        "total":   total_comparisons + planned_final,
+        "planned_final": planned_final,
+        "ranking": None,
+    })
+
+
+def grouped_total(games_with_genre: list[tuple[int, str]]) -> int:
+    """Questions the grouped engine plans for these games."""
+    return build_initial_state(games_with_genre)["total"]
+
+
+def build_adaptive_state(game_ids: list[int], budget: int | None = None) -> dict:
+    """`budget` defaults to grouped_total() as if all games shared a genre."""
+    n = len(game_ids)
+    if budget is None:
+        budget = grouped_total([(gid, "") for gid in game_ids]) if n else 0
+    return _ad_advance({
+        "mode":    "adaptive",
+        "phase":   "adaptive",
+        "groups":  [],
+        "final":   None,
+        "games":   list(game_ids),
+        "mu":      [ADAPTIVE_MU] * n,
+        "sigma2":  [ADAPTIVE_SIGMA ** 2] * n,
+        # answers so far, as [winner index, loser index] into "games"
+        "answers": [],
+        "pair":    None,
+        "done":    0,
+        # never ask more than the grouped engine would
+        "total":   budget,
         "ranking": None,
     })
 
 
 def current_pair(state: dict) -> tuple[int, int] | None:
+    if state["phase"] == "adaptive":
+        return tuple(state["pair"]) if state["pair"] else None
     if state["phase"] == "groups":
         grp = _active_group(state)
         if grp:
@@ -73,6 +138,11 @@ def answer(state: dict, winner_id: int, loser_id: int) -> dict:
     elif state["phase"] == "final":
         _ms_answer(state["final"]["ms"], winner_id, loser_id)
 
+    elif state["phase"] == "adaptive":
+        _ad_answer(state, winner_id, loser_id)
+        state["done"] += 1
+        return _ad_advance(state)
+
     else:
         raise ValueError("Tournament is already finished.")
 
@@ -80,6 +150,13 @@ def answer(state: dict, winner_id: int, loser_id: int) -> dict:
     return _advance(state)
 
 
+def current_ranking(state: dict) -> list[dict] | None:
+    """Final ranking, or for adaptive sessions the provisional one so far."""
+    if state.get("ranking") or state["phase"] != "adaptive":
+        return state.get("ranking")
+    return _ad_ranking(state)
+
+
 def current_group_info(state: dict) -> dict | None:
     if state["phase"] != "groups":
         return None
@@ -96,6 +173,7 @@ def all_game_ids(state: dict) -> list[int]:
         ids.update(grp["games"])
     if state.get("final"):
         ids.update(state["final"]["games"])
+    ids.update(state.get("games", []))
     return list(ids)
 
 
@@ -103,6 +181,49 @@ def all_game_ids(state: dict) -> list[int]:
 # internal — state machine
 # ---------------------------------------------------------------------------
 
+def _partition(genre_map: dict[str, list[int]], min_size: int, max_size: int) -> list[tuple[str, list[int]]]:
+    """Rebalance genre groups so every group holds min_size..max_size games."""
+    groups, leftovers = [], []
+    for genre, ids in genre_map.items():
+        if len(ids) < min_size:
+            leftovers.extend(ids)
+            continue
+        groups.extend(_split_evenly(genre, ids, max_size))
+
+    if len(leftovers) >= min_size or not groups:
+        groups.extend(_split_evenly("Mixed", leftovers, max_size))
+        return [g for g in groups if g[1]]
+
+    # too few to stand on their own: top up the smallest groups with room
+    spill = []
+    for gid in leftovers:
+        smallest = min(groups, key=lambda g: len(g[1]))
+        if len(smallest[1]) < max_size:
+            smallest[1].append(gid)
+        else:
+            spill.append(gid)
+    if spill:
+        # every group is full: one group plus the spill is under
+        # max_size + min_size games, so its two halves fit the bounds
+        name, ids = groups.pop()
+        groups.extend(_split_evenly(name, ids + spill, max_size))
+    return groups
+
+
+def _split_evenly(name: str, ids: list[int], max_size: int) -> list[tuple[str, list[int]]]:
+    chunks = max(1, math.ceil(len(ids) / max_size))
+    if chunks == 1:
+        return [(name, list(ids))]
+    n = len(ids)
+    return [(f"{name} {k + 1}", ids[k * n // chunks:(k + 1) * n // chunks]) for k in range(chunks)]
+
+
+def _finalists_for(size: int, max_size: int) -> int:
+    # a full group sends FINALISTS_PER_GROUP; smaller groups send
+    # proportionally fewer so their top ranks carry the same weight
+    return min(size, max(1, round(size * FINALISTS_PER_GROUP / max_size)))
+
+
 def _active_group(state: dict) -> dict | None:
     for grp in state["groups"]:
         if grp["sorted"] is None:
@@ -139,14 +260,16 @@ def _start_final(state: dict) -> None:
     finalists, eliminated = [], []
     for grp in state["groups"]:
         sorted_ids = grp["sorted"]
-        top = sorted_ids[:FINALISTS_PER_GROUP]
-        rest = sorted_ids[FINALISTS_PER_GROUP:]
+        # sessions started before partitioning have no per-group count
+        advance = grp.get("finalists", FINALISTS_PER_GROUP)
+        top = sorted_ids[:advance]
+        rest = sorted_ids[advance:]
         finalists.extend(top)
         for rank, gid in enumerate(rest):
-            eliminated.append({"id": gid, "group_rank": FINALISTS_PER_GROUP + rank})
+            eliminated.append({"id": gid, "group_rank": advance + rank})
 
     ms = _ms_build(finalists)
-    state["total"] += ms["ms_total"]
+    state["total"] += ms["ms_total"] - state.get("planned_final", 0)
     state["final"] = {"games": finalists, "eliminated": eliminated, "ms": ms}
     state["phase"] = "final"
 
@@ -258,4 +381,121 @@ def _ms_advance(ms: dict) -> None:
             ms["result"] = []
             continue
 
-        break
\ No newline at end of file
+        break
+
+# ---------------------------------------------------------------------------
+# internal — adaptive ranking
+# ---------------------------------------------------------------------------
+
+def _norm_cdf(x: float) -> float:
+    return 0.5 * (1 + math.erf(x / math.sqrt(2)))
+
+
+def _norm_pdf(x: float) -> float:
+    return math.exp(-x * x / 2) / math.sqrt(2 * math.pi)
+
+
+def _ad_answer(state: dict, winner_id: int, loser_id: int) -> None:
+    pair = state["pair"]
+    if not pair:
+        raise ValueError("No active adaptive comparison.")
+    if set(pair) != {winner_id, loser_id}:
+        raise ValueError(f"Expected {pair[0]} vs {pair[1]}, got {winner_id} vs {loser_id}.")
+
+    # TrueSkill update for a two-player match without draws
+    index = {gid: i for i, gid in enumerate(state["games"])}
+    w, l = index[winner_id], index[loser_id]
+    mu, s2 = state["mu"], state["sigma2"]
+    c2 = 2 * ADAPTIVE_BETA ** 2 + s2[w] + s2[l]
+    c = math.sqrt(c2)
+    x = (mu[w] - mu[l]) / c
+    cdf = max(_norm_cdf(x), 1e-12)
+    v = _norm_pdf(x) / cdf
+    k = v * (v + x)
+    mu[w] += s2[w] / c * v
+    mu[l] -= s2[l] / c * v
+    s2[w] *= max(1 - s2[w] / c2 * k, 1e-6)
+    s2[l] *= max(1 - s2[l] / c2 * k, 1e-6)
+    # sessions started before answers were kept have none
+    state.setdefault("answers", []).append([w, l])
+
+
+def _ad_order(state: dict) -> list[int]:
+    """Indices into state["games"], best estimate first."""
+    mu = state["mu"]
+    return sorted(range(len(mu)), key=lambda i: -mu[i])
+
+
+def _reachable(edges: dict[int, list[int]], start: int) -> set[int]:
+    seen, stack = set(), [start]
+    while stack:
+        for nxt in edges.get(stack.pop(), ()):
+            if nxt not in seen:
+                seen.add(nxt)
+                stack.append(nxt)
+    return seen
+
+
+def _ad_doubts(state: dict, order: list[int]) -> list[tuple[float, int, int]]:
+    """(doubt, game, game across) for every game still in doubt at a boundary.
+
+    Games the answers already put on their side of the game across
+    (directly or transitively, without contradiction) are settled. Pairs
+    that were asked are left out too: the estimate has weighed that
+    answer, and asking again would tell a consistent user's answer twice.
+    """
+    mu, s2 = state["mu"], state["sigma2"]
+    answered = {(w, l) for w, l in state.get("answers", ())}
+    beaten, beat_by = {}, {}
+    for w, l in answered:
+        beaten.setdefault(w, []).append(l)
+        beat_by.setdefault(l, []).append(w)
+
+    n = len(order)
+    tiers = _assign_tiers(n)
+    doubts = []
+    # boundary b sits between sorted positions b - 1 and b; games above it
+    # are held against the first game below, and the other way round
+    for b in [b for b in range(1, n) if tiers[b] != tiers[b - 1]]:
+        upper, lower = order[b - 1], order[b]
+        for side, across, above in ((order[:b], lower, True), (order[b:], upper, False)):
+            over, under = _reachable(beat_by, across), _reachable(beaten, across)
+            placed, misplaced = (over, under) if above else (under, over)
+            for i in side:
+                if i in placed and i not in misplaced:
+                    continue
+                if (i, across) in answered or (across, i) in answered:
+                    continue
+                gap = mu[i] - mu[across] if above else mu[across] - mu[i]
+                doubts.append((_norm_cdf(-gap / math.sqrt(s2[i] + s2[across])), i, across))
+    return doubts
+
+
+def _ad_advance(state: dict) -> dict:
+    n = len(state["games"])
+    if n < 2 or state["done"] >= state["total"]:
+        return _ad_finish(state)
+
+    doubts = _ad_doubts(state, _ad_order(state))
+    doubt, i, j = max(doubts, default=(0.0, None, None))
+    if doubt <= ADAPTIVE_TOLERANCE:
+        return _ad_finish(state)
+    state["pair"] = [state["games"][i], state["games"][j]]
+    return state
+
+
+def _ad_ranking(state: dict) -> list[dict]:
+    order = _ad_order(state)
+    tiers = _assign_tiers(len(order))
+    games = state["games"]
+    return [
+        {"id": games[i], "tier": tiers[pos], "rank": pos + 1, "wins": None}
+        for pos, i in enumerate(order)
+    ]
+
+
+def _ad_finish(state: dict) -> dict:
+    state["ranking"] = _ad_ranking(state)
+    state["pair"] = None
+    state["phase"] = "finished"
+    return state
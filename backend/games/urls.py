@@ -1,13 +1,30 @@
 from django.urls import path
-from .views import GameList, GenreList, PlatformList, MarkPlayedView, TournamentStartView, TournamentAnswerView, TournamentStatusView
+from . import async_views
+from .views import GameList, GenreList, PlatformList, BootstrapView, MarkPlayedView, BulkPlayedView, LibraryImportView, SimilarGamesView, RecommendationView, DiscoverView, GameChangesView, ExportView, TournamentStartView, TournamentAnswerView, TournamentStatusView
 
 urlpatterns = [
     path('games/', GameList.as_view(), name='game_list'),
     path('games/<int:pk>/played/', MarkPlayedView.as_view(), name='game_mark_played'),
+    path('games/played/bulk/', BulkPlayedView.as_view(), name='game_bulk_played'),
+    path('games/import/', LibraryImportView.as_view(), name='game_import'),
+    path('games/<int:pk>/similar/', SimilarGamesView.as_view(), name='game_similar'),
+    path('games/recommendations/', RecommendationView.as_view(), name='game_recommendations'),
+    path('games/discover/', DiscoverView.as_view(), name='game_discover'),
+    path('games/changes/', GameChangesView.as_view(), name='game_changes'),
+    path('games/export/<slug:scope>.<slug:fmt>', ExportView.as_view(), name='game_export'),
+    path('games/bootstrap/', BootstrapView.as_view(), name='game_bootstrap'),
     path('genres/', GenreList.as_view(), name='genre_list'),
     path('platforms/', PlatformList.as_view(), name='platform_list'),
 
     path('games/tournament/start/',  TournamentStartView.as_view(),  name='tournament_start'),
     path('games/tournament/answer/', TournamentAnswerView.as_view(), name='tournament_answer'),
     path('games/tournament/status/', TournamentStatusView.as_view(), name='tournament_status'),
+
+    # async twins of the read-heavy endpoints, for ASGI deployments (config/asgi.py)
+    path('async/games/',                   async_views.AsyncGameList.as_view(),             name='async_game_list'),
+    path('async/genres/',                  async_views.AsyncGenreList.as_view(),            name='async_genre_list'),
+    path('async/platforms/',               async_views.AsyncPlatformList.as_view(),         name='async_platform_list'),
+    path('async/games/tournament/start/',  async_views.AsyncTournamentStartView.as_view(),  name='async_tournament_start'),
+    path('async/games/tournament/answer/', async_views.AsyncTournamentAnswerView.as_view(), name='async_tournament_answer'),
+    path('async/games/tournament/status/', async_views.AsyncTournamentStatusView.as_view(), name='async_tournament_status'),
 ]
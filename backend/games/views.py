@@ -1,49 +1,120 @@
+import csv
+import io
+import random
+import threading
+from array import array
+from itertools import islice
+
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.db.models import Count, F, Max, Min
+from django.db.models.functions import ExtractYear
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 
-from .models import Game, Genre, Platform, TournamentSession
-from .serializers import GameSerializer, GenreSerializer, PlatformSerializer
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from .models import Game, GameTombstone, Genre, Platform, TournamentSession, GameNeighbour, RATING_SORT, RELEASE_SORT
+from .serializers import GameSerializer, GenreSerializer, PlatformSerializer, game_fields, only_game_fields
+from . import caching, changes, matching
 from . import tournament as t
 
+# above this many played games the played filter joins the through table
+# instead of sending the cached ids as an IN list
+PLAYED_FILTER_IN_LIMIT = 2000
+
+
+# ?ordering= values; each matches one of the composite indexes on Game
+GAME_ORDERINGS = {
+    'name':         ('name',),
+    'popular':      (F('players_count').desc(), 'name'),
+    'rating':       (RATING_SORT.desc(), 'name'),
+    'release_date': (RELEASE_SORT.desc(), 'name'),
+}
+
+
 class GamePagination(PageNumberPagination):
     page_size = 21
     page_size_query_param = 'page_size'
     max_page_size = 100
 
 
+def filter_games(params, user):
+    """GameList's filters and ordering; shared with the async catalog views."""
+    # base queryset ordered alphabetically
+    qs = Game.objects.all().order_by('name')
+
+    # played filtering
+    played = params.get('played')
+    if played is not None and user.is_authenticated:
+        flag = played.lower()
+        played_ids = caching.played_ids(user.pk)
+        if len(played_ids) <= PLAYED_FILTER_IN_LIMIT:
+            # common case: filter on the cached ids, no through-table join
+            if flag in ('true', '1', 'yes'):
+                qs = qs.filter(pk__in=list(played_ids))
+            elif flag in ('false', '0', 'no'):
+                qs = qs.exclude(pk__in=list(played_ids))
+        elif flag in ('true', '1', 'yes'):
+            qs = qs.filter(players=user)
+        elif flag in ('false', '0', 'no'):
+            qs = qs.exclude(players=user)
+
+    # genre/platform filters
+    genre = params.get('genre')
+    if genre:
+        qs = qs.filter(genres__name__iexact=genre)
+    platform = params.get('platform')
+    if platform:
+        qs = qs.filter(platforms__name__iexact=platform)
+
+    ordering = params.get('ordering')
+    if ordering in GAME_ORDERINGS:
+        qs = qs.order_by(*GAME_ORDERINGS[ordering])
+    elif ordering == 'community':
+        # community rank: best fitted score first, unscored games last
+        qs = qs.order_by(F('community_score__score').desc(nulls_last=True), 'name')
+
+    # the name joins can repeat a game (names match case-insensitively);
+    # the other filters don't join, and DISTINCT would keep the ordering
+    # indexes from serving the query
+    if genre or platform:
+        qs = qs.distinct()
+    return qs
+
+
 class GameList(generics.ListCreateAPIView):
     serializer_class = GameSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = GamePagination
 
     def get_queryset(self):
-        # base queryset ordered alphabetically
-        qs = Game.objects.all().order_by('name')
+        qs = filter_games(self.request.query_params, self.request.user)
+        if self.request.method == 'GET':
+            # ?fields= / ?exclude= limit both the output and what's loaded
+            self.game_fields = game_fields(self.request.query_params)
+            qs = only_game_fields(qs, self.game_fields)
+        return qs
 
-        # played filtering
-        played = self.request.query_params.get('played')
-        if played is not None and self.request.user.is_authenticated:
-            flag = played.lower()
-            if flag in ('true', '1', 'yes'):
-                qs = qs.filter(players=self.request.user)
-            elif flag in ('false', '0', 'no'):
-                qs = qs.exclude(players=self.request.user)
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', getattr(self, 'game_fields', None))
+        return super().get_serializer(*args, **kwargs)
 
-        # genre/platform filters
-        genre = self.request.query_params.get('genre')
-        if genre:
-            qs = qs.filter(genres__name__iexact=genre)
-        platform = self.request.query_params.get('platform')
-        if platform:
-            qs = qs.filter(platforms__name__iexact=platform)
-
-        # distinct in case multiple m2m relationships produced duplicate rows
-        return qs.distinct()
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.user.is_authenticated and 'is_played' in getattr(self, 'game_fields', ('is_played',)):
+            context['played_ids'] = caching.played_ids(self.request.user.pk)
+        return context
 
 class MarkPlayedView(APIView):
     permission_classes = [IsAuthenticated]
@@ -51,17 +122,471 @@ class MarkPlayedView(APIView):
     # marks a game as played
     def post(self, request, pk):
         game = get_object_or_404(Game, pk=pk)
-        game.players.add(request.user)
-        serializer = GameSerializer(game, context={'request': request})
+        with transaction.atomic():
+            _lock_library(request.user)
+            _, created = Game.players.through.objects.get_or_create(game_id=game.pk, user_id=request.user.pk)
+            if created:
+                Game.objects.filter(pk=game.pk).update(players_count=F("players_count") + 1)
+                game.players_count += 1
+        caching.forget_played(request.user.pk)
+        caching.bump_user_version(request.user.pk)
+        serializer = GameSerializer(game, context={'request': request, 'played_ids': {game.pk}})
         return Response(serializer.data)
 
     # marks a game as not played
     def delete(self, request, pk):
         game = get_object_or_404(Game, pk=pk)
-        game.players.remove(request.user)
+        with transaction.atomic():
+            _lock_library(request.user)
+            deleted, _ = Game.players.through.objects.filter(game_id=game.pk, user_id=request.user.pk).delete()
+            if deleted:
+                Game.objects.filter(pk=game.pk, players_count__gt=0).update(players_count=F("players_count") - 1)
+        caching.forget_played(request.user.pk)
+        caching.bump_user_version(request.user.pk)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+# most ids a single bulk library edit may touch
+BULK_PLAYED_MAX = 1000
+
+
+class BulkPlayedView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    # marks many games played/not played in one transaction:
+    # {"add": [ids], "remove": [ids]}
+    def post(self, request):
+        add, remove = request.data.get("add") or [], request.data.get("remove") or []
+        if not isinstance(add, list) or not isinstance(remove, list):
+            return Response({"detail": "add and remove must be lists of game ids."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            add, remove = {int(i) for i in add}, {int(i) for i in remove}
+        except (TypeError, ValueError):
+            return Response({"detail": "add and remove must be lists of game ids."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(add) + len(remove) > BULK_PLAYED_MAX:
+            return Response({"detail": f"At most {BULK_PLAYED_MAX} ids per request."}, status=status.HTTP_400_BAD_REQUEST)
+        if add & remove:
+            return Response({"detail": "A game can't be both added and removed."}, status=status.HTTP_400_BAD_REQUEST)
+
+        added, removed = mark_played_bulk(request.user, add, remove)
+        return Response({
+            "added":   sorted(added),
+            "removed": sorted(removed),
+            "missing": sorted((add | remove) - added - removed),
+        })
+
+
+def _lock_library(user) -> None:
+    """Serialises the counted library writes of `user` until the transaction ends.
+
+    mark_played_bulk works out which rows change from a read; a concurrent
+    writer could otherwise insert or delete them between that read and its
+    own writes, and players_count would be moved twice or not at all.
+    """
+    get_user_model().objects.select_for_update().filter(pk=user.pk).values_list("pk").first()
+
+
+def mark_played_bulk(user, add: set[int], remove: set[int]) -> tuple[set[int], set[int]]:
+    """Add/remove played games for `user`; returns the ids that exist."""
+    through = Game.players.through
+    with transaction.atomic():
+        _lock_library(user)
+        existing = set(Game.objects.filter(pk__in=add | remove).values_list("pk", flat=True))
+        add, remove = add & existing, remove & existing
+        # only rows that actually change move players_count
+        already = set(through.objects.filter(user_id=user.pk, game_id__in=add | remove)
+                      .values_list("game_id", flat=True))
+        new, gone = add - already, remove & already
+        if new:
+            through.objects.bulk_create(
+                [through(game_id=gid, user_id=user.pk) for gid in new], ignore_conflicts=True,
+            )
+            Game.objects.filter(pk__in=new).update(players_count=F("players_count") + 1)
+        if gone:
+            through.objects.filter(user_id=user.pk, game_id__in=gone).delete()
+            Game.objects.filter(pk__in=gone, players_count__gt=0).update(players_count=F("players_count") - 1)
+    caching.forget_played(user.pk)
+    caching.bump_user_version(user.pk)
+    return add, remove
+
+
+# most titles a single library import may contain
+IMPORT_MAX_TITLES = 5000
+
+# per-process title index, keyed on the newest catalog change so added,
+# renamed and deleted games all show up; while a thread rebuilds a stale
+# index, imports keep matching against it
+_title_index_cache = {"signature": None, "index": None, "building": False}
+_title_index_lock = threading.Lock()
+
+
+def _title_signature() -> tuple:
+    # both maxima come straight off the change_seq indexes
+    return (Game.objects.aggregate(last=Max("change_seq"))["last"],
+            GameTombstone.objects.aggregate(last=Max("change_seq"))["last"])
+
+
+def _build_title_index(signature: tuple) -> matching.TitleIndex:
+    games = Game.objects.values_list("pk", "name").iterator(chunk_size=5000)
+    index = matching.TitleIndex(games)
+    with _title_index_lock:
+        _title_index_cache.update(signature=signature, index=index)
+    return index
+
+
+def _rebuild_title_index(signature: tuple):
+    # runs on its own thread, so it has its own database connection to close
+    try:
+        _build_title_index(signature)
+    finally:
+        _title_index_cache["building"] = False
+        connection.close()
+
+
+def _title_index() -> matching.TitleIndex:
+    signature = _title_signature()
+    with _title_index_lock:
+        index = _title_index_cache["index"]
+        if index is not None:
+            if _title_index_cache["signature"] != signature and not _title_index_cache["building"]:
+                _title_index_cache["building"] = True
+                threading.Thread(target=_rebuild_title_index, args=(signature,), daemon=True).start()
+            return index
+    # only the first import in a process waits for a build
+    return _build_title_index(signature)
+
+
+class LibraryImportView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    # matches raw titles against the catalog: {"titles": [...], "mark_played": true}
+    def post(self, request):
+        titles = request.data.get("titles")
+        if not isinstance(titles, list) or not all(isinstance(t, str) for t in titles):
+            return Response({"detail": "titles must be a list of strings."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(titles) > IMPORT_MAX_TITLES:
+            return Response({"detail": f"At most {IMPORT_MAX_TITLES} titles per request."}, status=status.HTTP_400_BAD_REQUEST)
+
+        index = _title_index()
+        matched, ambiguous, unmatched = [], [], []
+        for title, (result, candidates) in zip(titles, index.match_many(titles)):
+            if result == "matched":
+                gid, score = candidates[0]
+                matched.append({"title": title, "id": gid, "name": index.names[gid], "score": round(score, 3)})
+            elif result == "ambiguous":
+                ambiguous.append({"title": title, "candidates": [
+                    {"id": gid, "name": index.names[gid], "score": round(score, 3)} for gid, score in candidates
+                ]})
+            else:
+                unmatched.append(title)
+
+        if matched and request.data.get("mark_played", True):
+            mark_played_bulk(request.user, {m["id"] for m in matched}, set())
+        return Response({"matched": matched, "ambiguous": ambiguous, "unmatched": unmatched})
+
+
+class SimilarGamesView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    # "games like this" from the precomputed neighbour table
+    def get(self, request, pk):
+        key = caching.similar_key(pk) if caching.enabled() else None
+        data = cache.get(key) if key else None
+        if data is None:
+            # one indexed lookup on (game_id, rank); the serialized games
+            # are cached, only is_played is filled in per user
+            rows = (GameNeighbour.objects.filter(game_id=pk).order_by("rank")
+                    .select_related("neighbour")
+                    .prefetch_related("neighbour__genres", "neighbour__platforms"))
+            data = [{**GameSerializer(row.neighbour).data, "similarity": row.score} for row in rows]
+            if key:
+                cache.set(key, data, caching.SIMILAR_TTL)
+        # the cached games are complete; sparse fieldsets just trim them
+        fields = game_fields(request.query_params) | {"similarity"}
+        played = caching.played_ids(request.user.pk) if "is_played" in fields else ()
+        return Response([
+            {key: value for key, value in {**g, "is_played": g["id"] in played}.items() if key in fields}
+            for g in data
+        ])
+
+
+# how much a seed game's neighbours count, by the tier the user gave it
+RECOMMENDATION_SEED_WEIGHTS = {"S": 3.0, "A": 1.0}
+
+
+class RecommendationView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    # neighbours of the user's S/A games they haven't played yet, best first
+    def get(self, request):
+        key = caching.recommendations_key(request.user.pk) if caching.enabled() else None
+        ranked = cache.get(key) if key else None
+        if ranked is None:
+            ranked = _recommend(request.user)
+            if key:
+                cache.set(key, ranked, caching.RECOMMENDATIONS_TTL)
+
+        paginator = GamePagination()
+        page = paginator.paginate_queryset(ranked, request, view=self)
+        fields = game_fields(request.query_params)
+        games = only_game_fields(Game.objects.filter(pk__in=[gid for gid, _ in page]), fields).in_bulk()
+        context = {"request": request, "played_ids": set()}
+        return paginator.get_paginated_response([
+            {**GameSerializer(games[gid], context=context, fields=fields).data, "recommendation_score": score}
+            for gid, score in page if gid in games
+        ])
+
+
+def _recommend(user) -> list[tuple[int, float]]:
+    session = TournamentSession.objects.filter(user=user).first()
+    ranking = session.state.get("ranking") if session else None
+    seeds = {r["id"]: RECOMMENDATION_SEED_WEIGHTS[r["tier"]]
+             for r in ranking or () if r["tier"] in RECOMMENDATION_SEED_WEIGHTS}
+    if not seeds:
+        return []
+
+    played = caching.played_ids(user.pk)
+    scores: dict[int, float] = {}
+    for seed, neighbour, score in GameNeighbour.objects.filter(game_id__in=seeds).values_list(
+        "game_id", "neighbour_id", "score",
+    ):
+        if neighbour not in played:
+            scores[neighbour] = scores.get(neighbour, 0.0) + seeds[seed] * score
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+DISCOVER_DEFAULT = 10
+DISCOVER_MAX = 50
+# ids kept per filter; a request reads a random window of the shuffled pool
+DISCOVER_POOL_SIZE = 5000
+# unfiltered pools are sampled by probing random ids in [min pk, max pk]
+# once the id range is this many times the pool size
+DISCOVER_PROBE_SPAN = 4
+DISCOVER_PROBE_BATCH = 5000
+DISCOVER_PROBE_ROUNDS = 8
+
+
+class DiscoverView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    # random unplayed games: ?n=&genre=&platform=
+    def get(self, request):
+        try:
+            n = int(request.query_params.get("n", DISCOVER_DEFAULT))
+        except ValueError:
+            return Response({"detail": "n must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= n <= DISCOVER_MAX:
+            return Response({"detail": f"n must be between 1 and {DISCOVER_MAX}."}, status=status.HTTP_400_BAD_REQUEST)
+        genre = request.query_params.get("genre", "")
+        platform = request.query_params.get("platform", "")
+
+        pool = _discover_pool(genre, platform)
+        played = caching.played_ids(request.user.pk)
+        picked = []
+        # walk the shuffled pool from a random offset, wrapping around once
+        start = random.randrange(len(pool)) if pool else 0
+        for i in range(len(pool)):
+            gid = pool[(start + i) % len(pool)]
+            if gid not in played:
+                picked.append(gid)
+                if len(picked) == n:
+                    break
+
+        fields = game_fields(request.query_params)
+        games = only_game_fields(Game.objects.filter(pk__in=picked), fields).in_bulk()
+        context = {"request": request, "played_ids": played}
+        return Response([GameSerializer(games[gid], context=context, fields=fields).data
+                         for gid in picked if gid in games])
+
+
+def _discover_pool(genre: str, platform: str) -> array:
+    """Shuffled ids of up to DISCOVER_POOL_SIZE games matching the filter."""
+    key = caching.discover_pool_key(genre, platform)
+    raw = cache.get(key)
+    pool = array('q')
+    if raw is not None:
+        pool.frombytes(raw)
+        return pool
+
+    if genre or platform:
+        qs = Game.objects.all()
+        if genre:
+            qs = qs.filter(genres__name__iexact=genre)
+        if platform:
+            qs = qs.filter(platforms__name__iexact=platform)
+        ids = _window_ids(qs, DISCOVER_POOL_SIZE)
+    else:
+        ids = _probe_ids(DISCOVER_POOL_SIZE)
+    random.shuffle(ids)
+    pool.extend(ids[:DISCOVER_POOL_SIZE])
+    cache.set(key, pool.tobytes(), caching.DISCOVER_POOL_TTL)
+    return pool
+
+
+def _window_ids(qs, size: int) -> list[int]:
+    """Up to `size` ids of `qs`, read in pk order from a random start.
+
+    Bounds the read for filters matching much of the catalog. Each pool is
+    one contiguous window of the matches, wrapping past the highest id; the
+    next pool, once this one expires, starts somewhere else.
+    """
+    bounds = Game.objects.aggregate(lo=Min("pk"), hi=Max("pk"))
+    if bounds["lo"] is None:
+        return []
+    start = random.randint(bounds["lo"], bounds["hi"])
+    ids = qs.values_list("pk", flat=True).order_by("pk").distinct()
+    found = list(ids.filter(pk__gte=start)[:size])
+    if len(found) < size:
+        found += ids.filter(pk__lt=start)[:size - len(found)]
+    return found
+
+
+def _probe_ids(size: int) -> list[int]:
+    """Up to `size` random game ids without scanning the games table.
+
+    Random ids are drawn from [min pk, max pk] and looked up by primary
+    key; gaps left by deleted games just lower the hit rate, which the
+    next round's batch size makes up for.
+    """
+    bounds = Game.objects.aggregate(lo=Min("pk"), hi=Max("pk"))
+    if bounds["lo"] is None:
+        return []
+    lo, hi = bounds["lo"], bounds["hi"]
+    if hi - lo + 1 <= size * DISCOVER_PROBE_SPAN:
+        # small catalog: reading every id is cheaper than probing
+        return list(Game.objects.values_list("pk", flat=True))
+
+    found: set[int] = set()
+    hit_rate = 1.0
+    for _ in range(DISCOVER_PROBE_ROUNDS):
+        wanted = size - len(found)
+        if wanted <= 0:
+            break
+        batch = min(DISCOVER_PROBE_BATCH, hi - lo + 1, int(wanted / hit_rate * 1.2) + 1)
+        probes = set(random.sample(range(lo, hi + 1), batch)) - found
+        hits = set(Game.objects.filter(pk__in=probes).values_list("pk", flat=True))
+        hit_rate = max(len(hits) / len(probes), 0.01) if probes else hit_rate
+        found |= hits
+    return list(found)[:size]
+
+
+CHANGES_PAGE_SIZE = 500
+CHANGES_MAX_PAGE_SIZE = 2000
+
+
+class GameChangesView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    # catalog delta feed for mirrors: ?since=<cursor>&limit=
+    # games changed and ids deleted after the cursor, in (change_seq, id)
+    # order; no cursor starts from the beginning (a full sync)
+    def get(self, request):
+        since = request.query_params.get("since")
+        try:
+            cursor = changes.loads(since) if since else {}
+        except signing.BadSignature:
+            return Response({"detail": "Invalid cursor."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get("limit", CHANGES_PAGE_SIZE))
+        except ValueError:
+            return Response({"detail": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, CHANGES_MAX_PAGE_SIZE))
+
+        # change numbers become visible in order (models.next_change), so
+        # nothing can later commit behind the last row read
+        games = changes.after(Game.objects.all(), "change_seq", "pk", cursor.get("games"))
+        fields = game_fields(request.query_params)
+        # change_seq is always loaded: the cursor is built from it
+        games = list(only_game_fields(games, fields | {"change_seq"})[:limit + 1])
+        tombstones = changes.after(GameTombstone.objects.all(), "change_seq", "game_id", cursor.get("deleted"))
+        tombstones = list(tombstones.values_list("change_seq", "game_id")[:limit + 1])
+
+        more = len(games) > limit or len(tombstones) > limit
+        games, tombstones = games[:limit], tombstones[:limit]
+        # each feed keeps its own position; an empty page leaves it as it was
+        if games:
+            cursor["games"] = [games[-1].change_seq, games[-1].pk]
+        if tombstones:
+            cursor["deleted"] = list(tombstones[-1])
+        played = caching.played_ids(request.user.pk) if "is_played" in fields else ()
+        context = {"request": request, "played_ids": played}
+        return Response({
+            # apply changed before deleted: ids are never reused
+            "changed": GameSerializer(games, many=True, context=context, fields=fields).data,
+            "deleted": [game_id for _, game_id in tombstones],
+            "cursor": changes.dumps(cursor),
+            "more": more,
+        })
+
+
+# rows read per server-side cursor fetch; genres/platforms are looked up
+# once per chunk, so memory stays flat however many rows are exported
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FIELDS = ["id", "name", "release_date", "rating", "image", "rawg_id", "players_count"]
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+class ExportView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    # games/export/catalog.ndjson, games/export/library.csv, ...
+    def get(self, request, scope, fmt):
+        if scope not in ("catalog", "library"):
+            return Response({"detail": "scope must be catalog or library."}, status=status.HTTP_404_NOT_FOUND)
+        if fmt not in EXPORT_FORMATS:
+            return Response(
+                {"detail": f"format must be one of: {', '.join(EXPORT_FORMATS)}."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        qs = Game.objects.all() if scope == "catalog" else Game.objects.filter(players=request.user)
+        chunks = _export_chunks(qs)
+        body = _ndjson_lines(chunks) if fmt == "ndjson" else _csv_lines(chunks)
+        response = StreamingHttpResponse(body, content_type=EXPORT_FORMATS[fmt])
+        response["Content-Disposition"] = f'attachment; filename="{scope}.{fmt}"'
+        return response
+
+
+def _export_chunks(qs):
+    """Yield lists of export rows (dicts), EXPORT_CHUNK_SIZE at a time."""
+    rows = qs.order_by("pk").values_list(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    while chunk := list(islice(rows, EXPORT_CHUNK_SIZE)):
+        ids = [row[0] for row in chunk]
+        genres = _names_by_game(Game.genres.through, "genre", ids)
+        platforms = _names_by_game(Game.platforms.through, "platform", ids)
+        yield [
+            {**dict(zip(EXPORT_FIELDS, row)), "genres": genres.get(row[0], []), "platforms": platforms.get(row[0], [])}
+            for row in chunk
+        ]
+
+
+def _names_by_game(through, relation: str, ids: list[int]) -> dict[int, list[str]]:
+    names: dict[int, list[str]] = {}
+    for game_id, name in (through.objects.filter(game_id__in=ids)
+                          .order_by(f"{relation}__name").values_list("game_id", f"{relation}__name")):
+        names.setdefault(game_id, []).append(name)
+    return names
+
+
+def _ndjson_lines(chunks):
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    for chunk in chunks:
+        yield "".join(encoder.encode(row) + "\n" for row in chunk)
+
+
+def _csv_lines(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS + ["genres", "platforms"])
+    for chunk in chunks:
+        for row in chunk:
+            writer.writerow([row[f] for f in EXPORT_FIELDS] + [", ".join(row["genres"]), ", ".join(row["platforms"])])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
 class GenreList(generics.ListAPIView):
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
@@ -75,13 +600,53 @@ class PlatformList(generics.ListAPIView):
     pagination_class = None
 
 
-def _build_response(state: dict, request) -> dict:
+class BootstrapView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    # everything the games page needs on load, in one round trip: genres and
+    # platforms with game counts (shared, cached), the first games page
+    # (same query params as GameList) and the user's tier list status
+    def get(self, request):
+        facets = cache.get(caching.CATALOG_FACETS_KEY)
+        if facets is None:
+            facets = {
+                "genres": list(Genre.objects.annotate(games_count=Count("games"))
+                               .order_by("name").values("id", "name", "games_count")),
+                "platforms": list(Platform.objects.annotate(games_count=Count("games"))
+                                  .order_by("name").values("id", "name", "games_count")),
+                "total_games": Game.objects.count(),
+            }
+            cache.set(caching.CATALOG_FACETS_KEY, facets, caching.CATALOG_FACETS_TTL)
+
+        games = GameList(request=request, format_kwarg=None, args=(), kwargs={}).list(request).data
+        session = (TournamentSession.objects.filter(user=request.user)
+                   .values("state__phase", "state__done", "state__total", "version").first())
+        tournament = session and {
+            "phase": session["state__phase"],
+            "done": session["state__done"],
+            "total": session["state__total"],
+            "version": session["version"],
+        }
+        return Response({**facets, "games": games, "tournament": tournament})
+
+
+def _build_response(state: dict, request, version: int | None = None) -> dict:
     """Single place that turns a state dict into the API response."""
-    game_map = {
-        g.pk: GameSerializer(g, context={"request": request}).data
-        for g in Game.objects.filter(pk__in=t.all_game_ids(state))
-    }
+    context = {"request": request, "played_ids": caching.played_ids(request.user.pk)}
+    games = Game.objects.filter(pk__in=response_game_ids(state)).prefetch_related("genres", "platforms")
+    return assemble_response(state, {g.pk: GameSerializer(g, context=context).data for g in games}, version)
+
+
+def response_game_ids(state: dict) -> set[int]:
+    # only the games actually shown are serialized, not the whole library
+    return set(t.current_pair(state) or ()) | {r["id"] for r in state.get("ranking") or ()}
+
+
+def assemble_response(state: dict, game_map: dict, version: int | None) -> dict:
+    """The response body, given the serialized games from response_game_ids()."""
     pair = t.current_pair(state)
+    # adaptive sessions can show their tier list before they finish
+    provisional = t.current_ranking(state) if state["phase"] == "adaptive" else None
     ranking = None
     if state.get("ranking"):
         ranking = [{**game_map[r["id"]], "tier": r["tier"], "rank": r["rank"], "wins": r["wins"]}
@@ -93,32 +658,76 @@ def _build_response(state: dict, request) -> dict:
         "pair":       [game_map[gid] for gid in pair] if pair else None,
         "group_info": t.current_group_info(state),
         "ranking":    ranking,
+        "provisional": [{"id": r["id"], "tier": r["tier"], "rank": r["rank"]} for r in provisional]
+                       if provisional else None,
+        "version":    version,
     }
 
 
+# group stage keys: m2m relations resolve to their first (lowest pk) entry,
+# matching what `.first()` used to pick; None means release year
+TOURNAMENT_GROUP_KEYS = {
+    "genre":    ("genres", Genre),
+    "platform": ("platforms", Platform),
+    "year":     None,
+}
+
+
+def _played_games_with_key(user, group_by: str) -> list[tuple[int, str]]:
+    """(game id, group key) for every game `user` played, in O(1) queries."""
+    played = Game.objects.filter(players=user)
+    key = TOURNAMENT_GROUP_KEYS[group_by]
+    if key is None:
+        rows = played.values_list("pk", ExtractYear("release_date"))
+        return [(pk, str(year) if year else "") for pk, year in rows]
+
+    relation, model = key
+    rows = list(played.annotate(key_id=Min(f"{relation}__pk")).values_list("pk", "key_id"))
+    names = dict(model.objects.filter(pk__in={k for _, k in rows if k}).values_list("pk", "name"))
+    return [(pk, names.get(key_id, "")) for pk, key_id in rows]
+
+
 class TournamentStartView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        played = Game.objects.filter(players=request.user).prefetch_related("genres")
-        if played.count() < 2:
+        mode = request.data.get("mode", "merge")
+        if mode not in ("merge", "adaptive"):
+            return Response({"detail": "mode must be merge or adaptive."}, status=status.HTTP_400_BAD_REQUEST)
+        group_by = request.data.get("group_by", "genre")
+        if group_by not in TOURNAMENT_GROUP_KEYS:
+            return Response(
+                {"detail": f"group_by must be one of: {', '.join(TOURNAMENT_GROUP_KEYS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        games_with_genre = _played_games_with_key(request.user, group_by)
+        if len(games_with_genre) < 2:
             return Response(
                 {"detail": "You need at least 2 played games to start a tier list."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        games_with_genre = [
-            (game.pk, game.genres.first().name if game.genres.first() else "")
-            for game in played
-        ]
-        state = t.build_initial_state(games_with_genre)
-        TournamentSession.objects.update_or_create(user=request.user, defaults={"state": state})
-        return Response(_build_response(state, request))
+        if mode == "adaptive":
+            state = t.build_adaptive_state([gid for gid, _ in games_with_genre],
+                                           budget=t.grouped_total(games_with_genre))
+        else:
+            state = t.build_initial_state(games_with_genre)
+        if request.data.get("stateless"):
+            # client keeps the state; nothing is stored until the ranking is done.
+            # every card is cached now so the answers that follow read none
+            _game_cards([gid for gid, _ in games_with_genre])
+            return Response(stateless_response(state, request.user))
+        version = _store_session(request.user, state)
+        return Response(_build_response(state, request, version))
 
 
 class TournamentAnswerView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
+        token = request.data.get("token")
+        if token:
+            return self._answer_stateless(request, token)
+
         try:
             session = TournamentSession.objects.get(user=request.user)
         except TournamentSession.DoesNotExist:
@@ -129,14 +738,124 @@ class TournamentAnswerView(APIView):
         if not winner_id or not loser_id:
             return Response({"detail": "winner and loser are required."}, status=status.HTTP_400_BAD_REQUEST)
 
+        # clients echo the version they were shown; an older one means the
+        # answer was given against a pair that has since moved on
+        try:
+            client_version = parse_version(request.data.get("version"))
+        except ValueError:
+            return Response({"detail": "version must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        if client_version is not None and client_version != session.version:
+            return _conflict_response(session, request)
+
         try:
             state = t.answer(session.state, int(winner_id), int(loser_id))
         except ValueError as exc:
             return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-        session.state = state
-        session.save()
-        return Response(_build_response(state, request))
+        # compare-and-swap: only write if nobody else did since we read
+        updated = TournamentSession.objects.filter(pk=session.pk, version=session.version).update(
+            state=state, version=F("version") + 1, updated_at=timezone.now(),
+        )
+        if not updated:
+            session.refresh_from_db(fields=["state", "version"])
+            return _conflict_response(session, request)
+        if state["phase"] == "finished":
+            caching.bump_user_version(request.user.pk)
+        return Response(_build_response(state, request, session.version + 1))
+
+    def _answer_stateless(self, request, token):
+        try:
+            state = _load_state(token, request.user)
+        except signing.BadSignature:
+            return Response({"detail": "Invalid or expired tournament token."}, status=status.HTTP_400_BAD_REQUEST)
+
+        winner_id = request.data.get("winner")
+        loser_id  = request.data.get("loser")
+        if not winner_id or not loser_id:
+            return Response({"detail": "winner and loser are required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            state = t.answer(state, int(winner_id), int(loser_id))
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if state["phase"] == "finished":
+            version = _store_session(request.user, state)
+            return Response(_build_response(state, request, version))
+        return Response(stateless_response(state, request.user))
+
+
+def parse_version(value) -> int | None:
+    """The session version a client echoed back, or None if it sent none.
+
+    Raises ValueError for anything but an integer (or its string form).
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"invalid version: {value!r}")
+    return int(value)
+
+
+def _store_session(user, state: dict) -> int:
+    """Persist `state` as the user's session and return its new version."""
+    # a new or finished tier list changes the user's recommendation seeds
+    caching.bump_user_version(user.pk)
+    session, created = TournamentSession.objects.get_or_create(user=user, defaults={"state": state})
+    if created:
+        return session.version
+    # overwriting still bumps the version so answers aimed at the old
+    # tournament are rejected as stale. read it back under the row lock the
+    # update took: a concurrent restart may have bumped it as well
+    with transaction.atomic():
+        TournamentSession.objects.filter(pk=session.pk).update(
+            state=state, version=F("version") + 1, updated_at=timezone.now(),
+        )
+        session.refresh_from_db(fields=["version"])
+    return session.version
+
+
+# stateless mode: the state travels with the client as a signed, compressed
+# token bound to the user, so answering needs no session read or write.
+# the cards shown for the pair come from the cache, filled for the whole
+# library at start, so answering reads no Game rows either
+TOURNAMENT_TOKEN_SALT = "games.tournament.state"
+TOURNAMENT_CARD_FIELDS = {"id", "name", "image", "genre", "rating"}
+
+
+def _game_cards(ids) -> dict[int, dict]:
+    """What the pair shows per game: cached cards, the rest read and cached."""
+    keys = {caching.card_key(gid): gid for gid in ids}
+    cards = {keys[key]: card for key, card in cache.get_many(list(keys)).items()}
+    missing = [gid for gid in keys.values() if gid not in cards]
+    if missing:
+        games = Game.objects.filter(pk__in=missing).only("pk", "name", "image", "rating").prefetch_related("genres")
+        read = {g.pk: dict(GameSerializer(g, fields=TOURNAMENT_CARD_FIELDS).data) for g in games}
+        cache.set_many({caching.card_key(gid): card for gid, card in read.items()}, caching.TOURNAMENT_CARD_TTL)
+        cards.update(read)
+    return cards
+
+
+def stateless_response(state: dict, user) -> dict:
+    """The response for an unfinished stateless tournament, with its token."""
+    body = assemble_response(state, _game_cards(response_game_ids(state)), None)
+    body["token"] = signing.dumps({"u": user.pk, "s": state}, salt=TOURNAMENT_TOKEN_SALT, compress=True)
+    return body
+
+
+def _load_state(token: str, user) -> dict:
+    # tokens from before cards moved to the cache still carry them under "c";
+    # they are ignored
+    payload = signing.loads(token, salt=TOURNAMENT_TOKEN_SALT, max_age=settings.TOURNAMENT_TOKEN_MAX_AGE)
+    if payload.get("u") != user.pk:
+        raise signing.BadSignature("Token belongs to another user.")
+    return payload["s"]
+
+
+def _conflict_response(session: TournamentSession, request) -> Response:
+    body = _build_response(session.state, request, session.version)
+    body["detail"] = "Tournament state changed since this pair was shown."
+    return Response(body, status=status.HTTP_409_CONFLICT)
 
 
 class TournamentStatusView(APIView):
@@ -147,4 +866,4 @@ class TournamentStatusView(APIView):
             session = TournamentSession.objects.get(user=request.user)
         except TournamentSession.DoesNotExist:
             return Response({"detail": "No active session."}, status=status.HTTP_404_NOT_FOUND)
-        return Response(_build_response(session.state, request))
\ No newline at end of file
+        return Response(_build_response(session.state, request, session.version))
\ No newline at end of file
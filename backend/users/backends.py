@@ -0,0 +1,71 @@
+"""
+Authentication backend that caches the user row.
+
+SessionAuthentication resolves request.user through the backend's
+get_user() on every request. This backend keeps each user in the cache for
+AUTH_USER_TTL seconds and drops the entry when the user is saved or
+deleted or logs out (see users.signals). Together with the cached_db
+session engine (users.sessions), a steady-state authenticated request does
+no auth queries at all.
+
+Both only cache with settings.AUTH_CACHE_ENABLED, which needs a cache all
+workers share: the drop has to reach every worker, or a deactivated user
+or a session from before a password change keeps working elsewhere until
+the entry expires. Without it, this is plain ModelBackend.
+
+Lookups are counted per process in AUTH_CACHE_STATS, for hit-rate metrics.
+"""
+
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+AUTH_USER_TTL = 60 * 5
+
+# {"user_hits", "user_misses", "session_hits", "session_misses"} -> count
+AUTH_CACHE_STATS = Counter()
+_stats_lock = threading.Lock()
+
+
+def record_lookup(kind: str, hit: bool) -> None:
+    with _stats_lock:
+        AUTH_CACHE_STATS[f"{kind}_{'hits' if hit else 'misses'}"] += 1
+
+
+def user_cache_key(user_id) -> str:
+    return f"auth:user:{user_id}"
+
+
+def forget_user(user_id) -> None:
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        if not settings.AUTH_CACHE_ENABLED:
+            return super().get_user(user_id)
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        record_lookup("user", user is not None)
+        if user is None:
+            # None for missing or inactive users; those aren't cached
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, AUTH_USER_TTL)
+        return user
+
+    async def aget_user(self, user_id):
+        if not settings.AUTH_CACHE_ENABLED:
+            return await super().aget_user(user_id)
+        key = user_cache_key(user_id)
+        user = await cache.aget(key)
+        record_lookup("user", user is not None)
+        if user is None:
+            user = await super().aget_user(user_id)
+            if user is not None:
+                await cache.aset(key, user, AUTH_USER_TTL)
+        return user
@@ -0,0 +1,29 @@
+from django.contrib.sessions.backends import cached_db
+
+from .backends import record_lookup
+
+
+class SessionStore(cached_db.SessionStore):
+    """cached_db sessions that count cache hits and misses (AUTH_CACHE_STATS)."""
+
+    _from_db = False
+
+    def _get_session_from_db(self):
+        self._from_db = True
+        return super()._get_session_from_db()
+
+    async def _aget_session_from_db(self):
+        self._from_db = True
+        return await super()._aget_session_from_db()
+
+    def load(self):
+        self._from_db = False
+        data = super().load()
+        record_lookup("session", not self._from_db)
+        return data
+
+    async def aload(self):
+        self._from_db = False
+        data = await super().aload()
+        record_lookup("session", not self._from_db)
+        return data
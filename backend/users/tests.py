@@ -1,4 +1,7 @@
-from django.test import TestCase
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from django.contrib.auth import get_user_model
@@ -51,3 +54,139 @@ class AuthTests(TestCase):
         self.assertEqual(response.cookies['sessionid']['max-age'], 0)
         # subsequent authenticated check should fail
         self.assertFalse(self.client.session.session_key)
+
+
+# a shared cache in production; the test process is the only "worker"
+@override_settings(AUTH_CACHE_ENABLED=True, SESSION_ENGINE='users.sessions')
+class AuthCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="secret")
+        self.client.post(reverse('user-login'), {'username': 'alice', 'password': 'secret'})
+
+    def test_steady_state_requests_skip_auth_queries(self):
+        from .backends import AUTH_CACHE_STATS
+        url = reverse('genre_list')
+        self.client.get(url)
+        before = AUTH_CACHE_STATS.copy()
+        # only the view's own query: session and user come from the cache
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(AUTH_CACHE_STATS['user_hits'] - before['user_hits'], 1)
+        self.assertEqual(AUTH_CACHE_STATS['session_hits'] - before['session_hits'], 1)
+
+    def test_saving_user_invalidates_cache(self):
+        url = reverse('genre_list')
+        self.client.get(url)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_password_change_ends_other_sessions(self):
+        url = reverse('genre_list')
+        self.client.get(url)
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    @override_settings(AUTH_CACHE_ENABLED=False)
+    def test_nothing_cached_without_a_shared_cache(self):
+        from django.core.cache import cache
+        from .backends import user_cache_key
+        self.client.get(reverse('genre_list'))
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+
+    def test_logout_drops_cached_user(self):
+        from django.core.cache import cache
+        from .backends import user_cache_key
+        self.client.get(reverse('genre_list'))
+        self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+        self.client.post(reverse('user-logout'))
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+
+
+@override_settings(AUTH_THROTTLES={'login_ip': (10, 3600), 'login_username': (3, 300), 'register_ip': (2, 3600)})
+class AuthThrottleTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="secret")
+
+    def login(self, username='alice', password='wrong', ip='10.0.0.1', **extra):
+        return self.client.post(
+            reverse('user-login'), {'username': username, 'password': password}, REMOTE_ADDR=ip, **extra,
+        )
+
+    def test_username_bucket_rejects_before_hashing(self):
+        from .throttling import THROTTLE_REJECTIONS
+        before = THROTTLE_REJECTIONS['login_username']
+        for _ in range(3):
+            self.assertEqual(self.login().status_code, 400)
+        # same account from a different address, in a different case
+        with mock.patch('users.views.authenticate') as authenticate:
+            response = self.login(username='ALICE', ip='10.0.0.2')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        authenticate.assert_not_called()
+        self.assertEqual(THROTTLE_REJECTIONS['login_username'] - before, 1)
+
+    def test_failed_login_hashes_once(self):
+        from django.contrib.auth.backends import ModelBackend
+        original = ModelBackend.authenticate
+        for username in ('alice', 'nobody'):
+            with mock.patch.object(ModelBackend, 'authenticate', autospec=True, side_effect=original) as auth:
+                self.assertEqual(self.login(username=username).status_code, 400)
+            self.assertEqual(auth.call_count, 1)
+
+    def test_ip_bucket_spans_usernames(self):
+        for i in range(10):
+            self.assertEqual(self.login(username=f'user{i}').status_code, 400)
+        self.assertEqual(self.login(username='someone-else').status_code, 429)
+        self.assertEqual(self.login(username='someone-else', ip='10.0.0.9').status_code, 400)
+
+    def test_forged_forwarded_for_shares_the_ip_bucket(self):
+        for i in range(10):
+            res = self.login(username=f'user{i}', HTTP_X_FORWARDED_FOR=f'192.0.2.{i}')
+            self.assertEqual(res.status_code, 400)
+        res = self.login(username='someone-else', HTTP_X_FORWARDED_FOR='192.0.2.99')
+        self.assertEqual(res.status_code, 429)
+
+    def test_trusted_proxy_hop_identifies_the_client(self):
+        rest = {**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}
+        with override_settings(REST_FRAMEWORK=rest):
+            for i in range(10):
+                # the proxy appends the address it saw; anything before it is the client's say
+                res = self.login(username=f'user{i}', HTTP_X_FORWARDED_FOR=f'198.51.100.{i}, 203.0.113.5')
+                self.assertEqual(res.status_code, 400)
+            self.assertEqual(self.login(username='x', HTTP_X_FORWARDED_FOR='203.0.113.5').status_code, 429)
+            self.assertEqual(self.login(username='x', HTTP_X_FORWARDED_FOR='203.0.113.6').status_code, 400)
+
+    def test_registration_throttled_per_ip(self):
+        for i in range(2):
+            response = self.client.post(
+                reverse('user-register'), {'username': f'new{i}', 'password': 'pw12345!'}, REMOTE_ADDR='10.0.0.5',
+            )
+            self.assertEqual(response.status_code, 201)
+        response = self.client.post(
+            reverse('user-register'), {'username': 'new3', 'password': 'pw12345!'}, REMOTE_ADDR='10.0.0.5',
+        )
+        self.assertEqual(response.status_code, 429)
+
+    def test_buckets_refill_over_time(self):
+        from .throttling import take_token
+        self.assertEqual(take_token('login_username', 'x', now=0.0), 0)
+        for _ in range(2):
+            take_token('login_username', 'x', now=0.0)
+        # 3 tokens per 300s: the next one is 100s away
+        self.assertAlmostEqual(take_token('login_username', 'x', now=0.0), 100.0)
+        self.assertEqual(take_token('login_username', 'x', now=100.0), 0)
+
+    def test_falls_back_to_local_buckets_when_cache_fails(self):
+        with mock.patch('users.throttling.cache') as broken:
+            broken.get.side_effect = ConnectionError
+            broken.set.side_effect = ConnectionError
+            codes = [self.login(username='bob').status_code for _ in range(4)]
+        self.assertEqual(codes, [400, 400, 400, 429])
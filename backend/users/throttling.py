@@ -0,0 +1,128 @@
+"""
+Token-bucket throttles for the auth endpoints.
+
+A bucket holds up to `capacity` tokens and refills `capacity` tokens every
+`period` seconds. Each attempt takes one token, and an empty bucket rejects
+the request. Login attempts draw from one bucket per client IP and one per
+username, and registrations from one per IP. Rejection happens in DRF's
+throttle check, before the view runs, so rejected attempts never reach
+the password hasher.
+
+The client IP is DRF's get_ident(): REMOTE_ADDR, or with NUM_PROXIES set
+the address the outermost trusted proxy saw, so a forged X-Forwarded-For
+doesn't buy a fresh bucket.
+
+Buckets are stored in the default cache as (tokens, timestamp). Workers
+share them only when that cache is shared (REDIS_URL); with the
+per-process default each worker keeps its own, and a client gets that
+many times the limit. Two workers racing on the same bucket can let an
+attempt or two through. If the cache errors, a bounded in-process store
+takes over, so throttling still holds per worker.
+
+Rejections are counted per scope in THROTTLE_REJECTIONS.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+
+logger = logging.getLogger(__name__)
+
+LOCAL_BUCKETS_MAX = 10_000
+
+THROTTLE_REJECTIONS = Counter()
+_local_buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+_lock = threading.Lock()
+
+
+def _load(key: str):
+    try:
+        return cache.get(key)
+    except Exception:
+        logger.warning("throttle cache unavailable, using in-process buckets")
+        with _lock:
+            return _local_buckets.get(key, False)
+
+
+def _store(key: str, bucket: tuple[float, float], timeout: int) -> None:
+    try:
+        cache.set(key, bucket, timeout)
+        return
+    except Exception:
+        pass
+    with _lock:
+        _local_buckets[key] = bucket
+        _local_buckets.move_to_end(key)
+        while len(_local_buckets) > LOCAL_BUCKETS_MAX:
+            _local_buckets.popitem(last=False)
+
+
+def take_token(scope: str, ident: str, now: float | None = None) -> float:
+    """Take a token from the (scope, ident) bucket.
+
+    Returns 0 when the attempt is allowed, otherwise the seconds until a
+    token is available.
+    """
+    capacity, period = settings.AUTH_THROTTLES[scope]
+    rate = capacity / period
+    now = time.time() if now is None else now
+    key = f"throttle:{scope}:{ident}"
+
+    bucket = _load(key)
+    tokens, updated = bucket if bucket else (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    # a bucket refilled to capacity is the same as no bucket, so let it expire
+    _store(key, (tokens, now), int(period) + 1)
+    return 0.0 if allowed else (1 - tokens) / rate
+
+
+def _client_ip(throttle, request) -> str | None:
+    return throttle.get_ident(request)
+
+
+def _username(throttle, request) -> str | None:
+    username = request.data.get("username") if hasattr(request.data, "get") else None
+    if not username:
+        return None
+    # hashed: usernames can hold characters cache keys can't
+    return hashlib.sha256(str(username).strip().lower().encode()).hexdigest()[:32]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    # (scope in settings.AUTH_THROTTLES, ident function)
+    buckets = []
+
+    def allow_request(self, request, view):
+        self.wait_seconds = 0.0
+        for scope, ident_for in self.buckets:
+            ident = ident_for(self, request)
+            if ident is None:
+                continue
+            wait = take_token(scope, ident)
+            if wait:
+                with _lock:
+                    THROTTLE_REJECTIONS[scope] += 1
+                self.wait_seconds = wait
+                return False
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginThrottle(TokenBucketThrottle):
+    buckets = [("login_ip", _client_ip), ("login_username", _username)]
+
+
+class RegisterThrottle(TokenBucketThrottle):
+    buckets = [("register_ip", _client_ip)]
@@ -1,4 +1,4 @@
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import SESSION_KEY, authenticate, login, logout
 from django.middleware.csrf import get_token
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
@@ -8,8 +8,10 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from .backends import forget_user
 from .models import User
 from .serializers import UserSerializer
+from .throttling import LoginThrottle, RegisterThrottle
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -17,6 +19,7 @@ class UserCreateView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [RegisterThrottle]
 
     def post(self, request, *args, **kwargs):
         response = super().post(request, *args, **kwargs)
@@ -33,6 +36,8 @@ from django.views.decorators.csrf import csrf_exempt
 class LoginView(APIView):
     authentication_classes = []
     permission_classes = [AllowAny]
+    # checked before post(), so throttled attempts never hash a password
+    throttle_classes = [LoginThrottle]
 
     def post(self, request):
         username = request.data.get('username')
@@ -54,8 +59,13 @@ class LogoutView(APIView):
     permission_classes = []
 
     def post(self, request):
-        # even if the user is anonymous, calling logout is harmless
+        # even if the user is anonymous, calling logout is harmless. this
+        # view has no authenticators, so user_logged_out gets no user: drop
+        # the cached one here
+        user_id = request.session.get(SESSION_KEY)
         logout(request)
+        if user_id is not None:
+            forget_user(user_id)
         response = Response(status=status.HTTP_204_NO_CONTENT)
         # instruct browser to delete the sessionid cookie
         response.delete_cookie('sessionid', path='/')
@@ -13,6 +13,17 @@ const GameList = () => {
   const [selectedGenre, setSelectedGenre] = useState("");
   const [selectedPlatform, setSelectedPlatform] = useState("");
   const [selectedPlayed, setSelectedPlayed] = useState("");
+  const [selectedOrdering, setSelectedOrdering] = useState("");
+  const [bootstrapped, setBootstrapped] = useState(false);
+
+  const applyPage = (data) => {
+    setGames(data.results || []);
+    setPageInfo({
+      next: data.next,
+      previous: data.previous,
+      count: data.count,
+    });
+  };
 
   // utility that fetches games from the API using filters and pagination
   const fetchGames = () => {
@@ -21,34 +32,19 @@ const GameList = () => {
     if (selectedPlatform) params.platform = selectedPlatform;
     if (selectedPlayed === "played") params.played = true;
     if (selectedPlayed === "unplayed") params.played = false;
+    if (selectedOrdering) params.ordering = selectedOrdering;
 
     axios
       .get("http://localhost:8000/api/games/", { params })
-      .then((res) => {
-        setGames(res.data.results || []);
-        setPageInfo({
-          next: res.data.next,
-          previous: res.data.previous,
-          count: res.data.count,
-        });
-      })
+      .then((res) => applyPage(res.data))
       .catch((err) => {
         console.error(err);
       });
   };
 
-  // reset to first page if any filter value changes
-  useEffect(() => {
-    setCurrentPage(1);
-  }, [selectedGenre, selectedPlatform, selectedPlayed]);
-
-  // initial load and whenever page or filters change
-  useEffect(() => {
-    fetchGames();
-  }, [currentPage, selectedGenre, selectedPlatform, selectedPlayed]);
-
-  // fetch auxiliary lists for filters
-  useEffect(() => {
+  // filter lists from their own endpoints, without game counts, for when
+  // bootstrap fails
+  const fetchFilterLists = () => {
     axios
       .get("http://localhost:8000/api/genres/")
       .then((res) => {
@@ -64,6 +60,33 @@ const GameList = () => {
         setPlatforms(data);
       })
       .catch((err) => console.error(err));
+  };
+
+  // reset to first page if any filter value changes
+  useEffect(() => {
+    setCurrentPage(1);
+  }, [selectedGenre, selectedPlatform, selectedPlayed, selectedOrdering]);
+
+  // refetch whenever page or filters change; the first page comes from bootstrap
+  useEffect(() => {
+    if (bootstrapped) fetchGames();
+  }, [currentPage, selectedGenre, selectedPlatform, selectedPlayed, selectedOrdering]);
+
+  // initial load: filter lists and the first page in one request
+  useEffect(() => {
+    axios
+      .get("http://localhost:8000/api/games/bootstrap/")
+      .then((res) => {
+        setGenres(res.data.genres);
+        setPlatforms(res.data.platforms);
+        applyPage(res.data.games);
+      })
+      .catch((err) => {
+        console.error(err);
+        fetchFilterLists();
+        fetchGames();
+      })
+      .finally(() => setBootstrapped(true));
   }, []);
 
   return (
@@ -80,7 +103,7 @@ const GameList = () => {
             <option value="">All</option>
             {genres.map((g) => (
               <option key={g.id} value={g.name}>
-                {g.name}
+                {g.games_count === undefined ? g.name : `${g.name} (${g.games_count})`}
               </option>
             ))}
           </select>
@@ -94,7 +117,7 @@ const GameList = () => {
               <option value="">All</option>
               {platforms.map((p) => (
                 <option key={p.id} value={p.name}>
-                  {p.name}
+                  {p.games_count === undefined ? p.name : `${p.name} (${p.games_count})`}
                 </option>
               ))}
             </select>
@@ -110,6 +133,19 @@ const GameList = () => {
               <option value="unplayed">Not Played</option>
             </select>
           </label>
+          <label>
+            Sort:
+            <select
+              value={selectedOrdering}
+              onChange={(e) => setSelectedOrdering(e.target.value)}
+            >
+              <option value="">Name</option>
+              <option value="popular">Most played</option>
+              <option value="rating">Rating</option>
+              <option value="release_date">Newest</option>
+              <option value="community">Community rank</option>
+            </select>
+          </label>
         </div>
         <Link to="/tierlist">
           <button className="tierlist-button">Tier List</button>
@@ -143,11 +143,18 @@ export default function TierList({ onBack }) {
     axios
       .post(
         `${API}/games/tournament/answer/`,
-        { winner: winner.id, loser: loser.id },
+        // stateless sessions carry their signed state in `token`
+        { winner: winner.id, loser: loser.id, version: session.version, token: session.token },
         { headers: { "X-CSRFToken": getCsrf() } }
       )
       .then((res) => { applySession(res.data); setBusy(false); })
       .catch((err) => {
+        // stale answer (another tab/double click): resume from the current pair
+        if (err.response?.status === 409) {
+          applySession(err.response.data);
+          setBusy(false);
+          return;
+        }
         setError(err.response?.data?.detail || "Error submitting answer.");
         setUiState("error");
         setBusy(false);